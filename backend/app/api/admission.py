@@ -0,0 +1,38 @@
+# backend/app/api/admission.py
+from fastapi import APIRouter, HTTPException
+import time
+from ..core.config import settings
+from ..services.admission import AdmissionRejected, get_admission_controller
+
+router = APIRouter()
+
+def admit(admission_class: str):
+    """
+    路由依赖：请求在对应类别的执行槽内处理
+
+    用法: @router.post("/query/", dependencies=[Depends(admit("query"))])
+    """
+    async def dependency():
+        if not settings.admission_enabled:
+            yield
+            return
+        controller = get_admission_controller()
+        try:
+            await controller.acquire(admission_class)
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            controller.release(admission_class, time.perf_counter() - start)
+    return dependency
+
+@router.get("/admission/metrics")
+async def admission_metrics():
+    """各接口类别的执行中/排队请求数、准入数和拒绝次数"""
+    return {"enabled": settings.admission_enabled, **get_admission_controller().metrics()}
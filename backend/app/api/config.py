@@ -1,15 +1,19 @@
 # backend/app/api/config.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, Field
 from typing import Optional, Literal, Dict, Any
+import asyncio
 from ..core.config import (
     settings, 
     get_database_config, 
-    update_database_config, 
+    apply_database_update,
     get_db_type_display_name,
     is_milvus_lite
 )
 from ..services.vector_service import VectorService
+from ..services.milvus_connection import get_connection_manager
+from ..services.index_profiles import INDEX_PROFILES
+from .admission import admit
 
 router = APIRouter()
 
@@ -57,9 +61,9 @@ async def get_database_config_api():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取配置失败: {str(e)}")
 
-@router.post("/config/database")
+@router.post("/config/database", dependencies=[Depends(admit("admin"))])
 async def update_database_config_api(config_update: DatabaseConfigUpdate):
-    """更新数据库配置"""
+    """更新数据库配置：先连通新配置，等待进行中的检索和写入结束后再切换"""
     try:
         # 转换为字典格式
         update_data = {"db_type": config_update.db_type}
@@ -71,49 +75,40 @@ async def update_database_config_api(config_update: DatabaseConfigUpdate):
             update_data["milvus_lite"] = config_update.milvus_lite
         
         # 更新配置
-        success = update_database_config(update_data)
-        
-        if not success:
-            raise HTTPException(status_code=400, detail="配置更新失败")
+        await get_connection_manager().swap_config(update_data, settings.db_swap_drain_timeout)
         
         # 重新获取配置并返回
         return await get_database_config_api()
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"配置更新失败: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"更新配置失败: {str(e)}")
 
-@router.post("/config/database/test")
+@router.post("/config/database/test", dependencies=[Depends(admit("admin"))])
 async def test_database_connection(test_request: DatabaseTestRequest):
-    """测试数据库连接"""
+    """测试数据库连接（使用一次性连接，不修改当前配置）"""
     try:
-        # 临时更新配置用于测试
-        original_config = {
-            "db_type": get_database_config().db_type
-        }
-        
-        # 创建测试配置
-        test_config = {
+        # 在当前配置的副本上应用测试配置
+        test_config = get_database_config().model_copy(deep=True)
+        apply_database_update(test_config, {
             "db_type": test_request.db_type,
             test_request.db_type: test_request.config
-        }
+        })
         
-        # 临时更新配置
-        update_database_config(test_config)
+        server_info = await asyncio.to_thread(get_connection_manager().test_connection, test_config)
+        db_type_display = get_db_type_display_name(test_request.db_type)
         
-        try:
-            # 创建向量服务测试连接
-            vector_service = VectorService()
-            db_info = vector_service.get_database_info()
-            
-            return {
-                "status": "success",
-                "message": f"连接测试成功 - {db_info['db_type_display']}",
-                "connection_status": db_info["connection_status"],
-                "db_info": db_info
+        return {
+            "status": "success",
+            "message": f"连接测试成功 - {db_type_display}",
+            "connection_status": "connected",
+            "db_info": {
+                "db_type": test_request.db_type,
+                "db_type_display": db_type_display,
+                **server_info
             }
-        finally:
-            # 恢复原始配置
-            update_database_config(original_config)
+        }
             
     except Exception as e:
         return {
@@ -133,6 +128,7 @@ async def get_database_info():
         return {
             "database_info": db_info,
             "collection_stats": collection_stats,
+            "connections": get_connection_manager().stats(),
             "available_types": [
                 {"value": "milvus_standard", "label": "Milvus 标准版", "description": "完整功能的分布式向量数据库"},
                 {"value": "milvus_lite", "label": "Milvus Lite 版", "description": "轻量级单机版本，适合开发和小规模部署"}
@@ -148,6 +144,16 @@ async def get_available_models():
         "embedding_models": settings.embedding_models,
         "default_embedding_model": settings.default_embedding_model,
         "index_types": settings.available_index_types,
+        "index_profiles": {
+            name: {
+                "index_type": spec["index_type"],
+                "build_params": spec["build"],
+                "search_params": spec["search"],
+                "description": spec["description"]
+            }
+            for name, spec in INDEX_PROFILES.items()
+            if name in settings.available_index_types
+        },
         "default_index_type": settings.default_index_type,
         "search_config": {
             "default_search_threshold": settings.default_search_threshold,
@@ -0,0 +1,98 @@
+# backend/app/api/documents.py
+from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel, Field
+from typing import Optional
+import asyncio
+import os
+from ..services.document_processor import DocumentProcessor
+from ..services.vector_service import VectorService
+from ..services.filter_expr import FilterCompileError
+from ..services.knowledge_base import KnowledgeBaseError, get_knowledge_base, collection_name_for
+from ..services.compaction import get_compaction_scheduler
+from ..core.config import settings
+from .admission import admit
+
+router = APIRouter()
+
+UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../uploaded_files"))
+
+class UpsertRequest(BaseModel):
+    filename: str = Field(..., description="已上传的文件名，重新解析后替换该文档在知识库中的全部块")
+    knowledge_base: Optional[str] = Field(default=None, description="目标知识库，默认使用默认知识库")
+    tenant: Optional[str] = Field(default=None, max_length=64, description="租户标识")
+
+def _collection_name(knowledge_base: Optional[str]) -> str:
+    kb = get_knowledge_base(knowledge_base)
+    return collection_name_for(kb.embed_model, knowledge_base, settings.chunk_storage_mode)
+
+@router.delete("/documents", dependencies=[Depends(admit("ingest"))])
+async def delete_documents(
+    document_id: Optional[str] = None,
+    filename: Optional[str] = None,
+    knowledge_base: Optional[str] = None,
+    tenant: Optional[str] = None
+):
+    """按文档ID或文件名删除文档的全部块（删除行在压缩前仍占用存储，由后台按阈值触发压缩）"""
+    if not document_id and not filename:
+        raise HTTPException(status_code=400, detail="必须指定 document_id 或 filename")
+    try:
+        vector_service = VectorService.for_knowledge_base(knowledge_base)
+        deleted = await vector_service.delete_documents(document_id=document_id, filename=filename, tenant=tenant)
+        return {
+            "status": "success",
+            "collection_name": vector_service.collection_name,
+            "deleted": deleted,
+        }
+    except FilterCompileError as e:
+        raise HTTPException(status_code=400, detail=f"删除条件不合法: {str(e)}")
+    except KnowledgeBaseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"删除文档失败: {str(e)}")
+
+@router.post("/documents/upsert", dependencies=[Depends(admit("ingest"))])
+async def upsert_document(request: UpsertRequest):
+    """重新解析已上传的文件并替换知识库中的旧版本（先写新版本，再删除旧版本）"""
+    file_path = os.path.join(UPLOAD_DIR, request.filename)
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail=f"文件 {request.filename} 不存在")
+    try:
+        kb = get_knowledge_base(request.knowledge_base)
+        vector_service = VectorService.for_knowledge_base(request.knowledge_base)
+        doc_processor = DocumentProcessor(**kb.model_dump(include={"chunk_size", "chunk_overlap", "splitter", "chunk_unit"}))
+        chunks = await doc_processor.parse_document(file_path)
+        if not chunks:
+            raise HTTPException(status_code=400, detail=f"文件 {request.filename} 没有可嵌入的内容")
+        result = await vector_service.upsert_document(chunks, tenant=request.tenant)
+        return {
+            "status": "success",
+            "collection_name": vector_service.collection_name,
+            "filename": request.filename,
+            **result,
+        }
+    except HTTPException:
+        raise
+    except (KnowledgeBaseError, FilterCompileError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"替换文档失败: {str(e)}")
+
+@router.post("/documents/compact", dependencies=[Depends(admit("admin"))])
+async def compact_collection(knowledge_base: Optional[str] = None):
+    """立即对知识库集合发起一次压缩"""
+    try:
+        collection_name = _collection_name(knowledge_base)
+        return await asyncio.to_thread(get_compaction_scheduler().compact, collection_name)
+    except KnowledgeBaseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"压缩失败: {str(e)}")
+
+@router.get("/documents/compaction")
+async def get_compaction_status(knowledge_base: Optional[str] = None):
+    """各集合累计未压缩的删除行数和最近一次压缩的状态"""
+    try:
+        collection_name = _collection_name(knowledge_base) if knowledge_base else None
+        return await asyncio.to_thread(get_compaction_scheduler().status, collection_name)
+    except KnowledgeBaseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,11 +1,17 @@
 # backend/app/api/embed.py
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Literal
 import os
 import asyncio
 from ..services.document_processor import DocumentProcessor
 from ..services.vector_service import VectorService
+from ..services.filter_expr import FilterCompileError
+from ..services.index_profiles import IndexConfigError
+from ..services.knowledge_base import KnowledgeBaseError, get_knowledge_base, collection_name_for
+from ..services.stats_service import get_stats_service
+from ..core.config import settings
+from .admission import admit
 
 router = APIRouter()
 
@@ -13,31 +19,58 @@ class EmbedRequest(BaseModel):
     filenames: List[str] = Field(..., description="要嵌入的文件名列表")
     embed_model: str = Field(default="nomic", description="嵌入模型名称")
     index_type: str = Field(default="hnsw", description="索引类型")
+    index_params: Optional[dict] = Field(
+        default=None,
+        description="索引参数覆盖，如 {\"nlist\": 1024, \"nprobe\": 32} 或 {\"M\": 16, \"ef\": 128}"
+    )
     search_threshold: float = Field(default=0.5, ge=0.0, le=1.0, description="搜索阈值")
     chunk_size: int = Field(default=500, gt=0, description="文本块大小")
     chunk_overlap: int = Field(default=50, ge=0, description="文本块重叠大小")
+    splitter: Optional[Literal["recursive", "cjk"]] = Field(default=None, description="分块器，默认使用配置值")
+    chunk_unit: Optional[Literal["chars", "tokens"]] = Field(default=None, description="分块长度单位: chars 或 tokens")
+    knowledge_base: Optional[str] = Field(
+        default=None,
+        description="目标知识库；指定时嵌入模型和索引由知识库配置决定，分块参数可在请求中显式覆盖"
+    )
+    tenant: Optional[str] = Field(default=None, max_length=64, description="租户标识，写入集合的分区键")
 
 class SearchRequest(BaseModel):
     query: str = Field(..., description="搜索查询")
     k: int = Field(default=5, gt=0, le=50, description="返回结果数量")
-    filter_metadata: Optional[dict] = Field(default=None, description="元数据过滤条件")
+    filter_metadata: Optional[dict] = Field(
+        default=None,
+        description="元数据过滤条件，如 {\"filename\": \"a.pdf\", \"page\": {\"$gte\": 2}}，支持 $eq/$ne/$gt/$gte/$lt/$lte/$in/$nin/$prefix/$and/$or/$not"
+    )
+    knowledge_base: Optional[str] = Field(default=None, description="检索的知识库，默认使用默认知识库")
+    embed_model: Optional[str] = Field(
+        default=None,
+        description="未指定知识库时检索该嵌入模型的集合（对应以该模型导入的数据）"
+    )
+    tenant: Optional[str] = Field(default=None, max_length=64, description="只检索该租户的数据")
 
-@router.post("/embed/")
+@router.post("/embed/", dependencies=[Depends(admit("ingest"))])
 async def embed_documents(request: EmbedRequest):
     """
     使用 LangChain v0.3 进行文档嵌入：解析文档、生成向量、存储到Milvus
     """
     try:
+        chunk_fields = {"chunk_size", "chunk_overlap", "splitter", "chunk_unit"}
+        chunking = request.model_dump(include=chunk_fields)
+        if request.knowledge_base:
+            # 知识库决定嵌入模型和索引档案，请求中显式给出的分块参数优先
+            kb = get_knowledge_base(request.knowledge_base)
+            chunking = {**kb.model_dump(include=chunk_fields), **request.model_dump(include=chunk_fields & request.model_fields_set)}
+            vector_service = VectorService.for_knowledge_base(request.knowledge_base)
+        else:
+            vector_service = VectorService(
+                model_name=request.embed_model,
+                index_type=request.index_type,
+                threshold=request.search_threshold,
+                index_params=request.index_params
+            )
+        
         # 初始化处理器（使用 LangChain v0.3）
-        doc_processor = DocumentProcessor(
-            chunk_size=request.chunk_size,
-            chunk_overlap=request.chunk_overlap
-        )
-        vector_service = VectorService(
-            model_name=request.embed_model,
-            index_type=request.index_type,
-            threshold=request.search_threshold
-        )
+        doc_processor = DocumentProcessor(**chunking)
         
         # 获取上传文件目录
         upload_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../uploaded_files"))
@@ -57,7 +90,11 @@ async def embed_documents(request: EmbedRequest):
         overall_stats = doc_processor.get_document_stats(all_chunks)
         
         # 3. 异步存储到向量数据库
-        vector_ids = await vector_service.store_vectors(all_chunks)
+        if vector_service.storage_mode == "offset" and all_chunks:
+            # 重新嵌入的文件替换本租户下的旧版本（只替换解析成功的文件），不再被引用的旧版本文本随之清理
+            await vector_service.replace_documents(all_chunks, tenant=request.tenant)
+        else:
+            await vector_service.store_vectors(all_chunks, tenant=request.tenant)
         
         # 4. 按文件分组统计
         file_results = {}
@@ -83,29 +120,42 @@ async def embed_documents(request: EmbedRequest):
             "file_results": list(file_results.values()),
             "collection_stats": collection_stats,
             "embedding_config": {
-                "model": request.embed_model,
-                "index_type": request.index_type,
-                "chunk_size": request.chunk_size,
-                "chunk_overlap": request.chunk_overlap
+                "knowledge_base": vector_service.knowledge_base,
+                "tenant": request.tenant,
+                "model": vector_service.model_name,
+                "index_type": vector_service.index_type,
+                "index_params": vector_service.index_params["params"],
+                "chunk_size": doc_processor.chunk_size,
+                "chunk_overlap": doc_processor.chunk_overlap,
+                "splitter": doc_processor.splitter,
+                "chunk_unit": doc_processor.chunk_unit
             }
         }
         
+    except IndexConfigError as e:
+        raise HTTPException(status_code=400, detail=f"索引参数不合法: {str(e)}")
+    except KnowledgeBaseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"嵌入处理失败: {str(e)}")
 
-@router.post("/search/")
+@router.post("/search/", dependencies=[Depends(admit("query"))])
 async def search_documents(request: SearchRequest):
     """
     在向量数据库中搜索相似文档
     """
     try:
-        vector_service = VectorService()
+        if request.knowledge_base is None and request.embed_model:
+            vector_service = VectorService(model_name=request.embed_model)
+        else:
+            vector_service = VectorService.for_knowledge_base(request.knowledge_base)
         
         # 执行相似性搜索
         results = await vector_service.search_similar(
             query=request.query,
             k=request.k,
-            filter_dict=request.filter_metadata
+            filter_dict=request.filter_metadata,
+            tenant=request.tenant
         )
         
         return {
@@ -115,15 +165,38 @@ async def search_documents(request: SearchRequest):
             "results": results
         }
         
+    except FilterCompileError as e:
+        raise HTTPException(status_code=400, detail=f"过滤条件不合法: {str(e)}")
+    except KnowledgeBaseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
 
 @router.get("/collection/stats")
-async def get_collection_stats():
-    """获取向量集合统计信息"""
+async def get_collection_stats(knowledge_base: Optional[str] = None):
+    """获取向量集合统计信息（读取后台刷新的统计缓存，不加载嵌入模型和集合）"""
+    try:
+        kb = get_knowledge_base(knowledge_base)
+        collection_name = collection_name_for(kb.embed_model, knowledge_base, settings.chunk_storage_mode)
+        stats = await get_stats_service().get_stats(collection_name)
+        return {
+            **stats,
+            "knowledge_base": knowledge_base or settings.default_knowledge_base,
+            "index_type": kb.index_type,
+            "embedding_model": kb.embed_model
+        }
+    except KnowledgeBaseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取统计信息失败: {str(e)}")
+
+@router.get("/collection/index-memory", dependencies=[Depends(admit("admin"))])
+async def get_index_memory(knowledge_base: Optional[str] = None):
+    """获取当前集合索引的估算内存和实际内存，以及其他索引类型的估算对比"""
     try:
-        vector_service = VectorService()
-        stats = vector_service.get_collection_stats()
-        return stats
+        vector_service = VectorService.for_knowledge_base(knowledge_base)
+        return await asyncio.to_thread(vector_service.get_index_memory)
+    except KnowledgeBaseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取统计信息失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"获取索引内存信息失败: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,17 @@
+# backend/app/api/health.py
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from ..services.health_service import get_health_prober
+
+router = APIRouter()
+
+@router.get("/health/live")
+async def liveness():
+    """存活探针：进程可响应即返回 200，不访问任何外部依赖"""
+    return get_health_prober().liveness()
+
+@router.get("/health/ready")
+async def readiness():
+    """就绪探针：读取后台探测缓存，Milvus 或嵌入模型未就绪时返回 503"""
+    report = get_health_prober().readiness()
+    return JSONResponse(report, status_code=200 if report["status"] == "ready" else 503)
@@ -0,0 +1,26 @@
+# backend/app/api/knowledge_bases.py
+from fastapi import APIRouter, HTTPException, Depends
+from ..core.config import KnowledgeBaseConfig, is_milvus_lite
+from ..services.index_profiles import IndexConfigError, build_index_config
+from ..services.knowledge_base import KnowledgeBaseError, describe_knowledge_bases, register_knowledge_base
+from .admission import admit
+
+router = APIRouter()
+
+@router.get("/knowledge-bases")
+async def list_knowledge_bases():
+    """列出知识库及其嵌入模型、分块参数、索引档案和对应集合"""
+    return describe_knowledge_bases()
+
+@router.put("/knowledge-bases/{name}", dependencies=[Depends(admit("admin"))])
+async def upsert_knowledge_base(name: str, config: KnowledgeBaseConfig):
+    """新建或更新知识库配置（运行时生效）"""
+    try:
+        # 提前校验索引档案，避免首次导入时才报错
+        build_index_config(config.index_type, config.index_params, is_lite=is_milvus_lite())
+        register_knowledge_base(name, config)
+        return {"status": "success", "name": name, "config": config.model_dump()}
+    except IndexConfigError as e:
+        raise HTTPException(status_code=400, detail=f"索引参数不合法: {str(e)}")
+    except KnowledgeBaseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
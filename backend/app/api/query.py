@@ -1,96 +1,195 @@
 ﻿# backend/app/api/query.py
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Header, Depends
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional
 import logging
+import time
+from app.core.config import settings
 from app.services.vector_service import VectorService
 from app.services.llm_service import LLMService
+from app.services.knowledge_base import KnowledgeBaseError
+from app.services.health_service import get_health_prober
+from app.services.singleflight import get_group, normalize_text, singleflight_stats
+from app.services.deadline import Deadline, DeadlineExceeded
+from app.services.shadow_eval import get_shadow_evaluator
+from app.api.admission import admit
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# 流程内部各阶段按截止时间自行降级，外层等待额外留出的收尾时间(秒)
+_DEADLINE_GRACE = 0.25
+
 class QueryRequest(BaseModel):
     question: str
     topk: int = 5
     contextLen: int = 512
     temperature: float = 0.7
+    knowledge_base: Optional[str] = None
+    tenant: Optional[str] = Field(default=None, max_length=64)
+    deadline_ms: Optional[int] = Field(default=None, gt=0, description="端到端时间预算(毫秒)")
+    mmr_lambda: Optional[float] = Field(default=None, ge=0, le=1, description="MMR 相关度权重，默认使用全局配置")
+    max_per_file: Optional[int] = Field(default=None, gt=0, description="同一文件最多返回的块数，默认使用全局配置")
 
 class QueryResponse(BaseModel):
     answer: str
     docs: List[str]
     metadata: Dict[str, Any] = {}
 
-@router.post("/query/", response_model=QueryResponse)
-async def query_documents(request: QueryRequest):
+async def _run_query(request: QueryRequest, deadline: Deadline) -> QueryResponse:
+    """
+    检索 + 生成的完整流程
+
+    各阶段共用同一个时间预算：剩余时间紧张时缩减检索数量，不足以调用 LLM 时直接返回降级答案，
+    所做的降级记录在 metadata.deadline 中；必需阶段（嵌入、检索）超时则抛出 DeadlineExceeded
+    """
+    vector_service = VectorService.for_knowledge_base(request.knowledge_base)
+    top_k = request.topk
+    if not deadline.allows(settings.deadline_tight_ms / 1000) and top_k > settings.deadline_reduced_topk:
+        top_k = settings.deadline_reduced_topk
+        deadline.degrade("retrieval", "reduce_topk", requested=request.topk, used=top_k)
+    mmr_lambda = request.mmr_lambda if request.mmr_lambda is not None else settings.search_mmr_lambda
+    max_per_file = request.max_per_file or settings.search_max_per_file
+    if mmr_lambda is not None and not deadline.allows(settings.deadline_tight_ms / 1000):
+        # MMR 需要连同向量取回更多候选，预算紧张时只保留单文件限额
+        mmr_lambda = None
+        deadline.degrade("diversity", "skip_mmr")
+    search_start = time.perf_counter()
+    search_results = await vector_service.search_documents(
+        query=request.question,
+        top_k=top_k,
+        tenant=request.tenant,
+        deadline=deadline,
+        mmr_lambda=mmr_lambda,
+        max_per_file=max_per_file
+    )
+    search_ms = (time.perf_counter() - search_start) * 1000
+    
+    # 抽样的请求在后台用候选检索配置再检索一次，不等待其结果
+    if settings.shadow.enabled:
+        shadow = get_shadow_evaluator()
+        if shadow.should_sample():
+            shadow.submit(request.question, top_k, request.knowledge_base, request.tenant, search_results, search_ms)
+    
+    if not search_results:
+        metadata = {"source": "no_results"}
+        if deadline.bounded:
+            metadata["deadline"] = deadline.report()
+        return QueryResponse(
+            answer="很抱歉，我在知识库中没有找到与您问题相关的内容。请尝试换个问题或上传更多相关文档。",
+            docs=[],
+            metadata=metadata
+        )
+    
+    retrieved_docs = []
+    doc_contents = []
+    
+    for result in search_results:
+        doc_text = result.get('content', '')
+        doc_source = result.get('source', 'unknown')
+        
+        if len(doc_text) > request.contextLen:
+            doc_text = doc_text[:request.contextLen] + "..."
+        
+        retrieved_docs.append(f"[{doc_source}] {doc_text}")
+        doc_contents.append(doc_text)
+    
+    context = "\n\n".join(doc_contents)
+    
+    llm_service = LLMService()
+    if not deadline.allows(settings.deadline_llm_min_ms / 1000):
+        deadline.degrade("llm", "skipped", remaining_ms=round(deadline.remaining() * 1000))
+        answer, llm_metadata = llm_service.fallback_answer(request.question, context)
+    else:
+        try:
+            answer, llm_metadata = await deadline.run("llm", llm_service.generate_answer_with_metadata(
+                question=request.question,
+                context=context,
+                temperature=request.temperature,
+                deadline=deadline
+            ))
+        except DeadlineExceeded:
+            # LLM 是可降级阶段：预算耗尽时用检索内容生成降级答案，不返回 504
+            deadline.degrade("llm", "timeout")
+            answer, llm_metadata = llm_service.fallback_answer(request.question, context)
+    
+    metadata = {
+        "source": "rag",
+        "knowledge_base": vector_service.knowledge_base,
+        "retrieved_count": len(search_results),
+        "context_length": len(context),
+        "llm": llm_metadata
+    }
+    if deadline.bounded:
+        metadata["deadline"] = deadline.report()
+    return QueryResponse(answer=answer, docs=retrieved_docs, metadata=metadata)
+
+@router.post("/query/", response_model=QueryResponse, dependencies=[Depends(admit("query"))])
+async def query_documents(
+    request: QueryRequest,
+    x_deadline_ms: Optional[int] = Header(default=None, gt=0)
+):
+    # 时间预算优先级：请求体 deadline_ms > X-Deadline-Ms 请求头 > 全局默认
+    budget_ms = request.deadline_ms or x_deadline_ms or settings.query_deadline_ms
+    deadline = Deadline.from_ms(budget_ms)
     try:
         if not request.question.strip():
             raise HTTPException(status_code=400, detail="问题不能为空")
         
         logger.info(f"收到查询请求: {request.question}")
         
-        vector_service = VectorService()
-        search_results = await vector_service.search_documents(
-            query=request.question,
-            top_k=request.topk
+        # 相同问题和参数的并发请求共享一次完整的检索 + 生成；
+        # 预算不同的请求降级结果可能不同，不相互合并
+        key = (
+            normalize_text(request.question),
+            request.topk,
+            request.contextLen,
+            request.temperature,
+            request.knowledge_base,
+            request.tenant,
+            # 与 _run_query 相同的取值：未指定时按全局配置，配置变化后不会合并到旧参数的执行上
+            request.mmr_lambda if request.mmr_lambda is not None else settings.search_mmr_lambda,
+            request.max_per_file or settings.search_max_per_file,
+            budget_ms
         )
-        
-        if not search_results:
-            return QueryResponse(
-                answer="很抱歉，我在知识库中没有找到与您问题相关的内容。请尝试换个问题或上传更多相关文档。",
-                docs=[],
-                metadata={"source": "no_results"}
-            )
-        
-        retrieved_docs = []
-        doc_contents = []
-        
-        for result in search_results:
-            doc_text = result.get('content', '')
-            doc_source = result.get('source', 'unknown')
-            
-            if len(doc_text) > request.contextLen:
-                doc_text = doc_text[:request.contextLen] + "..."
-            
-            retrieved_docs.append(f"[{doc_source}] {doc_text}")
-            doc_contents.append(doc_text)
-        
-        context = "\n\n".join(doc_contents)
-        
-        llm_service = LLMService()
-        answer = await llm_service.generate_answer(
-            question=request.question,
-            context=context,
-            temperature=request.temperature
+        # 合并到他人执行上的请求按自己的剩余时间等待
+        response, shared = await deadline.run(
+            "query", get_group("query").do(key, lambda: _run_query(request, deadline)), grace=_DEADLINE_GRACE
         )
+        if shared:
+            response = response.model_copy(update={"metadata": {**response.metadata, "coalesced": True}})
+        return response
         
-        return QueryResponse(
-            answer=answer,
-            docs=retrieved_docs,
-            metadata={
-                "source": "rag",
-                "retrieved_count": len(search_results),
-                "context_length": len(context)
-            }
+    except HTTPException:
+        raise
+    except KnowledgeBaseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DeadlineExceeded as e:
+        logger.warning(f"查询超出时间预算: {str(e)}")
+        raise HTTPException(
+            status_code=504,
+            detail={"message": str(e), "stage": e.stage, "deadline": deadline.report()}
         )
-        
     except Exception as e:
         logger.error(f"查询处理失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"查询处理失败: {str(e)}")
 
+@router.get("/query/coalescing")
+async def query_coalescing_stats():
+    """各阶段（整次查询、嵌入、检索、LLM）的执行次数和被合并的请求数"""
+    return singleflight_stats()
+
 @router.get("/query/health")
 async def query_health():
     try:
-        vector_service = VectorService()
-        vector_status = await vector_service.health_check()
-        
-        llm_service = LLMService()
-        llm_status = await llm_service.health_check()
-        
+        # 读取后台探测缓存，不再为探针创建向量服务和执行检索
+        report = get_health_prober().readiness()
         return {
-            "status": "healthy",
-            "vector_service": vector_status,
-            "llm_service": llm_status
+            "status": "healthy" if report["status"] == "ready" else "unhealthy",
+            "vector_service": report["checks"]["milvus"],
+            "embedding_model": report["checks"]["embedding_model"],
+            "llm_service": report["checks"]["llm"]
         }
     except Exception as e:
         logger.error(f"健康检查失败: {str(e)}")
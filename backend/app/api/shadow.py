@@ -0,0 +1,42 @@
+# backend/app/api/shadow.py
+from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
+import asyncio
+import time
+from ..core.config import settings, ShadowConfig, is_milvus_lite
+from ..services.index_profiles import IndexConfigError, build_index_config
+from ..services.knowledge_base import get_knowledge_base
+from ..services.shadow_eval import candidate_key, get_shadow_evaluator
+from .admission import admit
+
+router = APIRouter()
+
+@router.get("/shadow/config")
+async def get_shadow_config():
+    """当前的影子评估配置"""
+    return {"config": settings.shadow.model_dump(), "candidate_key": candidate_key(settings.shadow)}
+
+@router.put("/shadow/config", dependencies=[Depends(admit("admin"))])
+async def update_shadow_config(config: ShadowConfig):
+    """更新影子评估的开关、抽样比例和候选检索配置（运行时生效，之后的样本归入新的候选）"""
+    try:
+        if config.index_type or config.index_params:
+            index_type = config.index_type or get_knowledge_base(None).index_type
+            build_index_config(index_type, config.index_params, is_lite=is_milvus_lite())
+    except IndexConfigError as e:
+        raise HTTPException(status_code=400, detail=f"索引参数不合法: {str(e)}")
+    settings.shadow = config
+    return {"status": "success", "config": config.model_dump(), "candidate_key": candidate_key(config)}
+
+@router.get("/shadow/report")
+async def get_shadow_report(
+    knowledge_base: Optional[str] = None,
+    candidate: Optional[str] = None,
+    since_hours: Optional[float] = None
+):
+    """
+    按候选配置汇总影子评估样本：延迟对比（p50/p95、候选更快的比例）、
+    与生产结果的偏离（overlap@k、Jaccard、top1 一致率）和相似度分布
+    """
+    since = time.time() - since_hours * 3600 if since_hours else None
+    return await asyncio.to_thread(get_shadow_evaluator().report, knowledge_base, candidate, since)
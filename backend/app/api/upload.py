@@ -1,14 +1,21 @@
 import os
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from pathlib import Path
+from ..services.file_preview import get_file_preview, file_key
+from ..services.singleflight import get_group
+from .admission import admit
 
 router = APIRouter()
 
 UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../uploaded_files"))
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-@router.post("/upload/")
+TEXT_EXTENSIONS = ['.txt', '.md', '.markdown']
+
+@router.post("/upload/", dependencies=[Depends(admit("ingest"))])
 async def upload_file(file: UploadFile = File(...)):
     file_location = os.path.join(UPLOAD_DIR, file.filename)
     with open(file_location, "wb") as f:
@@ -17,9 +24,15 @@ async def upload_file(file: UploadFile = File(...)):
     return JSONResponse(content={"filename": file.filename, "msg": "Upload successful"})
 
 @router.get("/preview/{filename}")
-async def preview_file(filename: str):
+async def preview_file(
+    filename: str,
+    offset: int = Query(default=0, ge=0, description="文本文件：起始字节偏移（取上一页的 next_offset）"),
+    limit: Optional[int] = Query(default=None, gt=0, description="文本文件：每页字节数，默认使用配置值"),
+    start_line: Optional[int] = Query(default=None, ge=0, description="文本文件：按行分页时的起始行（从 0 计）"),
+    lines: int = Query(default=200, gt=0, le=10000, description="文本文件：按行分页时每页行数")
+):
     """
-    获取文件内容用于预览
+    获取文件内容用于预览；文本文件分页返回，PDF 返回文件地址和分页文本地址
     """
     file_path = os.path.join(UPLOAD_DIR, filename)
     
@@ -34,39 +47,88 @@ async def preview_file(filename: str):
         return JSONResponse(content={
             "type": "pdf",
             "filename": filename,
-            "url": f"/api/file/{filename}"
+            "url": f"/api/file/{filename}",
+            "pages_url": f"/api/preview/{filename}/pages"
         })
     
-    elif file_ext in ['.txt', '.md', '.markdown']:
-        # 文本文件读取内容
+    elif file_ext in TEXT_EXTENSIONS:
+        # 文本文件按页读取：默认从 offset 起按字节分页，指定 start_line 时按行分页
+        preview = get_file_preview()
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            if start_line is not None:
+                page = await asyncio.to_thread(preview.read_lines, file_path, start_line, lines)
+            else:
+                page = await asyncio.to_thread(preview.read_page, file_path, offset, limit)
+        except UnicodeError:
             return JSONResponse(content={
                 "type": "text",
                 "filename": filename,
-                "content": content
+                "content": "文件编码不支持，无法预览"
             })
-        except UnicodeDecodeError:
-            # 尝试其他编码
-            try:
-                with open(file_path, 'r', encoding='gbk') as f:
-                    content = f.read()
-                return JSONResponse(content={
-                    "type": "text",
-                    "filename": filename,
-                    "content": content
-                })
-            except UnicodeDecodeError:
-                return JSONResponse(content={
-                    "type": "text",
-                    "filename": filename,
-                    "content": "文件编码不支持，无法预览"
-                })
+        return JSONResponse(content={
+            "type": "text",
+            "filename": filename,
+            **page
+        })
     
     else:
         raise HTTPException(status_code=400, detail="不支持的文件类型")
 
+@router.get("/preview/{filename}/stream")
+async def stream_text_file(
+    filename: str,
+    offset: int = Query(default=0, ge=0, description="起始字节偏移"),
+    end: Optional[int] = Query(default=None, ge=0, description="结束字节偏移（不含），默认到文件末尾")
+):
+    """
+    以 UTF-8 文本流式返回文本文件（或其中一段字节范围），服务端按块转码，不把整个文件读入内存
+    """
+    file_path = os.path.join(UPLOAD_DIR, filename)
+    
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    if Path(filename).suffix.lower() not in TEXT_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="只支持文本文件")
+    
+    preview = get_file_preview()
+    if await asyncio.to_thread(preview.detect_encoding, file_path) is None:
+        raise HTTPException(status_code=400, detail="文件编码不支持，无法预览")
+    # 同步生成器由 StreamingResponse 放到线程池中迭代
+    return StreamingResponse(
+        preview.iter_text(file_path, offset, end),
+        media_type="text/plain; charset=utf-8"
+    )
+
+@router.get("/preview/{filename}/pages")
+async def preview_pdf_pages(
+    filename: str,
+    page: int = Query(default=0, ge=0, description="起始页码（从 0 计，与检索结果的 page 元数据一致）"),
+    count: int = Query(default=1, gt=0, le=50, description="返回的页数")
+):
+    """
+    获取 PDF 指定页提取出的文本；首次访问时提取全部页并缓存，之后直接读取缓存
+    """
+    file_path = os.path.join(UPLOAD_DIR, filename)
+    
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    if Path(filename).suffix.lower() != '.pdf':
+        raise HTTPException(status_code=400, detail="只支持 PDF 文件")
+    
+    preview = get_file_preview()
+    try:
+        # 同一文件的并发首次访问只提取一次
+        key = await asyncio.to_thread(file_key, file_path)
+        await get_group("pdf_text").do(key, lambda: asyncio.to_thread(preview.pdf_page_texts, file_path))
+        pages = await asyncio.to_thread(preview.read_pdf_pages, file_path, page, count)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"PDF 文本提取失败: {str(e)}")
+    return JSONResponse(content={
+        "type": "pdf_text",
+        "filename": filename,
+        **pages
+    })
+
 @router.get("/file/{filename}")
 async def get_file(filename: str):
     """
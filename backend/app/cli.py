@@ -0,0 +1,185 @@
+# backend/app/cli.py
+"""
+命令行工具
+
+用法（在 backend 目录下）:
+    python -m app.cli ingest /data/archive --knowledge-base default --batch-size 512 --workers 4
+    python -m app.cli export ./snapshots/default --knowledge-base default --format parquet
+    RAG_DATABASE__DB_TYPE=milvus_lite python -m app.cli import ./snapshots/default --knowledge-base default
+    python -m app.cli serve-embeddings --socket /tmp/rag-embed.sock --replicas 2
+"""
+from pathlib import Path
+from typing import List, Optional
+import asyncio
+import json
+
+import typer
+
+from app.core.config import settings
+from app.services.bulk_ingest import DirectoryIngestor, IngestCheckpoint, discover_files
+from app.services.bulk_load import BulkLoader
+from app.services.document_processor import DocumentProcessor
+from app.services.embedding_server import EmbeddingServer
+from app.services.knowledge_base import get_knowledge_base
+from app.services.snapshot import SnapshotError, export_collection, import_snapshot
+from app.services.vector_service import VectorService
+
+app = typer.Typer(help="RAG 知识库命令行工具", no_args_is_help=True)
+
+
+@app.callback()
+def main():
+    """RAG 知识库命令行工具"""
+
+
+def _format_eta(seconds: Optional[int]) -> str:
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def _print_progress(stats: dict):
+    processed = stats["files_done"] + stats["files_failed"] + stats["files_skipped"]
+    typer.echo(
+        f"[{processed}/{stats['files_total']}] 块 {stats['chunks_stored']} | "
+        f"{stats['files_per_second']} 文件/s, {stats['chunks_per_second']} 块/s | "
+        f"失败 {stats['files_failed']} | 剩余 {_format_eta(stats['eta_seconds'])}"
+    )
+
+
+@app.command()
+def ingest(
+    directory: Path = typer.Argument(..., exists=True, file_okay=False, resolve_path=True, help="要导入的目录"),
+    knowledge_base: Optional[str] = typer.Option(None, help="目标知识库，默认使用默认知识库"),
+    tenant: Optional[str] = typer.Option(None, help="租户标识"),
+    batch_size: int = typer.Option(512, min=1, help="每次嵌入写入的文本块数量"),
+    workers: int = typer.Option(4, min=1, help="并行解析的文件数"),
+    extensions: List[str] = typer.Option(None, "--ext", help="导入的扩展名，可重复指定，默认使用配置的允许扩展名"),
+    checkpoint: Optional[Path] = typer.Option(None, help="断点文件路径，默认为 <目录>/.rag_ingest_checkpoint.json"),
+    bulk: bool = typer.Option(False, help="批量导入模式：多个并行写入流，导入期间集合不可检索"),
+    streams: Optional[int] = typer.Option(None, min=1, help="批量导入模式的并行写入流数量"),
+    defer_index: Optional[bool] = typer.Option(None, "--defer-index/--keep-index", help="批量导入期间是否删除向量索引，完成后统一重建"),
+):
+    """递归导入目录下的文档：并行解析、批量嵌入写入，中断后重新运行从断点继续"""
+    kb_name = knowledge_base or settings.default_knowledge_base
+    kb = get_knowledge_base(kb_name)
+    vector_service = VectorService.for_knowledge_base(kb_name)
+    processor = DocumentProcessor(
+        chunk_size=kb.chunk_size,
+        chunk_overlap=kb.chunk_overlap,
+        splitter=kb.splitter,
+        chunk_unit=kb.chunk_unit,
+    )
+
+    # 目标集合或分块参数变化后，旧断点不再适用
+    fingerprint = {
+        "collection": vector_service.collection_name,
+        "tenant": tenant,
+        "chunking": [processor.chunk_size, processor.chunk_overlap, processor.splitter, processor.chunk_unit],
+    }
+    checkpoint_path = checkpoint or directory / ".rag_ingest_checkpoint.json"
+    try:
+        state = IngestCheckpoint.load(checkpoint_path, fingerprint)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=1)
+
+    files = discover_files(directory, extensions or settings.allowed_extensions)
+    typer.echo(
+        f"发现 {len(files)} 个文件，已完成 {len(state.done)} 个 -> 集合 {vector_service.collection_name} "
+        f"(断点: {checkpoint_path})"
+    )
+
+    ingestor = DirectoryIngestor(
+        vector_service,
+        processor,
+        state,
+        batch_size=batch_size,
+        parse_workers=workers,
+        tenant=tenant,
+        progress_callback=_print_progress,
+        loader=BulkLoader(vector_service, streams=streams, defer_index=defer_index) if bulk else None,
+    )
+    try:
+        stats = asyncio.run(ingestor.run(directory, files))
+    except KeyboardInterrupt:
+        typer.echo(f"已中断，进度已保存到 {checkpoint_path}，重新运行相同命令即可继续")
+        raise typer.Exit(code=130)
+    typer.echo(json.dumps(stats, ensure_ascii=False, indent=2))
+    if stats["files_failed"]:
+        raise typer.Exit(code=2)
+
+
+@app.command()
+def export(
+    output_dir: Path = typer.Argument(..., file_okay=False, resolve_path=True, help="快照输出目录"),
+    knowledge_base: Optional[str] = typer.Option(None, help="导出的知识库，默认使用默认知识库"),
+    fmt: str = typer.Option("parquet", "--format", help="数据文件格式: parquet 或 arrow（Arrow IPC）"),
+    batch_rows: int = typer.Option(2000, min=1, help="每次从集合读取的行数"),
+    rows_per_file: int = typer.Option(100_000, min=1, help="每个分片文件的最大行数"),
+):
+    """把知识库集合（主键、向量、文本和元数据）导出为快照，用于迁移到其他数据库而无需重新嵌入"""
+    vector_service = VectorService.for_knowledge_base(knowledge_base)
+    try:
+        manifest = export_collection(
+            vector_service,
+            output_dir,
+            fmt=fmt,
+            batch_rows=batch_rows,
+            rows_per_file=rows_per_file,
+            progress_callback=lambda rows: typer.echo(f"已导出 {rows} 行"),
+        )
+    except SnapshotError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=1)
+    typer.echo(
+        f"集合 {vector_service.collection_name} 共 {manifest['rows']} 行已导出到 {output_dir} "
+        f"({len(manifest['files'])} 个 {fmt} 文件)"
+    )
+
+
+@app.command("import")
+def import_(
+    snapshot_dir: Path = typer.Argument(..., exists=True, file_okay=False, resolve_path=True, help="快照目录"),
+    knowledge_base: Optional[str] = typer.Option(None, help="目标知识库，嵌入模型须与快照一致"),
+    streams: Optional[int] = typer.Option(None, min=1, help="并行写入流数量"),
+    defer_index: Optional[bool] = typer.Option(None, "--defer-index/--keep-index", help="导入期间是否删除向量索引，完成后统一重建"),
+    batch_rows: int = typer.Option(2000, min=1, help="每次从快照读取的行数"),
+    allow_existing: bool = typer.Option(False, help="目标集合已有数据时仍然导入"),
+):
+    """把快照批量导入当前配置的数据库（通过环境变量或 .env 选择 Lite/标准版），不调用嵌入模型"""
+    try:
+        result = asyncio.run(import_snapshot(
+            snapshot_dir,
+            knowledge_base=knowledge_base,
+            streams=streams,
+            defer_index=defer_index,
+            batch_rows=batch_rows,
+            allow_existing=allow_existing,
+        ))
+    except SnapshotError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=1)
+    typer.echo(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+@app.command("serve-embeddings")
+def serve_embeddings(
+    socket_path: Optional[Path] = typer.Option(None, "--socket", help="Unix socket 路径，默认使用配置 embedding_server_socket"),
+    replicas: Optional[int] = typer.Option(None, min=1, help="模型进程数，默认使用配置 embedding_server_replicas"),
+    models: List[str] = typer.Option(None, "--model", help="启动时预加载的嵌入模型名称，可重复指定，默认为默认知识库的模型"),
+):
+    """启动嵌入服务：API 进程设置 RAG_EMBEDDING_SERVER_SOCKET 后通过该 socket 编码"""
+    path = str(socket_path or settings.embedding_server_socket or "")
+    if not path:
+        typer.echo("未指定 socket 路径（--socket 或 RAG_EMBEDDING_SERVER_SOCKET）", err=True)
+        raise typer.Exit(code=1)
+    names = models or [get_knowledge_base(None).embed_model]
+    preload = [settings.embedding_models.get(name, settings.embedding_models["nomic"]) for name in names]
+    EmbeddingServer(path, replicas or settings.embedding_server_replicas, preload).serve_forever()
+
+
+if __name__ == "__main__":
+    app()
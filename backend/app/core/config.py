@@ -1,5 +1,5 @@
 # backend/app/core/config.py
-from typing import Optional, Literal
+from typing import Optional, Literal, Dict
 from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings
 import os
@@ -21,6 +21,33 @@ class MilvusLiteConfig(BaseModel):
     db_path: str = Field(default="./milvus_lite.db", description="数据库文件路径")
     dim: int = Field(default=384, description="向量维度")
     
+class KnowledgeBaseConfig(BaseModel):
+    """知识库配置：每个知识库使用独立的嵌入模型、分块参数和索引档案，对应独立的集合"""
+    description: str = Field(default="", description="知识库说明")
+    embed_model: str = Field(default="nomic", description="嵌入模型名称")
+    chunk_size: int = Field(default=500, gt=0, description="文本块大小")
+    chunk_overlap: int = Field(default=50, ge=0, description="文本块重叠大小")
+    splitter: Optional[Literal["recursive", "cjk"]] = Field(default=None, description="分块器，默认使用全局配置")
+    chunk_unit: Optional[Literal["chars", "tokens"]] = Field(default=None, description="分块长度单位，默认使用全局配置")
+    index_type: str = Field(default="hnsw", description="索引类型")
+    index_params: Optional[dict] = Field(default=None, description="索引参数覆盖")
+    search_threshold: float = Field(default=0.5, ge=0.0, le=1.0, description="搜索阈值")
+
+class AdmissionClassConfig(BaseModel):
+    """一类接口的准入限制：并发上限、排队上限和调度优先级"""
+    max_concurrent: int = Field(..., gt=0, description="同时执行的请求数上限")
+    max_queue: int = Field(..., ge=0, description="排队等待的请求数上限，超出时立即返回 429")
+    priority: int = Field(default=0, ge=0, description="优先级，数值越小越先获得空闲执行槽")
+
+class ShadowConfig(BaseModel):
+    """影子评估：按比例抽样线上查询，用候选检索配置在后台再检索一次；候选字段未指定时沿用生产知识库配置"""
+    enabled: bool = Field(default=False, description="是否开启影子评估")
+    sample_rate: float = Field(default=0.05, ge=0.0, le=1.0, description="抽样比例")
+    embed_model: Optional[str] = Field(default=None, description="候选嵌入模型（检索同一知识库下该模型的集合）")
+    index_type: Optional[str] = Field(default=None, description="候选索引类型（决定检索参数）")
+    index_params: Optional[dict] = Field(default=None, description="候选索引/检索参数覆盖，如 {\"ef\": 128}")
+    search_threshold: Optional[float] = Field(default=None, ge=0.0, le=1.0, description="候选相似度阈值")
+
 class DatabaseConfig(BaseModel):
     """数据库配置"""
     # 数据库类型选择
@@ -52,6 +79,36 @@ class AppConfig(BaseSettings):
         description="允许的文件扩展名"
     )
     
+    # 文档解析配置
+    pdf_parallel_workers: int = Field(
+        default=max(1, (os.cpu_count() or 2) - 1),
+        description="大PDF并行解析的进程数"
+    )
+    pdf_parallel_page_threshold: int = Field(
+        default=100, description="页数超过该阈值的PDF才启用并行解析"
+    )
+    pdf_pages_per_task: int = Field(default=25, description="并行解析时每个任务处理的页数")
+    default_splitter: Literal["recursive", "cjk"] = Field(
+        default="recursive", description="默认分块器: recursive(LangChain递归分割) 或 cjk(中文感知单遍分块)"
+    )
+    default_chunk_unit: Literal["chars", "tokens"] = Field(default="chars", description="分块长度单位")
+    chunk_storage_mode: Literal["inline", "offset"] = Field(
+        default="inline",
+        description="块文本存储方式: inline(文本和元数据存入Milvus) 或 offset(Milvus只存文档ID和偏移，文本存本地文件)"
+    )
+    chunk_text_dir: str = Field(default="./chunk_texts", description="offset 模式下文档规范化文本的存储目录")
+    
+    # 文件预览配置
+    preview_page_bytes: int = Field(default=64 * 1024, gt=0, description="文本预览默认每页字节数")
+    preview_max_page_bytes: int = Field(default=1024 * 1024, gt=0, description="文本预览单页字节数上限")
+    preview_sniff_bytes: int = Field(default=64 * 1024, gt=0, description="识别文本编码时读取的文件开头字节数")
+    preview_line_index_step: int = Field(default=1000, gt=0, description="按行预览时稀疏行索引的间隔行数")
+    preview_cache_dir: str = Field(default="./preview_cache", description="PDF 分页文本提取结果的缓存目录")
+    
+    # 解析缓存配置
+    parse_cache_enabled: bool = Field(default=True, description="是否缓存文档解析和分块结果（按文件内容哈希和分块参数复用）")
+    parse_cache_dir: str = Field(default="./parse_cache", description="解析和分块结果的缓存目录")
+    
     # 嵌入模型配置
     default_embedding_model: str = Field(default="nomic", description="默认嵌入模型")
     embedding_models: dict = Field(
@@ -64,16 +121,53 @@ class AppConfig(BaseSettings):
         description="可用的嵌入模型映射"
     )
     
+    # 知识库配置
+    default_knowledge_base: str = Field(default="default", description="未指定知识库时使用的知识库")
+    knowledge_bases: Dict[str, KnowledgeBaseConfig] = Field(
+        default_factory=lambda: {"default": KnowledgeBaseConfig(description="默认知识库")},
+        description="知识库名称 -> 知识库配置"
+    )
+    tenant_partitions: int = Field(default=16, gt=0, le=1024, description="按租户分区键划分的物理分区数")
+    
+    # 统计配置
+    stats_refresh_interval: float = Field(default=30.0, gt=0, description="集合统计后台刷新间隔(秒)")
+    
+    # 嵌入降维配置
+    embedding_projection: Literal["none", "pca", "matryoshka"] = Field(
+        default="none",
+        description="嵌入降维方式: none、pca(在入库样本上拟合) 或 matryoshka(截断前N维，仅适用于MRL训练的模型)"
+    )
+    projection_dim: int = Field(default=128, gt=0, description="降维后的向量维度")
+    projection_sample_size: int = Field(default=2000, gt=0, description="PCA 拟合使用的最大样本数")
+    projection_dir: str = Field(default="./projections", description="投影矩阵存储目录")
+    
+    # 入库嵌入批处理配置
+    embed_token_budget: int = Field(
+        default=8192, ge=0,
+        description="入库嵌入每批的 token 预算(批大小 x 批内最长 token 数)，按长度分桶组批；0 表示沿用固定 batch_size"
+    )
+    embed_max_batch: int = Field(default=256, gt=0, description="入库嵌入每批的最大条数")
+    embed_batch_wait_ms: float = Field(default=5.0, ge=0, description="合并并发嵌入请求的最长等待时间(毫秒)，0 表示不合并")
+    embedding_server_socket: Optional[str] = Field(
+        default=None,
+        description="嵌入服务的 Unix socket 路径；设置后 API 进程不加载模型，嵌入请求交给 `python -m app.cli serve-embeddings` 启动的模型进程"
+    )
+    embedding_server_replicas: int = Field(default=1, gt=0, description="嵌入服务的模型进程数（每个进程加载一份模型）")
+    embedding_server_timeout: float = Field(default=120.0, gt=0, description="调用嵌入服务的超时时间(秒)")
+    
     # 索引配置
     default_index_type: str = Field(default="hnsw", description="默认索引类型")
     available_index_types: list = Field(
-        default=["hnsw", "ivf_flat", "ivf_sq8", "flat"],
+        default=["hnsw", "hnsw_sq", "ivf_flat", "ivf_sq8", "ivf_pq", "scann", "flat"],
         description="可用的索引类型"
     )
     
     # 搜索配置
     default_search_threshold: float = Field(default=0.5, description="默认搜索阈值")
     default_top_k: int = Field(default=5, description="默认返回结果数量")
+    search_mmr_lambda: Optional[float] = Field(default=None, ge=0, le=1, description="MMR 相关度权重(0~1，越小结果越多样)，为空时不做 MMR")
+    search_max_per_file: Optional[int] = Field(default=None, gt=0, description="检索结果中同一文件最多的块数，为空时不限制")
+    diversity_fetch_k: int = Field(default=50, gt=0, le=200, description="做 MMR 或单文件限额时先取回的候选数量")
     
     # LLM配置
     LLM_MODEL_TYPE: str = Field(default="deepseek", description="LLM模型类型: deepseek, ollama, local")
@@ -83,7 +177,74 @@ class AppConfig(BaseSettings):
     OLLAMA_URL: str = Field(default="http://localhost:11434", description="Ollama服务URL")
     LLM_MAX_TOKENS: int = Field(default=1000, description="LLM最大输出token数")
     LLM_TIMEOUT: int = Field(default=30, description="LLM调用超时时间(秒)")
+    LLM_POOL_SIZE: int = Field(default=20, gt=0, description="LLM HTTP连接池大小")
+    OLLAMA_MODEL_NAME: str = Field(default="qwen2.5:7b", description="故障转移到 Ollama 时使用的模型")
+    LLM_FAILOVER_PROVIDERS: list = Field(
+        default=[], description="主服务失败时依次尝试的服务，如 [\"ollama\"]"
+    )
+    LLM_MAX_RETRIES: int = Field(default=2, ge=0, description="可重试错误的最大重试次数")
+    LLM_RETRY_BASE_DELAY: float = Field(default=0.5, gt=0, description="重试退避基准时间(秒)")
+    LLM_RETRY_MAX_DELAY: float = Field(default=4.0, gt=0, description="重试退避上限(秒)")
+    LLM_HEDGE_ENABLED: bool = Field(default=False, description="请求超过历史延迟百分位后是否发出对冲请求")
+    LLM_HEDGE_PERCENTILE: float = Field(default=0.95, gt=0, lt=1, description="对冲请求触发延迟的百分位")
+    LLM_HEDGE_MIN_DELAY: float = Field(default=1.0, ge=0, description="对冲请求的最小触发延迟(秒)")
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = Field(default=5, gt=0, description="连续失败多少次后熔断")
+    LLM_CIRCUIT_RESET_TIMEOUT: float = Field(default=30.0, gt=0, description="熔断后多久放行试探请求(秒)")
+    LLM_CACHE_ENABLED: bool = Field(default=False, description="是否将LLM生成结果持久化到本地SQLite缓存")
+    LLM_CACHE_REPLAY: bool = Field(
+        default=False, description="回放模式：不论temperature都优先使用缓存结果，用于评测/基准测试的确定性重跑"
+    )
+    LLM_CACHE_PATH: str = Field(default="./llm_cache.sqlite3", description="LLM缓存数据库路径")
+    LLM_CACHE_MAX_ENTRIES: int = Field(default=100_000, gt=0, description="LLM缓存最大条目数")
+    LLM_CACHE_MAX_AGE_DAYS: float = Field(default=30, gt=0, description="LLM缓存条目最长保留天数")
+    LLM_CACHE_COMPACT_INTERVAL: float = Field(default=600, gt=0, description="LLM缓存后台压缩间隔(秒)")
+    
+    # 健康检查配置
+    health_probe_interval: float = Field(default=10.0, gt=0, description="后台健康探测间隔(秒)")
+    health_cache_ttl: float = Field(default=30.0, gt=0, description="健康探测结果的有效期(秒)，过期后视为未知")
+    health_probe_timeout: float = Field(default=3.0, gt=0, description="单项健康探测超时时间(秒)")
+
+    # 请求时间预算配置
+    query_deadline_ms: Optional[int] = Field(
+        default=None, gt=0, description="问答请求默认时间预算(毫秒)，为空表示不限时；请求可通过 deadline_ms 或 X-Deadline-Ms 覆盖"
+    )
+    deadline_tight_ms: int = Field(default=3000, gt=0, description="剩余预算低于该值(毫秒)时缩减检索数量")
+    deadline_reduced_topk: int = Field(default=3, gt=0, description="预算紧张时的检索数量上限")
+    deadline_llm_min_ms: int = Field(default=1000, gt=0, description="剩余预算低于该值(毫秒)时跳过LLM，直接返回降级答案")
+
+    # 文档删除与压缩配置
+    compaction_min_deletes: int = Field(default=1000, gt=0, description="累计删除行数达到该值才考虑触发压缩")
+    compaction_delete_ratio: float = Field(default=0.1, gt=0, le=1, description="累计删除行数占实体数的比例达到该值时触发压缩")
+    compaction_check_interval: float = Field(default=60.0, gt=0, description="后台压缩检查间隔(秒)")
     
+    # 影子评估配置
+    shadow: ShadowConfig = Field(default_factory=ShadowConfig, description="影子评估的开关、抽样比例和候选检索配置")
+    shadow_db_path: str = Field(default="./shadow_eval.sqlite3", description="影子评估样本数据库路径")
+    shadow_max_inflight: int = Field(default=4, gt=0, description="同时执行的影子检索上限，超出时放弃本次抽样")
+    shadow_timeout: float = Field(default=10.0, gt=0, description="单次影子检索超时(秒)")
+    shadow_max_samples: int = Field(default=100_000, gt=0, description="保留的影子评估样本数上限")
+    
+    # 批量导入配置
+    bulk_load_embed_rows: int = Field(default=2000, gt=0, description="批量导入时每次嵌入的文本块数量")
+    bulk_load_insert_rows: int = Field(default=500, gt=0, description="批量导入时单次 insert 的最大行数（过大的批次在客户端行解析上反而更慢）")
+    bulk_load_streams: int = Field(default=4, gt=0, description="批量导入的并行写入流数量")
+    bulk_load_max_batch_mb: float = Field(default=16.0, gt=0, description="单次 insert 消息大小上限(MB)，低于 gRPC 消息上限")
+    bulk_load_defer_index: bool = Field(default=True, description="批量导入期间删除向量索引，写入完成后统一重建")
+    
+    # 准入控制配置
+    admission_enabled: bool = Field(default=True, description="是否对查询、导入和管理接口做并发和排队限制")
+    admission_total_slots: int = Field(default=8, gt=0, description="所有接口共享的执行槽数量")
+    admission_classes: Dict[str, AdmissionClassConfig] = Field(
+        default_factory=lambda: {
+            "query": AdmissionClassConfig(max_concurrent=8, max_queue=32, priority=0),
+            "admin": AdmissionClassConfig(max_concurrent=2, max_queue=8, priority=1),
+            "ingest": AdmissionClassConfig(max_concurrent=2, max_queue=4, priority=2),
+        },
+        description="接口类别 -> 准入限制；共享执行槽空闲时按优先级分配，查询可越过排队中的导入请求"
+    )
+    admission_queue_timeout: float = Field(default=10.0, gt=0, description="排队最长等待时间(秒)，超时返回 503")
+    db_swap_drain_timeout: float = Field(default=30.0, ge=0, description="切换数据库配置时等待进行中的检索和写入结束的最长时间(秒)")
+
     model_config = {
         "env_file": ".env",
         "env_file_encoding": "utf-8", 
@@ -100,9 +261,9 @@ def get_database_config() -> DatabaseConfig:
     """获取数据库配置"""
     return settings.database
 
-def get_milvus_connection_args() -> dict:
-    """根据配置类型获取Milvus连接参数"""
-    db_config = get_database_config()
+def get_milvus_connection_args(db_config: Optional[DatabaseConfig] = None) -> dict:
+    """根据配置类型获取Milvus连接参数，默认使用当前数据库配置"""
+    db_config = db_config or get_database_config()
     
     if db_config.db_type == "milvus_standard":
         # 标准版连接参数
@@ -143,37 +304,38 @@ def is_milvus_lite() -> bool:
     """判断是否使用Milvus Lite"""
     return get_database_config().db_type == "milvus_lite"
 
-def get_db_type_display_name() -> str:
-    """获取数据库类型的显示名称"""
-    db_type = get_database_config().db_type
+def get_db_type_display_name(db_type: Optional[str] = None) -> str:
+    """获取数据库类型的显示名称，默认为当前配置的类型"""
+    db_type = db_type or get_database_config().db_type
     return {
         "milvus_standard": "Milvus 标准版",
         "milvus_lite": "Milvus Lite 版"
     }.get(db_type, db_type)
 
 # 配置更新函数
+def apply_database_update(db_config: DatabaseConfig, new_config: dict):
+    """把配置更新应用到给定的数据库配置对象上"""
+    # 验证配置
+    if "db_type" in new_config:
+        if new_config["db_type"] not in ["milvus_standard", "milvus_lite"]:
+            raise ValueError("数据库类型必须是 'milvus_standard' 或 'milvus_lite'")
+    
+    # 更新配置
+    if "db_type" in new_config:
+        db_config.db_type = new_config["db_type"]
+    
+    if "milvus_standard" in new_config:
+        for key, value in new_config["milvus_standard"].items():
+            setattr(db_config.milvus_standard, key, value)
+    
+    if "milvus_lite" in new_config:
+        for key, value in new_config["milvus_lite"].items():
+            setattr(db_config.milvus_lite, key, value)
+
 def update_database_config(new_config: dict) -> bool:
     """动态更新数据库配置"""
     try:
-        global settings
-        
-        # 验证配置
-        if "db_type" in new_config:
-            if new_config["db_type"] not in ["milvus_standard", "milvus_lite"]:
-                raise ValueError("数据库类型必须是 'milvus_standard' 或 'milvus_lite'")
-        
-        # 更新配置
-        if "db_type" in new_config:
-            settings.database.db_type = new_config["db_type"]
-        
-        if "milvus_standard" in new_config:
-            for key, value in new_config["milvus_standard"].items():
-                setattr(settings.database.milvus_standard, key, value)
-        
-        if "milvus_lite" in new_config:
-            for key, value in new_config["milvus_lite"].items():
-                setattr(settings.database.milvus_lite, key, value)
-        
+        apply_database_update(settings.database, new_config)
         return True
     except Exception as e:
         print(f"配置更新失败: {e}")
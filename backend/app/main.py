@@ -1,7 +1,15 @@
 # backend/app/main.py
 from fastapi import FastAPI
-from app.api import upload, embed, config, query  # 新增query
+from app.api import upload, embed, config, query, knowledge_bases, health, admission, documents, shadow  # 新增query
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.config import settings
+from app.services.stats_service import get_stats_service
+from app.services.health_service import get_health_prober
+from app.services.llm_service import close_http_session
+from app.services.completion_cache import get_completion_cache
+from app.services.compaction import get_compaction_scheduler
+from app.services.shadow_eval import get_shadow_evaluator
+from app.services.milvus_connection import get_connection_manager
 
 app = FastAPI()
 
@@ -9,6 +17,11 @@ app.include_router(upload.router, prefix="/api")
 app.include_router(embed.router, prefix="/api")
 app.include_router(config.router, prefix="/api")  # 新增配置路由
 app.include_router(query.router, prefix="/api")  # 新增查询路由
+app.include_router(knowledge_bases.router, prefix="/api")
+app.include_router(health.router, prefix="/api")
+app.include_router(admission.router, prefix="/api")
+app.include_router(documents.router, prefix="/api")
+app.include_router(shadow.router, prefix="/api")
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,6 +31,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_background_tasks():
+    # 集合统计在后台定期刷新，统计接口只读缓存
+    get_stats_service().start()
+    # 健康探测在后台执行，探针接口只读缓存
+    get_health_prober().start()
+    # LLM 缓存启用时定期按数量和存活时间压缩
+    completion_cache = get_completion_cache()
+    if completion_cache:
+        completion_cache.start()
+    # 删除累计到阈值后触发集合压缩
+    get_compaction_scheduler().start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await get_stats_service().stop()
+    await get_health_prober().stop()
+    await get_compaction_scheduler().stop()
+    if settings.shadow.enabled:
+        await get_shadow_evaluator().stop()
+    completion_cache = get_completion_cache()
+    if completion_cache:
+        await completion_cache.stop()
+    await close_http_session()
+    get_connection_manager().close_all()
+
 @app.get("/")
 def read_root():
     return {"msg": "RAG Backend is running!"}
\ No newline at end of file
@@ -0,0 +1,164 @@
+# backend/app/services/admission.py
+from typing import Dict, Any, List, Optional
+import asyncio
+import heapq
+import itertools
+import math
+
+from ..core.config import settings, AdmissionClassConfig
+
+
+class AdmissionRejected(Exception):
+    """请求未被准入：排队已满(429)或排队超时(503)，retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, admission_class: str, status_code: int, retry_after: int, reason: str):
+        super().__init__(f"{admission_class} 请求{reason}，请 {retry_after} 秒后重试")
+        self.admission_class = admission_class
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _ClassState:
+    def __init__(self, name: str, config: AdmissionClassConfig):
+        self.name = name
+        self.config = config
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        # 请求耗时的指数滑动平均，用于估算 Retry-After
+        self.avg_service_seconds = 1.0
+
+    def record_service_time(self, seconds: float):
+        self.avg_service_seconds = 0.8 * self.avg_service_seconds + 0.2 * seconds
+
+    def retry_after(self) -> int:
+        waves = (self.queued + 1) / self.config.max_concurrent
+        return max(1, math.ceil(self.avg_service_seconds * waves))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.config.model_dump(),
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_full,
+            "rejected_queue_timeout": self.rejected_timeout,
+            "avg_service_ms": round(self.avg_service_seconds * 1000, 1),
+        }
+
+
+class AdmissionController:
+    """
+    按接口类别做准入控制
+
+    每个类别有自己的并发上限和排队上限，所有类别共享 total_slots 个执行槽。
+    执行槽空闲时按优先级（同优先级先到先得）分配给排队请求，因此查询可以越过排队中的导入请求；
+    排队已满立即拒绝(429)，排队超过 queue_timeout 拒绝(503)，都带 Retry-After。
+    """
+
+    def __init__(self, total_slots: int, classes: Dict[str, AdmissionClassConfig], queue_timeout: float):
+        self.total_slots = total_slots
+        self.queue_timeout = queue_timeout
+        self.classes = {name: _ClassState(name, config) for name, config in classes.items()}
+        self.active = 0
+        # (优先级, 序号, 类别, future)
+        self._waiters: List[tuple] = []
+        self._seq = itertools.count()
+
+    def _state(self, admission_class: str) -> _ClassState:
+        state = self.classes.get(admission_class)
+        if state is None:
+            raise KeyError(f"未配置的准入类别: {admission_class}")
+        return state
+
+    def _has_capacity(self, state: _ClassState) -> bool:
+        return self.active < self.total_slots and state.active < state.config.max_concurrent
+
+    def _grant(self, state: _ClassState):
+        self.active += 1
+        state.active += 1
+        state.admitted += 1
+
+    def _dispatch(self):
+        """把空闲执行槽按优先级分配给排队请求；类别已达并发上限的请求留在队列中"""
+        blocked = []
+        while self._waiters and self.active < self.total_slots:
+            entry = heapq.heappop(self._waiters)
+            _, _, state, future = entry
+            if future.done():
+                continue
+            if state.active >= state.config.max_concurrent:
+                blocked.append(entry)
+                continue
+            state.queued -= 1
+            self._grant(state)
+            future.set_result(None)
+        for entry in blocked:
+            heapq.heappush(self._waiters, entry)
+
+    def _ahead(self, state: _ClassState) -> bool:
+        """是否有同等或更高优先级、且可以执行的请求在排队"""
+        return any(
+            not future.done() and priority <= state.config.priority
+            and waiting.active < waiting.config.max_concurrent
+            for priority, _, waiting, future in self._waiters
+        )
+
+    async def acquire(self, admission_class: str):
+        state = self._state(admission_class)
+        if self._has_capacity(state) and not self._ahead(state):
+            self._grant(state)
+            return
+        if state.queued >= state.config.max_queue:
+            state.rejected_full += 1
+            raise AdmissionRejected(admission_class, 429, state.retry_after(), "排队已满")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (state.config.priority, next(self._seq), state, future))
+        state.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # 超时/取消与分配同时发生：已拿到的执行槽要还回去
+                self.release(admission_class)
+            else:
+                future.cancel()
+                state.queued -= 1
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            state.rejected_timeout += 1
+            raise AdmissionRejected(admission_class, 503, state.retry_after(), "排队超时")
+
+    def release(self, admission_class: str, service_seconds: Optional[float] = None):
+        state = self._state(admission_class)
+        if service_seconds is not None:
+            state.record_service_time(service_seconds)
+        self.active -= 1
+        state.active -= 1
+        self._dispatch()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "total_slots": self.total_slots,
+            "active": self.active,
+            "queued": sum(state.queued for state in self.classes.values()),
+            "queue_timeout": self.queue_timeout,
+            "classes": {name: state.snapshot() for name, state in self.classes.items()},
+        }
+
+
+_admission_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController(
+            settings.admission_total_slots,
+            settings.admission_classes,
+            settings.admission_queue_timeout,
+        )
+    return _admission_controller
@@ -0,0 +1,157 @@
+# backend/app/services/batch_embedder.py
+from typing import List, Optional
+import queue
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def plan_batches(lengths: np.ndarray, token_budget: int, max_batch: int) -> List[np.ndarray]:
+    """
+    按 token 长度从长到短排序后组批，返回每批的原始下标
+
+    一批的计算量按 批大小 x 批内最长长度（即补齐后的 token 数）计，不超过 token_budget；
+    长文本的批次因此较小，短标题可以几百条一批。单条超过预算时独占一批。
+    """
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    batches = []
+    start = 0
+    while start < len(order):
+        longest = max(int(lengths[order[start]]), 1)
+        size = max(1, min(max_batch, token_budget // longest, len(order) - start))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+class _Request:
+    __slots__ = ("texts", "done", "result", "error")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.result: Optional[np.ndarray] = None
+        self.error: Optional[BaseException] = None
+
+
+class BucketedEmbeddings(Embeddings):
+    """
+    入库用的嵌入包装：按 token 长度分桶、按 token 预算组批，结果恢复为输入顺序
+
+    固定 batch_size 时，短标题和 500 字的块混在一批里大部分计算花在补齐上；
+    按长度排序后同一批内长度接近，批大小再按 token 预算确定，短文本可以多条一批。
+    max_wait_ms 内到达的并发请求（如多个小文件同时入库）合并后一起组批，避免各自凑不满一批。
+    查询向量 embed_query 直接交给底层模型，不经过合并。
+
+    底层为 sentence-transformers 模型（HuggingFaceEmbeddings）时用其分词器计算 token 长度并直接按批调用 encode，
+    其他模型按字符数估计长度、逐批调用 embed_documents。
+    """
+
+    def __init__(self, base: Embeddings, token_budget: int, max_batch: int, max_wait_ms: float = 0.0):
+        self.base = base
+        self.token_budget = token_budget
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.client = getattr(base, "client", None)
+        if not hasattr(self.client, "encode"):
+            self.client = None
+        self.tokenizer = getattr(self.client, "tokenizer", None)
+        self.max_length = getattr(self.client, "max_seq_length", None) or 512
+        encode_kwargs = dict(getattr(base, "encode_kwargs", None) or {})
+        encode_kwargs.pop("batch_size", None)
+        self.encode_kwargs = encode_kwargs
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        """每条文本截断后的 token 数（含特殊 token）"""
+        if self.tokenizer is not None:
+            encoded = self.tokenizer(
+                texts,
+                add_special_tokens=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+            )
+            return np.fromiter((len(ids) for ids in encoded["input_ids"]), dtype=np.int64, count=len(texts))
+        return np.fromiter((min(len(text), self.max_length) + 2 for text in texts), dtype=np.int64, count=len(texts))
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        if self.client is not None:
+            return np.asarray(
+                self.client.encode(texts, batch_size=len(texts), show_progress_bar=False, **self.encode_kwargs),
+                dtype=np.float32
+            )
+        return np.asarray(self.base.embed_documents(texts), dtype=np.float32)
+
+    def _embed_now(self, texts: List[str]) -> np.ndarray:
+        if self.client is not None:
+            # 与 HuggingFaceEmbeddings.embed_documents 的预处理一致
+            texts = [text.replace("\n", " ") for text in texts]
+        vectors = None
+        for indices in plan_batches(self.token_lengths(texts), self.token_budget, self.max_batch):
+            batch_vectors = self._encode([texts[i] for i in indices])
+            if vectors is None:
+                vectors = np.empty((len(texts), batch_vectors.shape[1]), dtype=np.float32)
+            vectors[indices] = batch_vectors
+        return vectors
+
+    # ---------- 并发请求合并 ----------
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            requests = [self._queue.get()]
+            pending = len(requests[0].texts)
+            deadline = time.monotonic() + self.max_wait
+            # 已够一整批时不再等待
+            while pending < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                pending += len(request.texts)
+            try:
+                vectors = self._embed_now([text for request in requests for text in request.texts])
+                offset = 0
+                for request in requests:
+                    request.result = vectors[offset:offset + len(request.texts)]
+                    offset += len(request.texts)
+            except BaseException as e:
+                for request in requests:
+                    request.error = e
+            for request in requests:
+                request.done.set()
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        """与 embed_documents 相同，返回 (n, dim) 的 float32 矩阵"""
+        if self.max_wait <= 0:
+            return self._embed_now(list(texts))
+        request = _Request(list(texts))
+        self._ensure_worker()
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.embed_documents_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
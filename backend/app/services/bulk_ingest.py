@@ -0,0 +1,230 @@
+# backend/app/services/bulk_ingest.py
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from pathlib import Path
+import asyncio
+import json
+import os
+import time
+
+from .bulk_load import BulkLoader
+from .document_processor import DocumentProcessor, make_document_id
+from .vector_service import VectorService
+
+CHECKPOINT_VERSION = 1
+
+# 进度回调: (统计快照)
+IngestProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+class IngestCheckpoint:
+    """
+    目录导入的断点文件（JSON）
+
+    以相对路径记录已完成文件的大小和修改时间，重新运行时跳过未变化的已完成文件。
+    每批写入向量库之前先把本批文件记为 in_flight，写入成功后再移入 done；
+    中断后仍在 in_flight 中的文件可能已部分写入，重新导入写入新行后再删除该文件此前已有的行。
+    """
+
+    def __init__(self, path: Path, fingerprint: Dict[str, Any]):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.done: Dict[str, Dict[str, Any]] = {}
+        self.failed: Dict[str, str] = {}
+        self.in_flight: List[str] = []
+
+    @classmethod
+    def load(cls, path: Path, fingerprint: Dict[str, Any]) -> "IngestCheckpoint":
+        checkpoint = cls(path, fingerprint)
+        if not checkpoint.path.exists():
+            return checkpoint
+        data = json.loads(checkpoint.path.read_text(encoding="utf-8"))
+        if data.get("version") != CHECKPOINT_VERSION or data.get("fingerprint") != fingerprint:
+            raise ValueError(
+                f"断点文件 {path} 与本次导入参数不一致（目标集合或分块参数已变化），请更换或删除断点文件"
+            )
+        checkpoint.done = data.get("done", {})
+        checkpoint.failed = data.get("failed", {})
+        checkpoint.in_flight = data.get("in_flight", [])
+        return checkpoint
+
+    def save(self):
+        # 先写临时文件再原子替换，写入过程中中断不会损坏断点
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps({
+            "version": CHECKPOINT_VERSION,
+            "fingerprint": self.fingerprint,
+            "updated_at": time.time(),
+            "done": self.done,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+        }, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def is_done(self, rel_path: str, stat: os.stat_result) -> bool:
+        entry = self.done.get(rel_path)
+        return entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime
+
+
+def discover_files(root: Path, extensions: List[str]) -> List[Path]:
+    """递归列出目录下指定扩展名的文件（按路径排序，保证多次运行顺序一致）"""
+    suffixes = {ext.lower() for ext in extensions}
+    return sorted(path for path in root.rglob("*") if path.is_file() and path.suffix.lower() in suffixes)
+
+
+class DirectoryIngestor:
+    """
+    目录批量导入：并行解析文件，按大批次嵌入写入向量库，并记录断点
+
+    解析和写入在流水线中重叠进行：解析任务受 parse_workers 限制，
+    写入端把完整文件的块累积到 batch_size 后一次写入。
+    给定 loader 时通过批量导入模式写入（多写入流、可延迟建索引），全部完成后统一建索引。
+
+    上次中断的文件（offset 模式下为全部待导入文件）替换本租户下已有的行：开始前查询这些文件已有的主键，
+    文件的新行写入后再删除，解析失败的文件保留原有的行。
+    """
+
+    def __init__(
+        self,
+        vector_service: VectorService,
+        processor: DocumentProcessor,
+        checkpoint: IngestCheckpoint,
+        batch_size: int = 512,
+        parse_workers: int = 4,
+        tenant: Optional[str] = None,
+        progress_callback: Optional[IngestProgressCallback] = None,
+        loader: Optional[BulkLoader] = None,
+    ):
+        self.vector_service = vector_service
+        self.processor = processor
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.parse_workers = parse_workers
+        self.tenant = tenant
+        self.progress_callback = progress_callback
+        self.loader = loader
+        # 上次中断时正在写入的文件
+        self.interrupted = set(checkpoint.in_flight)
+        # 相对路径 -> (文档ID, 写入新行后要删除的旧行主键)
+        self.old_pks: Dict[str, Tuple[str, List[str]]] = {}
+        # 已替换的文档ID，offset 模式下导入结束后清理不再被引用的文本版本
+        self.replaced_documents = set()
+        self.stats = {
+            "files_total": 0,
+            "files_skipped": 0,
+            "files_done": 0,
+            "files_failed": 0,
+            "chunks_stored": 0,
+            "batches": 0,
+            "elapsed": 0.0,
+            "files_per_second": 0.0,
+            "chunks_per_second": 0.0,
+            "eta_seconds": None,
+        }
+
+    def _report(self, started: float):
+        elapsed = time.perf_counter() - started
+        stats = self.stats
+        stats["elapsed"] = round(elapsed, 1)
+        processed = stats["files_done"] + stats["files_failed"]
+        stats["files_per_second"] = round(processed / elapsed, 2) if elapsed else 0.0
+        stats["chunks_per_second"] = round(stats["chunks_stored"] / elapsed, 1) if elapsed else 0.0
+        remaining = stats["files_total"] - stats["files_skipped"] - processed
+        stats["eta_seconds"] = round(remaining / stats["files_per_second"]) if stats["files_per_second"] else None
+        if self.progress_callback:
+            self.progress_callback(dict(stats))
+
+    async def _parse_worker(self, root: Path, paths, queue: asyncio.Queue):
+        # 多个 worker 共享同一个路径迭代器，文件数很多时也只有 parse_workers 个任务
+        for path in paths:
+            rel_path = path.relative_to(root).as_posix()
+            try:
+                # 解析前取文件状态，解析期间文件被修改时下次运行会重新导入
+                stat = path.stat()
+                chunks = await self.processor.parse_document(str(path))
+                await queue.put((rel_path, stat, chunks, None))
+            except Exception as e:
+                await queue.put((rel_path, None, None, str(e)))
+
+    async def _store(self, pending: List[Tuple[str, os.stat_result, List[Dict[str, Any]]]], started: float):
+        chunks = [chunk for _, _, file_chunks in pending for chunk in file_chunks]
+        # 上次中断的文件在重新写入成功前保留在 in_flight 中，本次再中断时下次仍会先删除
+        self.checkpoint.in_flight = sorted(self.interrupted | {rel_path for rel_path, _, _ in pending})
+        self.checkpoint.save()
+        if self.loader:
+            await self.loader.load(chunks, tenant=self.tenant)
+        else:
+            await self.vector_service.store_vectors(chunks, tenant=self.tenant)
+        replaced = [self.old_pks.pop(rel_path) for rel_path, _, _ in pending if rel_path in self.old_pks]
+        if replaced:
+            await asyncio.to_thread(self.vector_service._delete_pks, [pk for _, pks in replaced for pk in pks])
+            self.replaced_documents.update(document_id for document_id, _ in replaced)
+        for rel_path, stat, file_chunks in pending:
+            self.checkpoint.done[rel_path] = {"size": stat.st_size, "mtime": stat.st_mtime, "chunks": len(file_chunks)}
+            self.checkpoint.failed.pop(rel_path, None)
+            self.interrupted.discard(rel_path)
+        self.checkpoint.in_flight = sorted(self.interrupted)
+        self.checkpoint.save()
+        self.stats["files_done"] += len(pending)
+        self.stats["chunks_stored"] += len(chunks)
+        self.stats["batches"] += 1
+        self._report(started)
+
+    async def run(self, root: Path, files: List[Path]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        self.stats["files_total"] = len(files)
+        if self.interrupted:
+            print(f"上次中断时以下文件正在写入，重新导入后删除已写入的部分: {sorted(self.interrupted)}")
+
+        todo = []
+        for path in files:
+            if self.checkpoint.is_done(path.relative_to(root).as_posix(), path.stat()):
+                self.stats["files_skipped"] += 1
+            else:
+                todo.append(path)
+
+        offset_mode = self.vector_service.storage_mode == "offset"
+        replace = {
+            make_document_id(str(path)): path.relative_to(root).as_posix()
+            for path in todo if offset_mode or path.relative_to(root).as_posix() in self.interrupted
+        }
+        if replace:
+            # 批量导入可能删除索引并释放集合，旧行主键在开始写入前查询
+            pks = await asyncio.to_thread(self.vector_service._document_pks, list(replace), self.tenant)
+            self.old_pks = {replace[document_id]: (document_id, document_pks) for document_id, document_pks in pks.items()}
+
+        # 队列容量限制已解析但未写入的文件数，避免解析远快于嵌入时占满内存
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.parse_workers * 2)
+        paths = iter(todo)
+        producers = [
+            asyncio.create_task(self._parse_worker(root, paths, queue))
+            for _ in range(min(self.parse_workers, len(todo)))
+        ]
+
+        pending: List[Tuple[str, os.stat_result, List[Dict[str, Any]]]] = []
+        pending_chunks = 0
+        try:
+            for _ in range(len(todo)):
+                rel_path, stat, chunks, error = await queue.get()
+                if error is not None:
+                    print(f"文档解析失败 {rel_path}: {error}")
+                    self.checkpoint.failed[rel_path] = error
+                    self.stats["files_failed"] += 1
+                    continue
+                pending.append((rel_path, stat, chunks))
+                pending_chunks += len(chunks)
+                if pending_chunks >= self.batch_size:
+                    await self._store(pending, started)
+                    pending, pending_chunks = [], 0
+            if pending:
+                await self._store(pending, started)
+            if self.loader:
+                self.stats["bulk_load"] = await self.loader.finish()
+            if offset_mode and self.replaced_documents:
+                await asyncio.to_thread(self.vector_service._prune_chunk_texts, self.replaced_documents)
+        finally:
+            for task in producers:
+                task.cancel()
+            self.checkpoint.save()
+
+        self._report(started)
+        return dict(self.stats)
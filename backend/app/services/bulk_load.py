@@ -0,0 +1,233 @@
+# backend/app/services/bulk_load.py
+from typing import Dict, Any, List, Optional, Iterator, Callable, Awaitable
+import asyncio
+import json
+import time
+import uuid
+
+from pymilvus import Collection, utility
+
+from ..core.config import settings
+from .collection_schema import prepare_row_metadata
+from .knowledge_base import validate_tenant
+from .projection import ProjectedEmbeddings
+from .stats_service import get_stats_service
+from .vector_service import VectorService
+
+_VECTOR_FIELD = "vector"
+
+
+class BulkLoader:
+    """
+    大批量导入：嵌入与写入流水线并行，按消息大小切分批次并用多个写入流并发 insert，
+    可在导入期间删除向量索引，全部写入后 flush 一次再统一建索引。
+
+    load() ... -> finish()：可对多批数据多次调用 load()，最后 finish() 一次；
+    删除索引期间集合处于释放状态无法检索，适合离线导入或新知识库。
+    """
+
+    def __init__(
+        self,
+        vector_service: VectorService,
+        insert_rows: Optional[int] = None,
+        streams: Optional[int] = None,
+        defer_index: Optional[bool] = None,
+    ):
+        if not vector_service.vector_store:
+            raise Exception("向量存储未初始化")
+        self.vector_service = vector_service
+        self.insert_rows = insert_rows or settings.bulk_load_insert_rows
+        self.embed_rows = max(settings.bulk_load_embed_rows, self.insert_rows)
+        self.streams = streams or settings.bulk_load_streams
+        self.defer_index = settings.bulk_load_defer_index if defer_index is None else defer_index
+        self.prepared = False
+        self.report: Dict[str, Any] = {
+            "rows": 0,
+            "batches": 0,
+            "streams": self.streams,
+            "defer_index": self.defer_index,
+            "embed_seconds": 0.0,
+            "insert_seconds": 0.0,
+            "flush_seconds": 0.0,
+            "index_build_seconds": 0.0,
+        }
+        self._started: Optional[float] = None
+
+    @property
+    def collection(self) -> Collection:
+        return self.vector_service.vector_store.col
+
+    def _vector_indexes(self) -> list:
+        return [index for index in self.collection.indexes if index.field_name == _VECTOR_FIELD]
+
+    def _prepare(self, dim: int):
+        """创建/校验集合；需要延迟建索引时释放集合并删除向量索引"""
+        if self.prepared:
+            return
+        self.vector_service._ensure_collection(dim)
+        self.prepared = True
+        vector_indexes = self._vector_indexes()
+        if not self.defer_index or not vector_indexes:
+            return
+        collection = self.collection
+        collection.release()
+        for index in vector_indexes:
+            collection.drop_index(index_name=index.index_name)
+        print(f"批量导入: 已释放集合 {collection.name} 并删除向量索引，导入完成后重建")
+
+    def _batch_size(self, rows: List[Dict[str, Any]]) -> int:
+        """按样本行估算每行字节数，使单次 insert 消息不超过配置的上限"""
+        sample = rows[:32]
+        row_bytes = sum(
+            len(row[_VECTOR_FIELD]) * 4 + len(json.dumps({k: v for k, v in row.items() if k != _VECTOR_FIELD}, ensure_ascii=False).encode("utf-8"))
+            for row in sample
+        ) / len(sample)
+        max_rows = int(settings.bulk_load_max_batch_mb * 1024 * 1024 / max(row_bytes, 1))
+        return max(1, min(self.insert_rows, max_rows))
+
+    def _declared_fields(self) -> Optional[set]:
+        """未开启动态字段的旧集合只能写入已声明的字段；开启时返回 None（不限制）"""
+        schema = self.collection.schema
+        return None if schema.enable_dynamic_field else {field.name for field in schema.fields}
+
+    def _build_rows(self, chunks: List[Dict[str, Any]], vectors: List[List[float]], ingest_time: int) -> List[Dict[str, Any]]:
+        storage_mode = self.vector_service.storage_mode
+        fields = self._declared_fields()
+        rows = []
+        for chunk, vector in zip(chunks, vectors):
+            row = {
+                "pk": str(uuid.uuid4()),
+                "text": "" if storage_mode == "offset" else chunk.get("text", ""),
+                _VECTOR_FIELD: vector,
+            }
+            row.update(prepare_row_metadata(chunk.get("metadata", {}), ingest_time, storage_mode))
+            if fields is not None:
+                row = {key: value for key, value in row.items() if key in fields}
+            rows.append(row)
+        return rows
+
+    async def _embed_batches(self, chunks: List[Dict[str, Any]], queue: asyncio.Queue):
+        """嵌入生产者：逐批嵌入并放入写入队列，嵌入下一批与写入上一批重叠"""
+        service = self.vector_service
+        ingest_time = int(time.time())
+        batch_size = self.embed_rows
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            embed_start = time.perf_counter()
+            vectors = await asyncio.to_thread(service.embeddings.embed_documents, [chunk.get("text", "") for chunk in batch])
+            self.report["embed_seconds"] += time.perf_counter() - embed_start
+            await asyncio.to_thread(self._prepare, len(vectors[0]))
+            if service.storage_mode == "offset":
+                await asyncio.to_thread(service._use_legacy_texts, batch)
+            rows = self._build_rows(batch, vectors, ingest_time)
+            step = self._batch_size(rows)
+            for i in range(0, len(rows), step):
+                await queue.put(rows[i:i + step])
+        for _ in range(self.streams):
+            await queue.put(None)
+
+    async def _row_batches(self, batches: Iterator[List[Dict[str, Any]]], queue: asyncio.Queue):
+        """已带向量的行（如快照导入）：不做嵌入，批次在线程中读取，按消息大小切分后放入写入队列"""
+        while True:
+            rows = await asyncio.to_thread(next, batches, None)
+            if rows is None:
+                break
+            if not rows:
+                continue
+            await asyncio.to_thread(self._prepare, len(rows[0][_VECTOR_FIELD]))
+            fields = self._declared_fields()
+            if fields is not None:
+                rows = [{key: value for key, value in row.items() if key in fields} for row in rows]
+            step = self._batch_size(rows)
+            for i in range(0, len(rows), step):
+                await queue.put(rows[i:i + step])
+        for _ in range(self.streams):
+            await queue.put(None)
+
+    async def _insert_stream(self, queue: asyncio.Queue):
+        while True:
+            rows = await queue.get()
+            if rows is None:
+                return
+            await asyncio.to_thread(self.collection.insert, rows)
+            self.report["rows"] += len(rows)
+            self.report["batches"] += 1
+
+    async def load(self, chunks: List[Dict[str, Any]], tenant: Optional[str] = None) -> int:
+        """嵌入并写入一批文档块，返回写入行数"""
+        if not chunks:
+            return 0
+        if self._started is None:
+            self._started = time.perf_counter()
+        service = self.vector_service
+        if validate_tenant(tenant) is not None:
+            chunks = [{**chunk, "metadata": {**chunk.get("metadata", {}), "tenant": tenant}} for chunk in chunks]
+        if isinstance(service.embeddings, ProjectedEmbeddings) and service.embeddings.projector is None:
+            await asyncio.to_thread(service._fit_projection, [chunk.get("text", "") for chunk in chunks])
+
+        written = await self._pipeline(lambda queue: self._embed_batches(chunks, queue))
+        group_field = "document_id" if service.storage_mode == "offset" else "filename"
+        get_stats_service().record_ingest(service.collection_name, chunks, group_field=group_field)
+        return written
+
+    async def load_rows(self, batches: Iterator[List[Dict[str, Any]]]) -> int:
+        """
+        写入已带向量和主键的行（字段与集合一致），不调用嵌入模型，返回写入行数
+
+        batches 为逐批产出行的迭代器，在线程中读取；写入队列有界，同时在内存中的批次数受限。
+        """
+        if self._started is None:
+            self._started = time.perf_counter()
+        return await self._pipeline(lambda queue: self._row_batches(batches, queue))
+
+    async def _pipeline(self, producer_factory: Callable[[asyncio.Queue], Awaitable[None]]) -> int:
+        rows_before = self.report["rows"]
+        insert_start = time.perf_counter()
+        # 队列长度限制已嵌入未写入的批次数，控制内存
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.streams * 2)
+        producer = asyncio.create_task(producer_factory(queue))
+        writers = [asyncio.create_task(self._insert_stream(queue)) for _ in range(self.streams)]
+        try:
+            await asyncio.gather(producer, *writers)
+        except Exception:
+            for task in [producer, *writers]:
+                task.cancel()
+            raise
+        self.report["insert_seconds"] += time.perf_counter() - insert_start
+        return self.report["rows"] - rows_before
+
+    def _finish(self):
+        collection = self.collection
+        flush_start = time.perf_counter()
+        collection.flush()
+        self.report["flush_seconds"] = time.perf_counter() - flush_start
+        # 向量索引缺失（本次延迟建索引，或上次批量导入中断）时统一建一次
+        if not self._vector_indexes():
+            build_start = time.perf_counter()
+            collection.create_index(_VECTOR_FIELD, index_params=self.vector_service.index_params)
+            utility.wait_for_index_building_complete(
+                collection.name,
+                index_name=self._vector_indexes()[0].index_name,
+                using=self.vector_service.vector_store.alias,
+            )
+            self.report["index_build_seconds"] = time.perf_counter() - build_start
+        collection.load()
+
+    async def finish(self) -> Dict[str, Any]:
+        """flush 一次，重建被删除的向量索引并重新加载集合，返回导入报告"""
+        if self._started is None:
+            self._started = time.perf_counter()
+        if self.collection is not None:
+            await asyncio.to_thread(self._finish)
+        elapsed = time.perf_counter() - self._started
+        report = self.report
+        report["elapsed_seconds"] = elapsed
+        report["rows_per_second"] = round(report["rows"] / elapsed, 1) if elapsed else 0.0
+        for key in ("embed_seconds", "insert_seconds", "flush_seconds", "index_build_seconds", "elapsed_seconds"):
+            report[key] = round(report[key], 3)
+        get_stats_service().invalidate(self.vector_service.collection_name)
+        return dict(report)
+
+    async def run(self, chunks: List[Dict[str, Any]], tenant: Optional[str] = None) -> Dict[str, Any]:
+        await self.load(chunks, tenant)
+        return await self.finish()
@@ -0,0 +1,224 @@
+# backend/app/services/chunk_store.py
+from typing import List, Dict, Any, Optional, Set, Tuple
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+import unicodedata
+import threading
+import hashlib
+import json
+import mmap
+import os
+
+from ..core.config import settings
+
+# 页与页之间的分隔符，写入规范化文本文件时使用
+PAGE_SEPARATOR = "\n\n"
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：统一为 NFC 形式和 \\n 换行，保证偏移在写入和读取时一致"""
+    return unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+
+
+class ChunkTextStore:
+    """
+    按文档保存规范化全文的本地存储
+
+    offset 存储模式下 Milvus 每行只保存向量、document_id、text_version 和 (text_start, text_end)
+    字节偏移，检索结果返回时再通过 mmap 从对应版本的文本文件中切出块文本。
+    每个文档版本对应 {document_id}.{version}.txt（UTF-8 全文）和 {document_id}.{version}.json
+    （文件信息、页起始偏移、块起始偏移）。版本由全文和块偏移的哈希得到：重新解析出不同内容时写入新文件，
+    旧行（包括其他租户的行）仍指向旧版本文件，不会读到按新文本切出的错位内容。
+    没有 text_version 字段的旧集合使用不带版本的 {document_id}.txt/.json。
+    """
+
+    def __init__(self, root_dir: str, max_open_files: int = 64):
+        self.root_dir = Path(root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.max_open_files = max_open_files
+        self._lock = threading.Lock()
+        # document_id -> (file, mmap)，LRU 方式限制打开的文件数
+        self._maps: "OrderedDict[str, Tuple[Any, Optional[mmap.mmap]]]" = OrderedDict()
+        self._info: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def text_key(document_id: str, version: str = "") -> str:
+        """文本文件名（不含扩展名）：带版本时为 {document_id}.{version}，否则为旧的 {document_id}"""
+        return f"{document_id}.{version}" if version else document_id
+
+    def _text_path(self, key: str) -> Path:
+        return self.root_dir / f"{key}.txt"
+
+    def _info_path(self, key: str) -> Path:
+        return self.root_dir / f"{key}.json"
+
+    def write_document(
+        self,
+        document_id: str,
+        page_texts: List[str],
+        info: Dict[str, Any],
+        chunk_starts: List[int],
+    ) -> str:
+        """
+        写入文档全文的一个版本，返回版本号（相同内容和分块得到相同版本，已存在时不重复写入）
+
+        Args:
+            page_texts: 已规范化的分页文本
+            info: 文档级元数据（filename、source、file_type 等）
+            chunk_starts: 各块起始字节偏移（升序），用于还原 chunk_id
+        """
+        content = PAGE_SEPARATOR.join(page_texts).encode("utf-8")
+        digest = hashlib.sha1(content)
+        digest.update(json.dumps(chunk_starts).encode("utf-8"))
+        version = digest.hexdigest()[:12]
+        key = self.text_key(document_id, version)
+
+        with self._lock:
+            if self._text_path(key).exists() and self._info_path(key).exists():
+                return version
+            document_info = {
+                **info,
+                "document_id": document_id,
+                "text_version": version,
+                "page_offsets": self.page_offsets_for(page_texts),
+                "chunk_starts": chunk_starts,
+                "size": len(content),
+            }
+            # 先写信息文件再写文本文件，文本文件存在即表示该版本完整
+            self._write_atomic(self._info_path(key), json.dumps(document_info, ensure_ascii=False).encode("utf-8"))
+            self._write_atomic(self._text_path(key), content)
+            self._info[key] = document_info
+
+        return version
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes):
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def use_legacy_key(self, document_id: str, version: str):
+        """
+        旧集合没有 text_version 字段时，把该版本复制为不带版本的文件供其行读取
+
+        旧集合的所有行共用这一份文本，重新导入会覆盖它（与引入版本之前的行为相同）。
+        """
+        source = self.text_key(document_id, version)
+        with self._lock:
+            self._close(document_id)
+            for source_path, target_path in (
+                (self._info_path(source), self._info_path(document_id)),
+                (self._text_path(source), self._text_path(document_id)),
+            ):
+                self._write_atomic(target_path, source_path.read_bytes())
+
+    @staticmethod
+    def page_offsets_for(page_texts: List[str]) -> List[int]:
+        """不写文件，只计算每页的起始字节偏移（与 write_document 的布局一致）"""
+        offsets, offset = [], 0
+        separator_size = len(PAGE_SEPARATOR.encode("utf-8"))
+        for i, text in enumerate(page_texts):
+            if i:
+                offset += separator_size
+            offsets.append(offset)
+            offset += len(text.encode("utf-8"))
+        return offsets
+
+    def _close(self, key: str):
+        entry = self._maps.pop(key, None)
+        if entry:
+            file, mapped = entry
+            if mapped is not None:
+                mapped.close()
+            file.close()
+        self._info.pop(key, None)
+
+    def _get_map(self, key: str) -> Optional[mmap.mmap]:
+        entry = self._maps.get(key)
+        if entry is not None:
+            self._maps.move_to_end(key)
+            return entry[1]
+        file = open(self._text_path(key), "rb")
+        # 空文件无法 mmap
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else None
+        self._maps[key] = (file, mapped)
+        while len(self._maps) > self.max_open_files:
+            oldest = next(iter(self._maps))
+            self._close(oldest)
+        return mapped
+
+    def get_info(self, key: str) -> Dict[str, Any]:
+        info = self._info.get(key)
+        if info is None:
+            with open(self._info_path(key), "r", encoding="utf-8") as f:
+                info = json.load(f)
+            self._info[key] = info
+        return info
+
+    def read(self, key: str, start: int, end: int) -> str:
+        """读取 [start, end) 字节范围的文本"""
+        with self._lock:
+            mapped = self._get_map(key)
+            if mapped is None:
+                return ""
+            return mapped[start:end].decode("utf-8", errors="replace")
+
+    def hydrate(self, metadata: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """根据 Milvus 中保存的 document_id、text_version 和偏移还原块文本及完整元数据"""
+        key = self.text_key(metadata["document_id"], metadata.get("text_version", ""))
+        start, end = int(metadata["text_start"]), int(metadata["text_end"])
+        text = self.read(key, start, end)
+        with self._lock:
+            info = self.get_info(key)
+
+        hydrated = {
+            key: value for key, value in info.items()
+            if key not in ("page_offsets", "chunk_starts", "size", "paged")
+        }
+        hydrated.update(metadata)
+        hydrated["chunk_id"] = bisect_left(info["chunk_starts"], start)
+        hydrated["chunk_size"] = len(text)
+        if info.get("paged"):
+            hydrated["page"] = bisect_right(info["page_offsets"], start) - 1
+        return text, hydrated
+
+    def versions(self, document_id: str) -> List[str]:
+        """该文档在磁盘上的全部文本版本（不带版本的旧文件记为空串）"""
+        versions = [path.name[len(document_id) + 1:-len(".txt")] for path in self.root_dir.glob(f"{document_id}.*.txt")]
+        if self._text_path(document_id).exists():
+            versions.append("")
+        return sorted(versions)
+
+    def delete_document(self, document_id: str, version: str = ""):
+        """删除文档的一个文本版本（默认删除不带版本的旧文件）"""
+        key = self.text_key(document_id, version)
+        with self._lock:
+            self._close(key)
+            for path in (self._text_path(key), self._info_path(key)):
+                if path.exists():
+                    path.unlink()
+
+    def prune(self, document_id: str, referenced: Set[str]) -> List[str]:
+        """
+        删除该文档中不再被任何行引用的文本版本，返回删除的版本
+
+        referenced 由调用方查询集合得到（各租户的行都要计入）。与同一文档的并发导入同时执行时，
+        对方刚写入、尚未插入行的版本也会被删除，删除和重新导入同一文档不应并发进行。
+        """
+        removed = [version for version in self.versions(document_id) if version not in referenced]
+        for version in removed:
+            self.delete_document(document_id, version)
+        return removed
+
+
+_chunk_store: Optional[ChunkTextStore] = None
+
+
+def get_chunk_store() -> ChunkTextStore:
+    """获取全局块文本存储实例"""
+    global _chunk_store
+    if _chunk_store is None:
+        _chunk_store = ChunkTextStore(settings.chunk_text_dir)
+    return _chunk_store
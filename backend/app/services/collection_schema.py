@@ -0,0 +1,101 @@
+# backend/app/services/collection_schema.py
+from typing import Dict, Any, List, Optional
+from pymilvus import Collection, CollectionSchema, FieldSchema, DataType
+
+# 未指定租户时写入的租户标识
+DEFAULT_TENANT = "default"
+# 租户字段作为分区键，按租户过滤时只扫描对应分区
+TENANT_FIELD = ("tenant", (DataType.VARCHAR, {"max_length": 64, "is_partition_key": True}, None, DEFAULT_TENANT))
+
+# 声明为强类型字段的元数据: 字段名 -> (类型, 额外参数, 标量索引类型, 缺省值)
+# 其余元数据（source、chunk_size、start_index 等）仍写入动态字段
+SCALAR_FIELDS: Dict[str, tuple] = {
+    "document_id": (DataType.VARCHAR, {"max_length": 64}, "INVERTED", ""),
+    "filename": (DataType.VARCHAR, {"max_length": 512}, "INVERTED", ""),
+    "file_type": (DataType.VARCHAR, {"max_length": 16}, "INVERTED", ""),
+    "page": (DataType.INT64, {}, "STL_SORT", -1),
+    "chunk_id": (DataType.INT64, {}, "STL_SORT", -1),
+    "ingest_time": (DataType.INT64, {}, "STL_SORT", 0),
+    TENANT_FIELD[0]: TENANT_FIELD[1],
+}
+
+# offset 存储模式下的精简字段（见 chunk_store.py）
+OFFSET_FIELDS: Dict[str, tuple] = {
+    "document_id": (DataType.VARCHAR, {"max_length": 64}, "INVERTED", ""),
+    # 块文本文件的版本（见 ChunkTextStore.write_document）
+    "text_version": (DataType.VARCHAR, {"max_length": 16}, None, ""),
+    "text_start": (DataType.INT64, {}, None, 0),
+    "text_end": (DataType.INT64, {}, None, 0),
+    TENANT_FIELD[0]: TENANT_FIELD[1],
+}
+
+
+def typed_fields_for(storage_mode: str) -> Dict[str, tuple]:
+    return OFFSET_FIELDS if storage_mode == "offset" else SCALAR_FIELDS
+
+
+def build_collection_schema(dim: int, storage_mode: str = "inline", partition_key: bool = True) -> CollectionSchema:
+    """
+    构建集合 schema：主键、文本、向量以及强类型标量字段
+
+    inline 模式开启动态字段保存其余元数据；offset 模式只保留文档ID和文本偏移，
+    文本字段始终为空串（LangChain 解析结果时需要该字段）。
+    partition_key=False 时租户字段退化为普通标量字段（Milvus Lite 不支持按分区键字段过滤）。
+    """
+    offset_mode = storage_mode == "offset"
+    fields = [
+        FieldSchema("pk", DataType.VARCHAR, is_primary=True, auto_id=False, max_length=64),
+        FieldSchema("text", DataType.VARCHAR, max_length=8 if offset_mode else 65_535),
+        FieldSchema("vector", DataType.FLOAT_VECTOR, dim=dim),
+    ]
+    for name, (dtype, kwargs, _, _) in typed_fields_for(storage_mode).items():
+        if not partition_key:
+            kwargs = {key: value for key, value in kwargs.items() if key != "is_partition_key"}
+        fields.append(FieldSchema(name, dtype, **kwargs))
+
+    return CollectionSchema(
+        fields,
+        description="offset-referenced chunks" if offset_mode else "rag tuning chunks",
+        enable_dynamic_field=not offset_mode,
+    )
+
+
+def create_scalar_indexes(collection: Collection, storage_mode: str = "inline") -> List[str]:
+    """为标量字段建立索引，返回成功建立索引的字段（Milvus Lite 等不支持时跳过）"""
+    indexed = []
+    for name, (_, _, index_type, _) in typed_fields_for(storage_mode).items():
+        if not index_type:
+            continue
+        try:
+            collection.create_index(name, index_params={"index_type": index_type}, index_name=f"idx_{name}")
+            indexed.append(name)
+        except Exception as e:
+            print(f"标量索引创建失败 {name} ({index_type}): {e}")
+    return indexed
+
+
+def get_field_types(collection: Optional[Collection]) -> Dict[str, DataType]:
+    """读取集合中已声明的标量字段类型，用于过滤表达式编译"""
+    if collection is None:
+        return {}
+    return {
+        field.name: field.dtype
+        for field in collection.schema.fields
+        if field.dtype in (DataType.VARCHAR, DataType.INT64, DataType.INT32, DataType.DOUBLE, DataType.FLOAT, DataType.BOOL)
+        and field.name not in ("pk", "text")
+    }
+
+
+def match_all_expr(collection: Collection) -> str:
+    """匹配集合中所有行的表达式（主键为字符串 UUID，旧集合可能是整数主键）"""
+    pk_field = collection.schema.primary_field
+    return f'{pk_field.name} != ""' if pk_field.dtype == DataType.VARCHAR else f"{pk_field.name} >= 0"
+
+
+def prepare_row_metadata(metadata: Dict[str, Any], ingest_time: int, storage_mode: str = "inline") -> Dict[str, Any]:
+    """补齐强类型字段（Milvus 2.4 不支持空值），并转换为字段声明的类型"""
+    row = dict(metadata) if storage_mode != "offset" else {}
+    for name, (dtype, _, _, default) in typed_fields_for(storage_mode).items():
+        value = ingest_time if name == "ingest_time" else metadata.get(name, default)
+        row[name] = int(value) if dtype == DataType.INT64 else str(value)
+    return row
@@ -0,0 +1,112 @@
+# backend/app/services/compaction.py
+from typing import Dict, Any, Optional
+import asyncio
+import threading
+import time
+
+from pymilvus import Collection, utility
+
+from ..core.config import settings
+from .milvus_connection import ensure_connection
+
+_ALIAS = "compaction"
+
+
+class CompactionScheduler:
+    """
+    删除后的压缩调度
+
+    Milvus 的删除只写删除日志，被删除的行在压缩前仍占用段空间并参与检索过滤。
+    删除操作记录删除行数，后台任务定期检查：累计删除数同时超过绝对阈值和实体数占比时触发一次压缩。
+    压缩在服务端异步执行，这里只发起并记录压缩ID。
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, int] = {}
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record_delete(self, name: str, count: int):
+        if count <= 0:
+            return
+        with self._lock:
+            self._pending[name] = self._pending.get(name, 0) + count
+
+    def _due(self, name: str, pending: int) -> bool:
+        if pending < settings.compaction_min_deletes:
+            return False
+        if not utility.has_collection(name, using=_ALIAS):
+            return False
+        entities = Collection(name, using=_ALIAS).num_entities
+        # num_entities 包含尚未压缩的已删除行
+        return pending >= settings.compaction_delete_ratio * max(entities, 1)
+
+    def compact(self, name: str) -> Dict[str, Any]:
+        """立即对集合发起一次压缩"""
+        ensure_connection(_ALIAS)
+        collection = Collection(name, using=_ALIAS)
+        with self._lock:
+            pending = self._pending.pop(name, 0)
+        try:
+            collection.compact()
+            result = {"compaction_id": collection.compaction_id, "status": "started"}
+        except Exception as e:
+            # Milvus Lite 等不支持手动压缩时记录原因
+            result = {"compaction_id": None, "status": "error", "message": str(e)}
+        result.update({"deletes_before": pending, "started_at": time.time()})
+        self._last[name] = result
+        print(f"集合压缩 {name}: {result}")
+        return result
+
+    def check(self) -> Dict[str, Dict[str, Any]]:
+        """压缩所有达到阈值的集合"""
+        ensure_connection(_ALIAS)
+        with self._lock:
+            pending = dict(self._pending)
+        return {name: self.compact(name) for name, count in pending.items() if self._due(name, count)}
+
+    def status(self, name: Optional[str] = None) -> Dict[str, Any]:
+        names = [name] if name else sorted(set(self._pending) | set(self._last))
+        report = {}
+        for collection_name in names:
+            last = dict(self._last.get(collection_name) or {})
+            if last.get("compaction_id"):
+                try:
+                    ensure_connection(_ALIAS)
+                    state = Collection(collection_name, using=_ALIAS).get_compaction_state()
+                    last["state"] = str(state.state)
+                except Exception as e:
+                    last["state"] = f"unknown: {e}"
+            report[collection_name] = {"pending_deletes": self._pending.get(collection_name, 0), "last_compaction": last or None}
+        return report
+
+    async def _check_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.check)
+            except Exception as e:
+                print(f"压缩检查失败: {e}")
+
+    def start(self, interval: Optional[float] = None):
+        """启动后台压缩检查（在应用启动事件中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(
+                self._check_loop(interval or settings.compaction_check_interval)
+            )
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+_compaction_scheduler: Optional[CompactionScheduler] = None
+
+
+def get_compaction_scheduler() -> CompactionScheduler:
+    global _compaction_scheduler
+    if _compaction_scheduler is None:
+        _compaction_scheduler = CompactionScheduler()
+    return _compaction_scheduler
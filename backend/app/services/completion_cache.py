@@ -0,0 +1,138 @@
+# backend/app/services/completion_cache.py
+from typing import Dict, Optional
+from pathlib import Path
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from ..core.config import settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    temperature REAL NOT NULL,
+    max_tokens INTEGER NOT NULL,
+    answer TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_completions_last_used ON completions(last_used);
+CREATE INDEX IF NOT EXISTS idx_completions_created_at ON completions(created_at);
+"""
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    LLM 生成结果的持久化缓存（SQLite WAL 模式，进程重启后仍可复用）
+
+    键为 (服务, 模型, 提示词哈希, temperature, max_tokens)。只有 temperature 为 0（结果确定）
+    或开启回放模式时才读取缓存；回放模式下评测/基准测试可以不调用外部 LLM 重复运行。
+    条目数量和存活时间由后台压缩任务控制。
+    """
+
+    def __init__(self, path: str, max_entries: int, max_age_seconds: float):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(provider: str, model: str, p_hash: str, temperature: float, max_tokens: int) -> str:
+        raw = json.dumps([provider, model, p_hash, round(float(temperature), 4), max_tokens])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, provider: str, model: str, prompt: str, temperature: float, max_tokens: int) -> Optional[str]:
+        key = self._key(provider, model, prompt_hash(prompt), temperature, max_tokens)
+        with self._lock:
+            row = self._conn.execute("SELECT answer FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE completions SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key)
+            )
+        return row[0]
+
+    def put(self, provider: str, model: str, prompt: str, temperature: float, max_tokens: int, answer: str):
+        p_hash = prompt_hash(prompt)
+        key = self._key(provider, model, p_hash, temperature, max_tokens)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions "
+                "(key, provider, model, prompt_hash, temperature, max_tokens, answer, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, p_hash, float(temperature), max_tokens, answer, now, now),
+            )
+
+    def compact(self) -> Dict[str, int]:
+        """删除过期条目，超出数量上限时按最近使用时间淘汰，并截断 WAL 文件"""
+        with self._lock:
+            expired = self._conn.execute(
+                "DELETE FROM completions WHERE created_at < ?", (time.time() - self.max_age_seconds,)
+            ).rowcount
+            count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            evicted = 0
+            if count > self.max_entries:
+                evicted = self._conn.execute(
+                    "DELETE FROM completions WHERE key IN "
+                    "(SELECT key FROM completions ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                ).rowcount
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return {"expired": expired, "evicted": evicted, "remaining": count - evicted}
+
+    async def _compact_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                result = await asyncio.to_thread(self.compact)
+                if result["expired"] or result["evicted"]:
+                    print(f"LLM 缓存压缩: {result}")
+            except Exception as e:
+                print(f"LLM 缓存压缩失败: {e}")
+
+    def start(self, interval: Optional[float] = None):
+        """启动后台压缩任务（在应用启动事件中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(
+                self._compact_loop(interval or settings.LLM_CACHE_COMPACT_INTERVAL)
+            )
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+_completion_cache: Optional[CompletionCache] = None
+
+
+def get_completion_cache() -> Optional[CompletionCache]:
+    """未启用缓存时返回 None"""
+    global _completion_cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    if _completion_cache is None:
+        _completion_cache = CompletionCache(
+            settings.LLM_CACHE_PATH,
+            settings.LLM_CACHE_MAX_ENTRIES,
+            settings.LLM_CACHE_MAX_AGE_DAYS * 86400,
+        )
+    return _completion_cache
@@ -0,0 +1,88 @@
+# backend/app/services/deadline.py
+from typing import Dict, Any, List, Optional, Awaitable, TypeVar
+import asyncio
+import time
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """请求的时间预算在某个阶段耗尽"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"请求时间预算在 {stage} 阶段耗尽")
+        self.stage = stage
+
+
+class Deadline:
+    """
+    单个请求的端到端时间预算
+
+    各阶段（嵌入、检索、重排、LLM）从同一个截止时间计算剩余时间作为自己的超时；
+    可选阶段在预算紧张时被跳过或缩减，并通过 degrade() 记录，最终随响应返回。
+    budget_seconds 为 None 表示不限时，此时所有方法退化为无操作。
+    """
+
+    def __init__(self, budget_seconds: Optional[float] = None):
+        self.budget_seconds = budget_seconds
+        self.expires_at = None if budget_seconds is None else time.monotonic() + budget_seconds
+        self.degradations: List[Dict[str, Any]] = []
+
+    @classmethod
+    def from_ms(cls, budget_ms: Optional[float]) -> "Deadline":
+        return cls(None if budget_ms is None else budget_ms / 1000)
+
+    @property
+    def bounded(self) -> bool:
+        return self.expires_at is not None
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def allows(self, seconds: float) -> bool:
+        """剩余时间是否还够一个预计耗时 seconds 的阶段"""
+        remaining = self.remaining()
+        return remaining is None or remaining >= seconds
+
+    def timeout(self, cap: Optional[float] = None) -> Optional[float]:
+        """阶段超时：剩余时间与阶段自身上限取较小值"""
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        return remaining if cap is None else min(remaining, cap)
+
+    def check(self, stage: str):
+        if self.remaining() == 0:
+            raise DeadlineExceeded(stage)
+
+    def degrade(self, stage: str, action: str, **detail):
+        self.degradations.append({"stage": stage, "action": action, **detail})
+
+    async def run(self, stage: str, awaitable: Awaitable[T], cap: Optional[float] = None, grace: float = 0.0) -> T:
+        """
+        在剩余时间内等待一个阶段完成，超时抛出 DeadlineExceeded
+
+        grace 为截止时间之后额外等待的秒数，用于包裹内部已自行降级的多个阶段，
+        避免外层超时与内部降级同时触发
+        """
+        timeout = self.timeout(cap)
+        if timeout is not None:
+            timeout += grace
+        if timeout is not None and timeout <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded(stage)
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(stage)
+
+    def report(self) -> Dict[str, Any]:
+        remaining = self.remaining()
+        return {
+            "budget_ms": None if self.budget_seconds is None else round(self.budget_seconds * 1000),
+            "remaining_ms": None if remaining is None else round(remaining * 1000),
+            "degradations": self.degradations,
+        }
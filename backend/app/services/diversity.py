@@ -0,0 +1,84 @@
+# backend/app/services/diversity.py
+from typing import List, Optional, Sequence, Hashable
+import numpy as np
+
+
+def select_diverse(
+    relevance: Sequence[float],
+    k: int,
+    vectors: Optional[np.ndarray] = None,
+    lambda_mult: Optional[float] = None,
+    groups: Optional[Sequence[Hashable]] = None,
+    max_per_group: Optional[int] = None,
+) -> List[int]:
+    """
+    从候选结果中选出 k 个，返回所选候选的下标（按选中顺序）
+
+    - 给出 vectors 和 lambda_mult 时按 MMR 选择：每步选 λ·相关度 - (1-λ)·与已选结果的最大余弦相似度 最大的候选；
+      已选集合的最大相似度随每次选择以一次矩阵向量乘法增量更新，不计算完整的相似度矩阵
+    - 给出 groups 和 max_per_group 时，同一组（如同一文件）最多选 max_per_group 个
+    两者都未给出时即按相关度取前 k 个。
+
+    Args:
+        relevance: 候选与查询的相关度（COSINE 相似度），越大越相关
+        k: 选择数量
+        vectors: 候选向量 (n, dim)
+        lambda_mult: 0~1，越小越偏重多样性
+        groups: 每个候选所属的分组
+        max_per_group: 每组最多选择的数量
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    available = np.ones(n, dtype=bool)
+    group_ids = None
+    if groups is not None and max_per_group:
+        keys = {}
+        group_ids = np.fromiter((keys.setdefault(group, len(keys)) for group in groups), dtype=np.int64, count=n)
+        group_counts = np.zeros(len(keys), dtype=np.int64)
+
+    use_mmr = vectors is not None and lambda_mult is not None
+    if use_mmr:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        # 不归一化整个矩阵，只在每步得到的 n 个点积上除以范数
+        norms = np.maximum(np.sqrt(np.einsum("ij,ij->i", matrix, matrix)), 1e-12)
+        weighted_relevance = lambda_mult * relevance
+        # 每个候选与已选结果的最大相似度
+        max_similarity = np.full(n, -np.inf, dtype=np.float32)
+        penalty = 1.0 - lambda_mult
+    else:
+        order = np.argsort(-relevance, kind="stable")
+
+    selected: List[int] = []
+    cursor = 0
+    while len(selected) < k:
+        if use_mmr:
+            if selected:
+                scores = weighted_relevance - penalty * max_similarity
+            else:
+                scores = weighted_relevance.copy()
+            scores[~available] = -np.inf
+            index = int(np.argmax(scores))
+            if not np.isfinite(scores[index]):
+                break
+        else:
+            while cursor < n and not available[order[cursor]]:
+                cursor += 1
+            if cursor >= n:
+                break
+            index = int(order[cursor])
+
+        selected.append(index)
+        available[index] = False
+        if use_mmr and len(selected) < k:
+            similarity = (matrix @ matrix[index]) / (norms * norms[index])
+            np.maximum(max_similarity, similarity, out=max_similarity)
+        if group_ids is not None:
+            group = group_ids[index]
+            group_counts[group] += 1
+            if group_counts[group] >= max_per_group:
+                available[group_ids == group] = False
+    return selected
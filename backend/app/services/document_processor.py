@@ -1,30 +1,231 @@
 # backend/app/services/document_processor.py
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from langchain_community.document_loaders import (
     PyPDFLoader, 
     TextLoader
 )
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
+from .text_chunker import CJKTextChunker
+from .chunk_store import ChunkTextStore, get_chunk_store, normalize_text
+from .parse_cache import ParseCache, get_parse_cache
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import hashlib
 import asyncio
+import os
+
+from ..core.config import settings
+
+# 进度回调: (文件名, 已完成页数, 总页数)
+ProgressCallback = Callable[[str, int, int], None]
+
+# 进程池在所有文档间共享，避免多个大PDF同时解析时各自起一批进程
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+_pdf_executor_workers = 0
+
+def _get_pdf_executor(max_workers: int) -> ProcessPoolExecutor:
+    """获取（必要时重建）PDF解析进程池"""
+    global _pdf_executor, _pdf_executor_workers
+    if _pdf_executor is None or _pdf_executor_workers != max_workers:
+        if _pdf_executor is not None:
+            _pdf_executor.shutdown(wait=False)
+        _pdf_executor = ProcessPoolExecutor(max_workers=max_workers)
+        _pdf_executor_workers = max_workers
+    return _pdf_executor
+
+def make_document_id(file_path: str) -> str:
+    """由文件绝对路径生成稳定的文档ID，同一文件重复嵌入时保持不变"""
+    return hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:16]
+
+def _count_pdf_pages(file_path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(file_path).pages)
+
+def _extract_pdf_page_range(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """在子进程中提取 [start, end) 页的文本，与 PyPDFLoader 的提取方式保持一致"""
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return [(page, reader.pages[page].extract_text(extraction_mode="plain")) for page in range(start, end)]
 
 class DocumentProcessor:
     """基于 LangChain v0.3 的文档解析处理器"""
     
-    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50):
+    def __init__(
+        self,
+        chunk_size: int = 500,
+        chunk_overlap: int = 50,
+        pdf_workers: Optional[int] = None,
+        pdf_page_threshold: Optional[int] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        splitter: Optional[str] = None,
+        chunk_unit: Optional[str] = None,
+        storage_mode: Optional[str] = None,
+    ):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.splitter = splitter or settings.default_splitter
+        self.chunk_unit = chunk_unit or settings.default_chunk_unit
+        self.storage_mode = storage_mode or settings.chunk_storage_mode
+        self.pdf_workers = pdf_workers or settings.pdf_parallel_workers
+        self.pdf_page_threshold = pdf_page_threshold or settings.pdf_parallel_page_threshold
+        self.progress_callback = progress_callback
         
         # 初始化文本分割器 (v0.3 语法)
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""],
-            keep_separator=False,
-            is_separator_regex=False,
+        if self.splitter == "cjk":
+            # 单遍扫描、识别中文句末标点和Markdown标题的分块器
+            self.text_splitter = CJKTextChunker(
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                unit=self.chunk_unit,
+            )
+        elif self.splitter == "recursive":
+            if self.chunk_unit == "tokens":
+                self.text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+                    chunk_size=chunk_size,
+                    chunk_overlap=chunk_overlap,
+                    separators=["\n\n", "\n", " ", ""],
+                    add_start_index=True,
+                )
+            else:
+                self.text_splitter = RecursiveCharacterTextSplitter(
+                    chunk_size=chunk_size,
+                    chunk_overlap=chunk_overlap,
+                    length_function=len,
+                    separators=["\n\n", "\n", " ", ""],
+                    keep_separator=False,
+                    is_separator_regex=False,
+                    add_start_index=True,
+                )
+        else:
+            raise ValueError(f"不支持的分块器: {self.splitter}")
+    
+    def _report_progress(self, filename: str, done: int, total: int):
+        if self.progress_callback:
+            self.progress_callback(filename, done, total)
+        else:
+            print(f"PDF解析进度 {filename}: {done}/{total} 页")
+    
+    async def _load_pdf(self, file_path: str) -> List[Document]:
+        """
+        加载PDF：页数超过阈值时按页段拆分到进程池并行提取，
+        结果按页码顺序重新组装，page 元数据与 PyPDFLoader 一致
+        """
+        filename = Path(file_path).name
+        total_pages = await asyncio.to_thread(_count_pdf_pages, file_path)
+        
+        if self.pdf_workers <= 1 or total_pages < self.pdf_page_threshold:
+            documents = await asyncio.to_thread(PyPDFLoader(file_path).load)
+            self._report_progress(filename, total_pages, total_pages)
+            return documents
+        
+        pages_per_task = max(1, settings.pdf_pages_per_task)
+        executor = _get_pdf_executor(self.pdf_workers)
+        loop = asyncio.get_running_loop()
+        futures = [
+            loop.run_in_executor(
+                executor, _extract_pdf_page_range, file_path, start, min(start + pages_per_task, total_pages)
+            )
+            for start in range(0, total_pages, pages_per_task)
+        ]
+        
+        page_texts: Dict[int, str] = {}
+        for future in asyncio.as_completed(futures):
+            for page, text in await future:
+                page_texts[page] = text
+            self._report_progress(filename, len(page_texts), total_pages)
+        
+        return [
+            Document(page_content=page_texts[page], metadata={"source": file_path, "page": page})
+            for page in range(total_pages)
+        ]
+    
+    async def _load_documents(self, file_path: str) -> List[Document]:
+        """根据文件类型选择合适的加载器，返回按页/文件组织的 Document 列表"""
+        file_extension = Path(file_path).suffix.lower()
+        
+        if file_extension == '.pdf':
+            return await self._load_pdf(file_path)
+        elif file_extension in ['.md', '.markdown']:
+            # 将Markdown文件当作文本文件处理，避免UnstructuredMarkdownLoader的依赖问题
+            loader = TextLoader(
+                file_path, 
+                encoding='utf-8',
+                autodetect_encoding=True
+            )
+        elif file_extension == '.txt':
+            loader = TextLoader(
+                file_path, 
+                encoding='utf-8',
+                autodetect_encoding=True
+            )
+        else:
+            raise ValueError(f"不支持的文件类型: {file_extension}")
+        
+        # 异步加载文档 (v0.3 支持异步操作)
+        return await asyncio.to_thread(loader.load)
+    
+    async def _load_cached_documents(self, file_path: str, cache: Optional[ParseCache], file_hash: Optional[str]) -> List[Document]:
+        """优先从解析缓存读取每页文本，未命中时解析文件并写入缓存"""
+        if cache:
+            documents = await asyncio.to_thread(cache.load_pages, file_hash, file_path)
+            if documents is not None:
+                return documents
+        documents = await self._load_documents(file_path)
+        if cache:
+            await asyncio.to_thread(cache.save_pages, file_hash, documents)
+        return documents
+    
+    @property
+    def chunk_cache_key(self) -> str:
+        """决定分块结果的参数；offset 模式分块前会规范化文本，结果不同"""
+        return f"{self.splitter}|{self.chunk_unit}|{self.chunk_size}|{self.chunk_overlap}|{self.storage_mode == 'offset'}"
+    
+    def _split_pages(self, documents: List[Document]) -> List[Tuple[int, Document]]:
+        """逐页分块，返回 (页序号, 块) 列表，以便换算块在全文中的偏移"""
+        chunks = []
+        for page_index, document in enumerate(documents):
+            for chunk in self.text_splitter.split_documents([document]):
+                if "start_index" in chunk.metadata and "end_index" not in chunk.metadata:
+                    chunk.metadata["end_index"] = chunk.metadata["start_index"] + len(chunk.page_content)
+                chunks.append((page_index, chunk))
+        return chunks
+    
+    def _write_chunk_texts(
+        self,
+        document_id: str,
+        documents: List[Document],
+        chunks: List[Tuple[int, Document]],
+        info: Dict[str, Any],
+    ):
+        """offset 存储模式：写入文档全文的一个版本，并为每个块记录 text_version 和 text_start/text_end 字节偏移"""
+        page_texts = [document.page_content for document in documents]
+        page_offsets = ChunkTextStore.page_offsets_for(page_texts)
+        
+        # 按页增量换算字符偏移到字节偏移，避免对每个块重复编码整个前缀
+        cursors: Dict[int, Tuple[int, int]] = {}
+        for page_index, chunk in chunks:
+            text = page_texts[page_index]
+            start = chunk.metadata["start_index"]
+            char_pos, byte_pos = cursors.get(page_index, (0, 0))
+            if start >= char_pos:
+                byte_pos += len(text[char_pos:start].encode("utf-8"))
+            else:
+                byte_pos = len(text[:start].encode("utf-8"))
+            cursors[page_index] = (start, byte_pos)
+            
+            text_start = page_offsets[page_index] + byte_pos
+            chunk.metadata["text_start"] = text_start
+            chunk.metadata["text_end"] = text_start + len(chunk.page_content.encode("utf-8"))
+        
+        version = get_chunk_store().write_document(
+            document_id,
+            page_texts,
+            info,
+            [chunk.metadata["text_start"] for _, chunk in chunks],
         )
+        for _, chunk in chunks:
+            chunk.metadata["text_version"] = version
     
     async def parse_document(self, file_path: str) -> List[Dict[str, Any]]:
         """
@@ -34,39 +235,51 @@ class DocumentProcessor:
         file_extension = Path(file_path).suffix.lower()
         filename = Path(file_path).name
         
-        # 根据文件类型选择合适的加载器
         try:
-            if file_extension == '.pdf':
-                loader = PyPDFLoader(file_path)
-            elif file_extension in ['.md', '.markdown']:
-                # 将Markdown文件当作文本文件处理，避免UnstructuredMarkdownLoader的依赖问题
-                loader = TextLoader(
-                    file_path, 
-                    encoding='utf-8',
-                    autodetect_encoding=True
-                )
-            elif file_extension == '.txt':
-                loader = TextLoader(
-                    file_path, 
-                    encoding='utf-8',
-                    autodetect_encoding=True
-                )
-            else:
-                raise ValueError(f"不支持的文件类型: {file_extension}")
+            document_id = make_document_id(file_path)
+            cache = get_parse_cache()
+            file_hash = await asyncio.to_thread(cache.file_hash, file_path) if cache else None
+            chunks = None
+            if cache:
+                # 同一文件、同一分块参数的分块结果直接复用，不再解析和分块
+                chunks = await asyncio.to_thread(cache.load_chunks, file_hash, self.chunk_cache_key, file_path)
+            
+            documents = None
+            # offset 模式需要全文写入块文本存储，分块命中缓存时也要取每页文本（同样来自缓存）
+            if chunks is None or self.storage_mode == "offset":
+                documents = await self._load_cached_documents(file_path, cache, file_hash)
+                if self.storage_mode == "offset":
+                    for document in documents:
+                        document.page_content = normalize_text(document.page_content)
             
-            # 异步加载文档 (v0.3 支持异步操作)
-            documents = await asyncio.to_thread(loader.load)
+            if chunks is None:
+                # 分块处理
+                chunks = await asyncio.to_thread(self._split_pages, documents)
+                if cache:
+                    await asyncio.to_thread(cache.save_chunks, file_hash, self.chunk_cache_key, chunks)
             
-            # 分块处理
-            chunks = await asyncio.to_thread(self.text_splitter.split_documents, documents)
+            if self.storage_mode == "offset":
+                await asyncio.to_thread(
+                    self._write_chunk_texts,
+                    document_id,
+                    documents,
+                    chunks,
+                    {
+                        "filename": filename,
+                        "file_type": file_extension,
+                        "source": file_path,
+                        "paged": file_extension == '.pdf',
+                    },
+                )
             
             # 转换为标准格式
             processed_chunks = []
-            for i, chunk in enumerate(chunks):
+            for i, (_, chunk) in enumerate(chunks):
                 # v0.3 中 Document 对象结构
                 processed_chunks.append({
                     "text": chunk.page_content,
                     "metadata": {
+                        "document_id": document_id,
                         "filename": filename,
                         "chunk_id": i,
                         "file_type": file_extension,
@@ -0,0 +1,250 @@
+# backend/app/services/embedding_server.py
+from typing import Callable, List, Optional, Tuple
+import multiprocessing
+import os
+import signal
+import socket
+import stat
+import struct
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..core.config import settings
+
+OP_DOCUMENTS = 1
+OP_QUERY = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# 请求：操作、模型路径字节数、文本条数；随后是模型路径、每条文本的字节数(uint32 数组)、拼接的 UTF-8 文本
+_REQUEST_HEADER = struct.Struct("<BHI")
+# 响应：状态、行数（出错时为错误信息字节数）、维度；随后是 行数 x 维度 的 float32 原始字节或错误信息
+_RESPONSE_HEADER = struct.Struct("<BII")
+
+
+class EmbeddingServerError(RuntimeError):
+    """嵌入服务不可用或编码失败"""
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("连接已关闭")
+        received += count
+    return buffer
+
+
+def encode_request(op: int, model_path: str, texts: List[str]) -> bytes:
+    model_bytes = model_path.encode("utf-8")
+    encoded = [text.encode("utf-8") for text in texts]
+    return b"".join([
+        _REQUEST_HEADER.pack(op, len(model_bytes), len(encoded)),
+        model_bytes,
+        np.fromiter((len(item) for item in encoded), dtype="<u4", count=len(encoded)).tobytes(),
+        *encoded,
+    ])
+
+
+def read_request(sock: socket.socket) -> Tuple[int, str, List[str]]:
+    op, model_size, count = _REQUEST_HEADER.unpack(_recv_exact(sock, _REQUEST_HEADER.size))
+    model_path = _recv_exact(sock, model_size).decode("utf-8")
+    lengths = np.frombuffer(_recv_exact(sock, 4 * count), dtype="<u4")
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    payload = _recv_exact(sock, int(offsets[-1]))
+    return op, model_path, [payload[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(count)]
+
+
+def _send_vectors(sock: socket.socket, vectors: np.ndarray):
+    vectors = np.ascontiguousarray(vectors, dtype="<f4")
+    rows, dim = vectors.shape
+    sock.sendall(_RESPONSE_HEADER.pack(STATUS_OK, rows, dim))
+    if vectors.size:
+        sock.sendall(memoryview(vectors).cast("B"))
+
+
+def _send_error(sock: socket.socket, message: str):
+    payload = message.encode("utf-8")
+    sock.sendall(_RESPONSE_HEADER.pack(STATUS_ERROR, len(payload), 0) + payload)
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    通过 Unix socket 调用嵌入服务进程的嵌入模型
+
+    向量以 float32 原始字节返回，不经过 JSON；每个线程保持一条长连接，连接断开时重连并重试一次。
+    """
+
+    def __init__(self, socket_path: str, model_path: str, timeout: Optional[float] = None):
+        self.socket_path = socket_path
+        self.model_path = model_path
+        self.timeout = timeout or settings.embedding_server_timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _call(self, op: int, texts: List[str]) -> np.ndarray:
+        request = encode_request(op, self.model_path, texts)
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                sock.sendall(request)
+                status, rows, dim = _RESPONSE_HEADER.unpack(_recv_exact(sock, _RESPONSE_HEADER.size))
+                body = _recv_exact(sock, rows * dim * 4 if status == STATUS_OK else rows)
+                break
+            except TimeoutError as e:
+                # 服务端可能仍在编码，连接上的响应已错位，不再重试
+                self._close()
+                raise EmbeddingServerError(f"嵌入服务超时: {self.socket_path}") from e
+            except OSError as e:
+                self._close()
+                if attempt:
+                    raise EmbeddingServerError(f"嵌入服务不可用 {self.socket_path}: {e}") from e
+        if status != STATUS_OK:
+            raise EmbeddingServerError(body.decode("utf-8"))
+        return np.frombuffer(body, dtype="<f4").reshape(rows, dim)
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        """与 embed_documents 相同，返回 (n, dim) 的 float32 矩阵"""
+        return self._call(OP_DOCUMENTS, list(texts))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.embed_documents_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call(OP_QUERY, [text])[0].tolist()
+
+
+def _handle_connection(conn: socket.socket, get_model: Callable[[str], Embeddings]):
+    with conn:
+        while True:
+            try:
+                op, model_path, texts = read_request(conn)
+            except OSError:
+                return
+            try:
+                model = get_model(model_path)
+                if op == OP_QUERY:
+                    vectors = np.asarray([model.embed_query(texts[0])], dtype=np.float32)
+                elif not texts:
+                    vectors = np.empty((0, 0), dtype=np.float32)
+                elif hasattr(model, "embed_documents_array"):
+                    vectors = model.embed_documents_array(texts)
+                else:
+                    vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+                _send_vectors(conn, vectors)
+            except OSError:
+                return
+            except Exception as e:
+                try:
+                    _send_error(conn, f"嵌入失败: {e}")
+                except OSError:
+                    return
+
+
+def _serve_replica(listener: socket.socket, preload: List[str]):
+    """模型进程：加载模型后在共享的监听 socket 上 accept，每条连接一个线程"""
+    # 由父进程统一处理中断；fork 继承了父进程的 SIGTERM 处理函数，恢复默认行为使 terminate() 生效
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    from .vector_service import load_embedding_model
+
+    models = {}
+    lock = threading.Lock()
+
+    def get_model(model_path: str) -> Embeddings:
+        with lock:
+            if model_path not in models:
+                models[model_path] = load_embedding_model(model_path)
+            return models[model_path]
+
+    for model_path in preload:
+        get_model(model_path)
+    print(f"嵌入服务进程 {os.getpid()} 就绪")
+    while True:
+        conn, _ = listener.accept()
+        conn.settimeout(None)
+        threading.Thread(target=_handle_connection, args=(conn, get_model), daemon=True).start()
+
+
+class EmbeddingServer:
+    """
+    嵌入服务：父进程绑定 Unix socket 后 fork 出 replicas 个模型进程
+
+    各模型进程在同一个监听 socket 上 accept，由内核分配连接，进程内的并发请求再由分桶组批合并。
+    API 的多个 uvicorn worker 设置 embedding_server_socket 后共享这些模型进程，
+    内存随模型进程数而不是 API worker 数增长，编码也不再占用 API 进程的 GIL。
+    父进程只负责监控，模型进程异常退出时重新拉起。
+    """
+
+    def __init__(self, socket_path: str, replicas: int = 1, preload: Optional[List[str]] = None):
+        self.socket_path = socket_path
+        self.replicas = replicas
+        self.preload = preload or []
+        self._stopping = False
+
+    def _start_replica(self, listener: socket.socket) -> multiprocessing.Process:
+        # fork：子进程直接继承已绑定的监听 socket；父进程不加载模型，fork 时没有 torch 线程
+        process = multiprocessing.get_context("fork").Process(
+            target=_serve_replica, args=(listener, self.preload), daemon=True
+        )
+        process.start()
+        return process
+
+    def _stop(self, *_):
+        self._stopping = True
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            if not stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                raise EmbeddingServerError(f"{self.socket_path} 已存在且不是 socket")
+            os.unlink(self.socket_path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.socket_path)
+        listener.listen(128)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        processes = [self._start_replica(listener) for _ in range(self.replicas)]
+        print(f"嵌入服务监听 {self.socket_path}，模型进程 {self.replicas} 个")
+        try:
+            while not self._stopping:
+                for index, process in enumerate(processes):
+                    if not process.is_alive():
+                        print(f"嵌入服务进程 {process.pid} 退出(code={process.exitcode})，重新启动")
+                        processes[index] = self._start_replica(listener)
+                time.sleep(0.5)
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join(timeout=10)
+            listener.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            print("嵌入服务已停止")
@@ -0,0 +1,340 @@
+# backend/app/services/file_preview.py
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+import codecs
+import hashlib
+import json
+import mmap
+import os
+import threading
+
+import numpy as np
+
+from ..core.config import settings
+from .document_processor import _count_pdf_pages, _extract_pdf_page_range
+
+# 依次尝试的文本编码；BOM 单独识别
+_SNIFF_ENCODINGS = ("utf-8", "gbk")
+_UTF8_BOM = codecs.BOM_UTF8
+# 构建行索引时每次扫描的字节数
+_SCAN_BLOCK = 16 * 1024 * 1024
+
+# 缓存键: (绝对路径, 文件大小, 修改时间)，文件被覆盖上传后自动失效
+FileKey = Tuple[str, int, int]
+
+
+def file_key(path: str) -> FileKey:
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+class _LRU:
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key: Any, value: Any):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+@contextmanager
+def _mapped(path: str):
+    """只读映射整个文件；空文件无法 mmap，返回 None"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield None
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+def _complete_prefix(data: bytes, encoding: str) -> int:
+    """data 中可以完整解码的前缀长度（去掉末尾被截断的多字节字符）"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    decoder.decode(data, final=False)
+    return len(data) - len(decoder.getstate()[0])
+
+
+class FilePreviewService:
+    """
+    大文件预览
+
+    文本文件按页返回：编码只在首次访问时用文件开头的样本识别一次并缓存；
+    页按字节范围或行范围读取，通过 mmap 只取所需的字节，页边界对齐到行尾（单行过长时对齐到字符边界），
+    返回的 next_offset / next_line 直接作为下一页的起点。
+    行范围通过稀疏行索引（每 line_index_step 行记录一次起始偏移）定位。
+    PDF 按页返回提取出的文本，提取结果缓存在 preview_cache_dir 中，文件变化后重新提取。
+
+    所有方法都是同步阻塞的，由接口层放到线程中执行。
+    """
+
+    def __init__(self, cache_dir: str, sniff_bytes: int, line_index_step: int, max_cached_files: int = 256):
+        self.cache_dir = Path(cache_dir)
+        self.sniff_bytes = sniff_bytes
+        self.line_index_step = line_index_step
+        self._encodings = _LRU(max_cached_files)
+        self._line_indexes = _LRU(max_cached_files)
+        # 已提取的 PDF 分页文本可能很大，内存中只保留少量
+        self._pdf_pages = _LRU(8)
+
+    # ---------- 编码识别 ----------
+
+    def detect_encoding(self, path: str) -> Optional[str]:
+        """返回文件编码（utf-8-sig / utf-8 / gbk），都无法解码时返回 None"""
+        key = file_key(path)
+        cached = self._encodings.get(key)
+        if cached is not None:
+            return cached or None
+        with open(path, "rb") as f:
+            sample = f.read(self.sniff_bytes)
+        # 样本小于采样长度说明已读到文件末尾，末尾不完整的字符视为错误
+        whole_file = len(sample) < self.sniff_bytes
+        encoding = None
+        if sample.startswith(_UTF8_BOM):
+            encoding = "utf-8-sig"
+        else:
+            for candidate in _SNIFF_ENCODINGS:
+                try:
+                    codecs.getincrementaldecoder(candidate)().decode(sample, final=whole_file)
+                    encoding = candidate
+                    break
+                except UnicodeDecodeError:
+                    continue
+        self._encodings.put(key, encoding or "")
+        return encoding
+
+    @staticmethod
+    def _body_start(encoding: str) -> int:
+        return len(_UTF8_BOM) if encoding == "utf-8-sig" else 0
+
+    @staticmethod
+    def _codec(encoding: str) -> str:
+        # BOM 在读取时按偏移跳过，其余部分按 utf-8 解码
+        return "utf-8" if encoding == "utf-8-sig" else encoding
+
+    # ---------- 按字节范围分页 ----------
+
+    def _align_start(self, mapped: mmap.mmap, offset: int, limit: int, encoding: str) -> int:
+        """把任意起点对齐到下一行开头；附近没有换行时对齐到字符边界"""
+        body_start = self._body_start(encoding)
+        if offset <= body_start:
+            return body_start
+        if mapped[offset - 1] == 0x0A:
+            return offset
+        newline = mapped.find(b"\n", offset, offset + limit)
+        if newline != -1:
+            return newline + 1
+        if self._codec(encoding) == "utf-8":
+            # 跳过 UTF-8 续字节；GBK 无法从中间判断字符边界，由 errors="replace" 兜底
+            while offset < len(mapped) and 0x80 <= mapped[offset] < 0xC0:
+                offset += 1
+        return offset
+
+    def _align_end(self, mapped: mmap.mmap, start: int, end: int, encoding: str) -> int:
+        """把页尾对齐到最后一个完整行；整页没有换行时对齐到最后一个完整字符"""
+        if end >= len(mapped):
+            return len(mapped)
+        newline = mapped.rfind(b"\n", start, end)
+        if newline != -1:
+            return newline + 1
+        return start + _complete_prefix(mapped[start:end], self._codec(encoding))
+
+    def read_page(self, path: str, offset: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
+        """读取从 offset 开始、最多 limit 字节的一页文本"""
+        encoding = self.detect_encoding(path)
+        if encoding is None:
+            raise UnicodeError("文件编码不支持，无法预览")
+        limit = min(limit or settings.preview_page_bytes, settings.preview_max_page_bytes)
+        with _mapped(path) as mapped:
+            size = len(mapped) if mapped is not None else 0
+            if mapped is None or offset >= size:
+                start = end = size
+                content = ""
+            else:
+                start = self._align_start(mapped, max(offset, 0), limit, encoding)
+                end = self._align_end(mapped, start, min(start + limit, size), encoding)
+                content = mapped[start:end].decode(self._codec(encoding), errors="replace")
+        return {
+            "content": content,
+            "encoding": encoding,
+            "offset": start,
+            "next_offset": end,
+            "size": size,
+            "eof": end >= size,
+        }
+
+    # ---------- 按行分页 ----------
+
+    def _build_line_index(self, path: str) -> Dict[str, Any]:
+        """扫描一遍文件，记录第 0、step、2*step... 行的起始字节偏移"""
+        step = self.line_index_step
+        offsets = [0]
+        newlines_seen = 0
+        size = 0
+        with _mapped(path) as mapped:
+            if mapped is not None:
+                size = len(mapped)
+                for pos in range(0, size, _SCAN_BLOCK):
+                    block = np.frombuffer(mapped, dtype=np.uint8, count=min(_SCAN_BLOCK, size - pos), offset=pos)
+                    newlines = np.flatnonzero(block == 0x0A)
+                    # 全局第 k 个换行（从 1 计）之后是第 k 行的开头，记录 k 为 step 整数倍的位置
+                    first = (step - 1 - newlines_seen) % step
+                    offsets.extend((newlines[first::step] + pos + 1).tolist())
+                    newlines_seen += len(newlines)
+                    # 释放对 mmap 缓冲区的引用，否则无法关闭映射
+                    del block, newlines
+                # 最后一行没有换行符时也算一行
+                total_lines = newlines_seen + (1 if mapped[size - 1] != 0x0A else 0)
+            else:
+                total_lines = 0
+        return {"offsets": offsets, "total_lines": total_lines, "size": size}
+
+    def line_index(self, path: str) -> Dict[str, Any]:
+        key = file_key(path)
+        index = self._line_indexes.get(key)
+        if index is None:
+            index = self._build_line_index(path)
+            self._line_indexes.put(key, index)
+        return index
+
+    def read_lines(self, path: str, start_line: int = 0, lines: int = 200) -> Dict[str, Any]:
+        """读取从第 start_line 行（从 0 计）开始的若干行，单页字节数不超过 preview_max_page_bytes"""
+        encoding = self.detect_encoding(path)
+        if encoding is None:
+            raise UnicodeError("文件编码不支持，无法预览")
+        index = self.line_index(path)
+        start_line = min(max(start_line, 0), index["total_lines"])
+        max_bytes = settings.preview_max_page_bytes
+        with _mapped(path) as mapped:
+            size = len(mapped) if mapped is not None else 0
+            if start_line >= index["total_lines"]:
+                # 已到文件末尾，返回空页
+                start = size
+            else:
+                start = max(index["offsets"][start_line // self.line_index_step], self._body_start(encoding))
+                # 从最近的索引点向后数到目标行
+                for _ in range(start_line % self.line_index_step):
+                    newline = mapped.find(b"\n", start)
+                    if newline == -1:
+                        start = size
+                        break
+                    start = newline + 1
+            end, read_lines, truncated = start, 0, False
+            while read_lines < lines and end < size:
+                newline = mapped.find(b"\n", end, start + max_bytes)
+                if newline == -1:
+                    if start + max_bytes >= size:
+                        # 文件最后一行（没有换行符）
+                        end, read_lines = size, read_lines + 1
+                    elif read_lines == 0:
+                        # 单行超过页大小上限时截断到字符边界，next_line 仍指向该行，后续内容按 next_offset 读取
+                        end = start + _complete_prefix(mapped[start:start + max_bytes], self._codec(encoding))
+                        truncated = True
+                    break
+                end = newline + 1
+                read_lines += 1
+            content = mapped[start:end].decode(self._codec(encoding), errors="replace") if size else ""
+        next_line = start_line + read_lines
+        return {
+            "content": content,
+            "encoding": encoding,
+            "start_line": start_line,
+            "next_line": next_line,
+            "total_lines": index["total_lines"],
+            "truncated": truncated,
+            "offset": start,
+            "next_offset": end,
+            "size": size,
+            "eof": next_line >= index["total_lines"],
+        }
+
+    # ---------- 流式读取 ----------
+
+    def iter_text(self, path: str, start: int = 0, end: Optional[int] = None, chunk_bytes: int = 256 * 1024) -> Iterator[str]:
+        """按块解码 [start, end) 范围的文本，多字节字符跨块时由增量解码器拼接"""
+        encoding = self.detect_encoding(path)
+        if encoding is None:
+            raise UnicodeError("文件编码不支持，无法预览")
+        decoder = codecs.getincrementaldecoder(self._codec(encoding))(errors="replace")
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            end = size if end is None else min(end, size)
+            position = max(start, self._body_start(encoding))
+            f.seek(position)
+            while position < end:
+                data = f.read(min(chunk_bytes, end - position))
+                if not data:
+                    break
+                position += len(data)
+                text = decoder.decode(data, final=position >= end)
+                if text:
+                    yield text
+
+    # ---------- PDF 分页文本 ----------
+
+    def _pdf_cache_path(self, key: FileKey) -> Path:
+        digest = hashlib.sha1(f"{key[0]}|{key[1]}|{key[2]}".encode("utf-8")).hexdigest()[:20]
+        return self.cache_dir / f"pdf_{digest}.json"
+
+    def pdf_page_texts(self, path: str) -> List[str]:
+        """PDF 各页提取出的文本（与入库解析使用相同的提取方式），优先读取缓存"""
+        key = file_key(path)
+        pages = self._pdf_pages.get(key)
+        if pages is not None:
+            return pages
+        cache_path = self._pdf_cache_path(key)
+        if cache_path.exists():
+            with open(cache_path, "r", encoding="utf-8") as f:
+                pages = json.load(f)["pages"]
+        else:
+            pages = [text for _, text in _extract_pdf_page_range(path, 0, _count_pdf_pages(path))]
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_suffix(".json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"source": key[0], "size": key[1], "mtime_ns": key[2], "pages": pages}, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        self._pdf_pages.put(key, pages)
+        return pages
+
+    def read_pdf_pages(self, path: str, page: int = 0, count: int = 1) -> Dict[str, Any]:
+        """读取从第 page 页（从 0 计，与检索结果中的 page 元数据一致）开始的 count 页文本"""
+        pages = self.pdf_page_texts(path)
+        page = min(max(page, 0), len(pages))
+        selected = pages[page:page + count]
+        return {
+            "pages": [{"page": page + i, "text": text} for i, text in enumerate(selected)],
+            "page_count": len(pages),
+            "next_page": page + len(selected),
+            "eof": page + len(selected) >= len(pages),
+        }
+
+
+_file_preview: Optional[FilePreviewService] = None
+
+
+def get_file_preview() -> FilePreviewService:
+    global _file_preview
+    if _file_preview is None:
+        _file_preview = FilePreviewService(
+            settings.preview_cache_dir,
+            settings.preview_sniff_bytes,
+            settings.preview_line_index_step,
+        )
+    return _file_preview
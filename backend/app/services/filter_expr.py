@@ -0,0 +1,109 @@
+# backend/app/services/filter_expr.py
+from typing import Dict, Any
+from pymilvus import DataType
+
+# 支持的比较运算符 -> Milvus 表达式运算符
+_COMPARISON_OPS = {
+    "$eq": "==",
+    "$ne": "!=",
+    "$gt": ">",
+    "$gte": ">=",
+    "$lt": "<",
+    "$lte": "<=",
+}
+_STRING_TYPES = (DataType.VARCHAR,)
+_INT_TYPES = (DataType.INT64, DataType.INT32)
+_FLOAT_TYPES = (DataType.DOUBLE, DataType.FLOAT)
+
+MAX_DEPTH = 8
+MAX_IN_VALUES = 1000
+
+
+class FilterCompileError(ValueError):
+    """过滤条件不合法"""
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _literal(field: str, dtype: DataType, value: Any) -> str:
+    """按字段类型校验并格式化字面量，拒绝任何可能拼接出额外表达式的值"""
+    if dtype in _STRING_TYPES:
+        if not isinstance(value, str):
+            raise FilterCompileError(f"字段 {field} 需要字符串值")
+        return _quote(value)
+    if dtype in _INT_TYPES:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise FilterCompileError(f"字段 {field} 需要整数值")
+        return str(value)
+    if dtype in _FLOAT_TYPES:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise FilterCompileError(f"字段 {field} 需要数值")
+        return repr(float(value))
+    if dtype == DataType.BOOL:
+        if not isinstance(value, bool):
+            raise FilterCompileError(f"字段 {field} 需要布尔值")
+        return "true" if value else "false"
+    raise FilterCompileError(f"字段 {field} 的类型不支持过滤")
+
+
+def _compile_field(field: str, dtype: DataType, condition: Any) -> str:
+    if not isinstance(condition, dict):
+        return f"{field} == {_literal(field, dtype, condition)}"
+
+    clauses = []
+    for op, value in condition.items():
+        if op in _COMPARISON_OPS:
+            clauses.append(f"{field} {_COMPARISON_OPS[op]} {_literal(field, dtype, value)}")
+        elif op in ("$in", "$nin"):
+            if not isinstance(value, list) or not value:
+                raise FilterCompileError(f"{op} 需要非空列表")
+            if len(value) > MAX_IN_VALUES:
+                raise FilterCompileError(f"{op} 最多支持 {MAX_IN_VALUES} 个值")
+            values = ", ".join(_literal(field, dtype, item) for item in value)
+            clauses.append(f"{field} {'in' if op == '$in' else 'not in'} [{values}]")
+        elif op == "$prefix":
+            if dtype not in _STRING_TYPES or not isinstance(value, str):
+                raise FilterCompileError("$prefix 只能用于字符串字段")
+            escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("%", "\\%").replace("_", "\\_")
+            clauses.append(f'{field} like "{escaped}%"')
+        else:
+            raise FilterCompileError(f"不支持的运算符: {op}")
+    if not clauses:
+        raise FilterCompileError(f"字段 {field} 的过滤条件为空")
+    return " and ".join(clauses) if len(clauses) == 1 else "(" + " and ".join(clauses) + ")"
+
+
+def _compile(node: Any, field_types: Dict[str, DataType], depth: int) -> str:
+    if depth > MAX_DEPTH:
+        raise FilterCompileError("过滤条件嵌套过深")
+    if not isinstance(node, dict) or not node:
+        raise FilterCompileError("过滤条件必须是非空对象")
+
+    clauses = []
+    for key, value in node.items():
+        if key in ("$and", "$or"):
+            if not isinstance(value, list) or not value:
+                raise FilterCompileError(f"{key} 需要非空列表")
+            parts = [_compile(item, field_types, depth + 1) for item in value]
+            joiner = " and " if key == "$and" else " or "
+            clauses.append("(" + joiner.join(parts) + ")")
+        elif key == "$not":
+            clauses.append(f"not ({_compile(value, field_types, depth + 1)})")
+        elif key in field_types:
+            clauses.append(_compile_field(key, field_types[key], value))
+        else:
+            raise FilterCompileError(f"不支持按字段 {key} 过滤，可用字段: {', '.join(sorted(field_types))}")
+    return clauses[0] if len(clauses) == 1 else "(" + " and ".join(clauses) + ")"
+
+
+def compile_filter(filter_dict: Dict[str, Any], field_types: Dict[str, DataType]) -> str:
+    """
+    将 filter_metadata JSON 编译为 Milvus 布尔表达式
+
+    只允许集合中声明的强类型字段，值按字段类型校验并转义。示例:
+        {"filename": "a.pdf", "page": {"$gte": 2}}
+        {"$or": [{"file_type": ".md"}, {"file_type": {"$in": [".txt", ".pdf"]}}]}
+    """
+    return _compile(filter_dict, field_types, 0)
@@ -0,0 +1,136 @@
+# backend/app/services/health_service.py
+from typing import Dict, Any, Optional, Callable, Awaitable
+import asyncio
+import time
+
+from pymilvus import utility
+
+from ..core.config import settings, get_db_type_display_name
+from .knowledge_base import get_knowledge_base
+from .llm_service import LLMService
+from .llm_resilience import circuit_states
+from .milvus_connection import ensure_connection
+from .vector_service import VectorService, is_embedding_model_loaded
+
+_ALIAS = "health_probe"
+
+
+class HealthProber:
+    """
+    分层健康检查
+
+    - liveness: 进程存活即可，不做任何外部调用
+    - readiness: Milvus 可达（一次元数据 gRPC 调用）且默认知识库的嵌入模型已加载
+    - LLM 可达性只影响 degraded 标记（LLM 不可用时仍可返回降级答案）
+
+    各项探测由后台任务定期执行并缓存结果，探针请求只读缓存；结果超过 TTL 视为 unknown。
+    """
+
+    def __init__(self):
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._warmup: Optional[asyncio.Task] = None
+        self.started_at = time.time()
+
+    def _ping_milvus(self) -> Dict[str, Any]:
+        # list_collections 只读 RootCoord 元数据，是 Lite 和标准版都支持的最轻量 gRPC 调用
+        ensure_connection(_ALIAS)
+        collections = utility.list_collections(timeout=settings.health_probe_timeout, using=_ALIAS)
+        return {"collections": len(collections), "database_type": get_db_type_display_name()}
+
+    async def _check_milvus(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._ping_milvus)
+
+    async def _check_embedding_model(self) -> Dict[str, Any]:
+        model_name = get_knowledge_base().embed_model
+        if not is_embedding_model_loaded(model_name):
+            raise RuntimeError(f"嵌入模型 {model_name} 尚未加载")
+        return {"model": model_name}
+
+    async def _check_llm(self) -> Dict[str, Any]:
+        result = await LLMService().health_check(timeout=settings.health_probe_timeout)
+        if result.get("status") != "ok":
+            raise RuntimeError(result.get("message", "LLM 服务不可用"))
+        return {**result, "circuits": circuit_states()}
+
+    async def _run(self, name: str, check: Callable[[], Awaitable[Dict[str, Any]]]):
+        start = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(check(), timeout=settings.health_probe_timeout)
+            result = {"status": "ok", **detail}
+        except asyncio.TimeoutError:
+            result = {"status": "error", "message": f"探测超时 ({settings.health_probe_timeout}s)"}
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        result["checked_at"] = time.time()
+        self._results[name] = result
+
+    async def probe(self):
+        """执行一轮全部探测"""
+        await asyncio.gather(
+            self._run("milvus", self._check_milvus),
+            self._run("embedding_model", self._check_embedding_model),
+            self._run("llm", self._check_llm),
+        )
+
+    def _cached(self, name: str) -> Dict[str, Any]:
+        result = self._results.get(name)
+        if result is None:
+            return {"status": "unknown", "message": "尚未探测"}
+        if time.time() - result["checked_at"] > settings.health_cache_ttl:
+            return {**result, "status": "unknown", "message": "探测结果已过期"}
+        return result
+
+    def liveness(self) -> Dict[str, Any]:
+        return {"status": "alive", "uptime_seconds": round(time.time() - self.started_at, 1)}
+
+    def readiness(self) -> Dict[str, Any]:
+        checks = {name: self._cached(name) for name in ("milvus", "embedding_model", "llm")}
+        ready = checks["milvus"]["status"] == "ok" and checks["embedding_model"]["status"] == "ok"
+        return {
+            "status": "ready" if ready else "not_ready",
+            "degraded": checks["llm"]["status"] != "ok",
+            "checks": checks,
+        }
+
+    def _warm_up_embedding_model(self):
+        kb = get_knowledge_base()
+        VectorService(model_name=kb.embed_model, index_type=kb.index_type, index_params=kb.index_params)
+
+    async def _warm_up(self):
+        try:
+            await asyncio.to_thread(self._warm_up_embedding_model)
+        except Exception as e:
+            print(f"嵌入模型预热失败: {e}")
+        await self.probe()
+
+    async def _probe_loop(self, interval: float):
+        while True:
+            await self.probe()
+            await asyncio.sleep(interval)
+
+    def start(self, interval: Optional[float] = None):
+        """启动后台探测，并预热默认知识库的嵌入模型（在应用启动事件中调用）"""
+        loop = asyncio.get_running_loop()
+        if self._warmup is None:
+            self._warmup = loop.create_task(self._warm_up())
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._probe_loop(interval or settings.health_probe_interval))
+
+    async def stop(self):
+        for task in (self._task, self._warmup):
+            if task:
+                task.cancel()
+        self._task = None
+        self._warmup = None
+
+
+_health_prober: Optional[HealthProber] = None
+
+
+def get_health_prober() -> HealthProber:
+    global _health_prober
+    if _health_prober is None:
+        _health_prober = HealthProber()
+    return _health_prober
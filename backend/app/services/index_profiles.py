@@ -0,0 +1,200 @@
+# backend/app/services/index_profiles.py
+from typing import Dict, Any, Optional, Tuple
+import json
+import math
+
+METRIC_TYPE = "COSINE"
+
+# 索引配置档案: 名称 -> Milvus 索引类型、默认建索引参数、默认检索参数
+INDEX_PROFILES: Dict[str, Dict[str, Any]] = {
+    "flat": {
+        "index_type": "FLAT",
+        "build": {},
+        "search": {},
+        "description": "暴力检索，召回率100%，内存为原始向量大小",
+    },
+    "ivf_flat": {
+        "index_type": "IVF_FLAT",
+        "build": {"nlist": 128},
+        "search": {"nprobe": 16},
+        "description": "倒排+原始向量，内存与FLAT相当",
+    },
+    "ivf_sq8": {
+        "index_type": "IVF_SQ8",
+        "build": {"nlist": 128},
+        "search": {"nprobe": 16},
+        "description": "倒排+8bit标量量化，内存约为原始向量的1/4",
+    },
+    "ivf_pq": {
+        "index_type": "IVF_PQ",
+        "build": {"nlist": 128, "m": 16, "nbits": 8},
+        "search": {"nprobe": 16},
+        "description": "倒排+乘积量化，每向量 m*nbits/8 字节，压缩比最高",
+    },
+    "scann": {
+        "index_type": "SCANN",
+        "build": {"nlist": 128, "with_raw_data": True},
+        "search": {"nprobe": 16, "reorder_k": 100},
+        "description": "4bit快速扫描PQ，可保留原始向量重排",
+    },
+    "hnsw": {
+        "index_type": "HNSW",
+        "build": {"M": 8, "efConstruction": 64},
+        "search": {"ef": 64},
+        "description": "图索引，延迟最低，内存为原始向量+图结构",
+    },
+    "hnsw_sq": {
+        "index_type": "HNSW_SQ",
+        "build": {"M": 8, "efConstruction": 64, "sq_type": "SQ8"},
+        "search": {"ef": 64},
+        "description": "图索引+标量量化（需 Milvus 2.5+），向量部分内存约为1/4",
+    },
+}
+
+# Milvus Lite 只支持以下索引类型，其余类型在 Lite 下退回 FLAT
+LITE_SUPPORTED = {"flat", "ivf_flat"}
+
+_SQ_TYPE_BYTES = {"SQ4U": 0.5, "SQ6": 0.75, "SQ8": 1, "BF16": 2, "FP16": 2}
+
+
+class IndexConfigError(ValueError):
+    """索引参数不合法"""
+
+
+def _check_int(params: Dict[str, Any], key: str, low: int, high: int):
+    value = params.get(key)
+    if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+        raise IndexConfigError(f"参数 {key} 必须是 [{low}, {high}] 范围内的整数，当前值: {value!r}")
+
+
+def resolve_profile(index_type: str, is_lite: bool = False) -> str:
+    """规范化索引名称，Lite 模式下对不支持的类型退回 flat"""
+    name = index_type.lower()
+    if name not in INDEX_PROFILES:
+        raise IndexConfigError(f"不支持的索引类型: {index_type}，可选: {', '.join(INDEX_PROFILES)}")
+    if is_lite and name not in LITE_SUPPORTED:
+        print(f"Milvus Lite 不支持 {index_type} 索引，使用 FLAT")
+        return "flat"
+    return name
+
+
+def validate_params(
+    profile: str,
+    build: Dict[str, Any],
+    search: Dict[str, Any],
+    dim: Optional[int] = None,
+    top_k: int = 1,
+):
+    """校验建索引/检索参数；dim 已知时同时校验与维度相关的约束"""
+    if "nlist" in build:
+        _check_int(build, "nlist", 1, 65536)
+    if "nprobe" in search:
+        _check_int(search, "nprobe", 1, build.get("nlist", 65536))
+    if profile in ("hnsw", "hnsw_sq"):
+        _check_int(build, "M", 2, 2048)
+        _check_int(build, "efConstruction", 8, 512)
+        _check_int(search, "ef", max(1, top_k), 32768)
+    if profile == "hnsw_sq" and build.get("sq_type") not in _SQ_TYPE_BYTES:
+        raise IndexConfigError(f"sq_type 必须是 {', '.join(_SQ_TYPE_BYTES)} 之一")
+    if profile == "ivf_pq":
+        _check_int(build, "m", 1, 65536)
+        _check_int(build, "nbits", 1, 16)
+        if dim is not None and dim % build["m"]:
+            raise IndexConfigError(f"IVF_PQ 的 m={build['m']} 必须整除向量维度 {dim}")
+    if profile == "scann":
+        if dim is not None and dim % 2:
+            raise IndexConfigError(f"SCANN 要求向量维度为偶数，当前维度 {dim}")
+        if "reorder_k" in search:
+            _check_int(search, "reorder_k", max(1, top_k), 16384)
+
+
+def build_index_config(
+    index_type: str,
+    overrides: Optional[Dict[str, Any]] = None,
+    is_lite: bool = False,
+    dim: Optional[int] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    生成 (index_params, search_params)
+
+    overrides 可同时包含建索引参数和检索参数（如 {"nlist": 1024, "nprobe": 32}），
+    按所属档案自动归类；未知参数直接报错，避免拼写错误被静默忽略。
+    """
+    profile = resolve_profile(index_type, is_lite)
+    spec = INDEX_PROFILES[profile]
+    build, search = dict(spec["build"]), dict(spec["search"])
+    # Lite 下退回 FLAT 时原索引类型的参数不再适用
+    fell_back = profile != index_type.lower()
+
+    for key, value in ({} if fell_back else overrides or {}).items():
+        if key in build:
+            build[key] = value
+        elif key in search:
+            search[key] = value
+        else:
+            raise IndexConfigError(f"索引 {spec['index_type']} 不支持参数 {key}")
+
+    validate_params(profile, build, search, dim)
+    index_params = {"metric_type": METRIC_TYPE, "index_type": spec["index_type"], "params": build}
+    search_params = {"metric_type": METRIC_TYPE, "params": search}
+    return index_params, search_params
+
+
+def estimate_index_memory(index_type: str, params: Dict[str, Any], num_vectors: int, dim: int) -> int:
+    """
+    估算索引常驻内存（字节），用于在召回率和内存之间取舍
+
+    只计入向量数据、量化码本、聚类中心和图结构，不含标量字段和 Milvus 自身开销。
+    """
+    profile = index_type.lower()
+    n, d = num_vectors, dim
+    raw = n * d * 4
+    ids = n * 8
+    nlist = params.get("nlist", 128)
+    centroids = nlist * d * 4
+
+    if profile == "flat":
+        return raw
+    if profile == "ivf_flat":
+        return raw + centroids + ids
+    if profile == "ivf_sq8":
+        return n * d + centroids + ids + 2 * d * 4
+    if profile == "ivf_pq":
+        m, nbits = params.get("m", 16), params.get("nbits", 8)
+        codes = n * math.ceil(m * nbits / 8)
+        codebook = m * (2 ** nbits) * (d // max(m, 1)) * 4
+        return codes + codebook + centroids + ids
+    if profile == "scann":
+        # 每两维一个 4bit 子量化器
+        codes = n * math.ceil(d / 2 * 4 / 8)
+        return codes + centroids + ids + (raw if params.get("with_raw_data", True) else 0)
+    if profile in ("hnsw", "hnsw_sq"):
+        # 第0层每个节点 2M 条邻接边（int32），上层约再增加 10%
+        graph = int(n * params.get("M", 8) * 2 * 4 * 1.1)
+        if profile == "hnsw":
+            return raw + graph
+        return int(n * d * _SQ_TYPE_BYTES.get(params.get("sq_type", "SQ8"), 1)) + graph
+    raise IndexConfigError(f"不支持的索引类型: {index_type}")
+
+
+def parse_index_params(raw: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    解析 Collection.indexes 返回的索引参数，得到 (索引类型, 建索引参数)
+
+    不同 Milvus 版本返回嵌套的 params（可能是 JSON 字符串）或扁平的字符串值，这里统一还原为数值。
+    """
+    params = raw.get("params")
+    if isinstance(params, str):
+        params = json.loads(params)
+    if params is None:
+        params = {key: value for key, value in raw.items() if key not in ("index_type", "metric_type", "dim")}
+
+    parsed = {}
+    for key, value in params.items():
+        if isinstance(value, str):
+            if value.lstrip("-").isdigit():
+                value = int(value)
+            elif value.lower() in ("true", "false"):
+                value = value.lower() == "true"
+        parsed[key] = value
+    return raw.get("index_type", ""), parsed
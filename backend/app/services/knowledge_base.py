@@ -0,0 +1,81 @@
+# backend/app/services/knowledge_base.py
+from typing import Dict, Any, Optional
+import re
+
+from ..core.config import settings, KnowledgeBaseConfig
+
+# 默认知识库 + 默认模型沿用原有集合名，已有数据无需迁移
+LEGACY_COLLECTION = "rag_tuning_docs"
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z][A-Za-z0-9_]{0,47}$")
+_TENANT_MAX_LENGTH = 64
+
+
+class KnowledgeBaseError(ValueError):
+    """知识库不存在或配置不合法"""
+
+
+def _sanitize(name: str) -> str:
+    return re.sub(r"[^0-9A-Za-z_]", "_", name).strip("_").lower()
+
+
+def collection_name_for(model_name: str, knowledge_base: Optional[str] = None, storage_mode: str = "inline") -> str:
+    """
+    计算集合名：知识库 + 嵌入模型 + 存储模式 + 降维投影
+
+    不同模型的向量维度不同，不能写入同一集合，因此非默认模型的集合名带模型后缀。
+    """
+    kb = knowledge_base or settings.default_knowledge_base
+    name = LEGACY_COLLECTION if kb == settings.default_knowledge_base else f"rag_kb_{_sanitize(kb)}"
+    if model_name != settings.default_embedding_model:
+        name = f"{name}_{_sanitize(model_name)}"
+    if storage_mode == "offset":
+        name = f"{name}_ref"
+    if settings.embedding_projection != "none":
+        # 投影后的向量维度不同，写入独立集合
+        name = f"{name}_{settings.embedding_projection}{settings.projection_dim}"
+    return name
+
+
+def get_knowledge_base(name: Optional[str] = None) -> KnowledgeBaseConfig:
+    """获取知识库配置，未指定时返回默认知识库"""
+    name = name or settings.default_knowledge_base
+    if name not in settings.knowledge_bases:
+        raise KnowledgeBaseError(f"知识库不存在: {name}，可选: {', '.join(settings.knowledge_bases)}")
+    return settings.knowledge_bases[name]
+
+
+def register_knowledge_base(name: str, config: KnowledgeBaseConfig) -> KnowledgeBaseConfig:
+    """注册或更新知识库（运行时生效，与数据库配置更新一致不落盘）"""
+    if not _NAME_PATTERN.match(name):
+        raise KnowledgeBaseError("知识库名称必须以字母开头，只包含字母、数字和下划线，且不超过48个字符")
+    if config.embed_model not in settings.embedding_models:
+        raise KnowledgeBaseError(f"不支持的嵌入模型: {config.embed_model}")
+    existing = settings.knowledge_bases.get(name)
+    if existing and existing.embed_model != config.embed_model:
+        # 换模型会落到另一个集合，已导入的数据对该知识库不可见，要求显式新建
+        raise KnowledgeBaseError(f"知识库 {name} 已使用模型 {existing.embed_model}，不能修改嵌入模型")
+    settings.knowledge_bases[name] = config
+    return config
+
+
+def validate_tenant(tenant: Optional[str]) -> Optional[str]:
+    if tenant is None:
+        return None
+    if not tenant or len(tenant) > _TENANT_MAX_LENGTH:
+        raise KnowledgeBaseError(f"租户标识长度必须在 1-{_TENANT_MAX_LENGTH} 之间")
+    return tenant
+
+
+def describe_knowledge_bases() -> Dict[str, Any]:
+    return {
+        "default": settings.default_knowledge_base,
+        "knowledge_bases": [
+            {
+                "name": name,
+                "collection_name": collection_name_for(kb.embed_model, name, settings.chunk_storage_mode),
+                **kb.model_dump(),
+            }
+            for name, kb in settings.knowledge_bases.items()
+        ],
+    }
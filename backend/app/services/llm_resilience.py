@@ -0,0 +1,218 @@
+# backend/app/services/llm_resilience.py
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+from collections import deque
+import asyncio
+import random
+import time
+
+from ..core.config import settings
+from .deadline import Deadline
+
+# 可重试的 HTTP 状态码：超时、限流和服务端临时错误
+RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class ProviderError(Exception):
+    """LLM 服务调用失败；retryable 表示同一服务重试可能成功"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = True):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+class CircuitOpenError(ProviderError):
+    """熔断器打开，跳过该服务"""
+
+    def __init__(self, provider: str):
+        super().__init__(f"{provider} 熔断中", retryable=False)
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后打开，reset_timeout 秒内直接跳过该服务；
+    之后进入半开状态只放行一个试探请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release_probe(self):
+        """试探请求被取消、没有结果时释放名额，下一个请求可以继续试探"""
+        self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class LatencyTracker:
+    """记录最近成功请求的耗时，用于计算对冲请求的触发延迟"""
+
+    def __init__(self, window: int = 200):
+        self.samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        # 样本太少时百分位数不可靠，不触发对冲
+        if len(self.samples) < 20:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+# 进程级状态：LLMService 按请求创建，熔断和延迟统计需跨请求保留
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, LatencyTracker] = {}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    if provider not in _breakers:
+        _breakers[provider] = CircuitBreaker(
+            provider, settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_TIMEOUT
+        )
+    return _breakers[provider]
+
+
+def get_latency_tracker(provider: str) -> LatencyTracker:
+    return _latencies.setdefault(provider, LatencyTracker())
+
+
+def circuit_states() -> Dict[str, Dict[str, Any]]:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
+
+
+def retry_delay(attempt: int) -> float:
+    """指数退避 + 全抖动，避免大量请求同时重试"""
+    cap = min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+async def _hedged(call: Callable[[], Awaitable[str]], delay: Optional[float], path: List[Dict[str, Any]], provider: str) -> str:
+    """发出请求，delay 秒后仍未返回则再发一个相同请求，取先成功的结果"""
+    first = asyncio.ensure_future(call())
+    # 调用方被取消或出错时，finally 中取消仍未完成的请求
+    pending = {first}
+    error: Optional[BaseException] = None
+    try:
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+
+        second = asyncio.ensure_future(call())
+        path.append({"provider": provider, "event": "hedge", "after_ms": round(delay * 1000, 1)})
+        pending = {first, second}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        path.append({"provider": provider, "event": "hedge_won"})
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_with_resilience(
+    provider: str,
+    call: Callable[[], Awaitable[str]],
+    path: List[Dict[str, Any]],
+    deadline: Optional[Deadline] = None,
+) -> str:
+    """
+    对单个服务执行：熔断检查 -> 调用（可选对冲）-> 可重试错误按抖动退避重试
+
+    每次尝试的结果追加到 path，供响应 metadata 报告。给定 deadline 时，
+    预算耗尽后不再发起尝试，退避等待也不会越过截止时间
+    """
+    breaker = get_breaker(provider)
+    tracker = get_latency_tracker(provider)
+    attempts = settings.LLM_MAX_RETRIES + 1
+    deadline = deadline or Deadline()
+
+    for attempt in range(attempts):
+        if not deadline.allows(0.001):
+            path.append({"provider": provider, "attempt": attempt + 1, "status": "deadline"})
+            raise ProviderError(f"{provider} 请求时间预算已耗尽", retryable=False)
+        if not breaker.allow():
+            path.append({"provider": provider, "attempt": attempt + 1, "status": "circuit_open"})
+            raise CircuitOpenError(provider)
+
+        hedge_delay = None
+        if settings.LLM_HEDGE_ENABLED:
+            p95 = tracker.percentile(settings.LLM_HEDGE_PERCENTILE)
+            hedge_delay = max(p95, settings.LLM_HEDGE_MIN_DELAY) if p95 is not None else None
+
+        start = time.perf_counter()
+        try:
+            answer = await _hedged(call, hedge_delay, path, provider)
+        except ProviderError as e:
+            breaker.record_failure()
+            retrying = e.retryable and attempt + 1 < attempts
+            path.append({
+                "provider": provider,
+                "attempt": attempt + 1,
+                "status": "error",
+                "http_status": e.status,
+                "error": str(e),
+                "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            })
+            delay = retry_delay(attempt)
+            if not retrying or not deadline.allows(delay):
+                raise
+            await asyncio.sleep(delay)
+            continue
+        except asyncio.CancelledError:
+            # 对冲落败、截止时间或客户端断开导致取消，不计为失败
+            breaker.release_probe()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+
+        elapsed = time.perf_counter() - start
+        breaker.record_success()
+        tracker.record(elapsed)
+        path.append({"provider": provider, "attempt": attempt + 1, "status": "ok", "latency_ms": round(elapsed * 1000, 1)})
+        return answer
+
+    raise ProviderError(f"{provider} 重试次数已用尽")
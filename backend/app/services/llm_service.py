@@ -2,11 +2,32 @@
 import logging
 import asyncio
 import aiohttp
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from app.core.config import settings
+from app.services.llm_resilience import ProviderError, RETRYABLE_STATUSES, call_with_resilience
+from app.services.singleflight import get_group
+from app.services.completion_cache import get_completion_cache
+from app.services.deadline import Deadline
 
 logger = logging.getLogger(__name__)
 
+# 进程内共享的 HTTP 连接池，复用到 LLM 服务的 TCP/TLS 连接
+_http_session: Optional[aiohttp.ClientSession] = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=settings.LLM_POOL_SIZE, keepalive_timeout=60)
+        )
+    return _http_session
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
 class LLMService:
     def __init__(self):
         self.model_type = getattr(settings, 'LLM_MODEL_TYPE', 'deepseek')
@@ -16,85 +37,157 @@ class LLMService:
         self.ollama_url = getattr(settings, 'OLLAMA_URL', 'http://localhost:11434')
         
     async def generate_answer(self, question: str, context: str, temperature: float = 0.7) -> str:
-        try:
-            if self.model_type == 'deepseek':
-                return await self._call_deepseek(question, context, temperature)
-            elif self.model_type == 'ollama':
-                return await self._call_ollama(question, context, temperature)
-            else:
-                return self._generate_fallback_answer(question, context)
-        except Exception as e:
-            logger.error(f"生成答案失败: {str(e)}")
-            return self._generate_fallback_answer(question, context)
+        answer, _ = await self.generate_answer_with_metadata(question, context, temperature)
+        return answer
     
-    async def _call_deepseek(self, question: str, context: str, temperature: float) -> str:
-        if not self.api_key:
-            logger.warning("DeepSeek API密钥未配置，使用fallback答案")
-            return self._generate_fallback_answer(question, context)
-        
+    def _provider_chain(self) -> List[str]:
+        """主服务 + 配置的故障转移服务（去重，按顺序尝试）"""
+        chain = []
+        for provider in [self.model_type] + list(settings.LLM_FAILOVER_PROVIDERS):
+            if provider in ('deepseek', 'ollama') and provider not in chain:
+                chain.append(provider)
+        return chain
+    
+    async def generate_answer_with_metadata(
+        self,
+        question: str,
+        context: str,
+        temperature: float = 0.7,
+        deadline: Optional[Deadline] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        依次尝试服务链中的各个 LLM 服务，每个服务带熔断、抖动重试和可选的对冲请求；
+        全部失败时返回基于上下文的降级答案。metadata 中记录每条路径的结果。
+        相同提示词、参数和时间预算的并发调用共享一次生成（由首个调用的 deadline 约束各次 HTTP 超时）；
+        预算不同的调用可能降级为不同结果，不相互合并
+        """
         prompt = self._build_prompt(question, context)
+        deadline = deadline or Deadline()
+        key = (tuple(self._provider_chain()), self.model_name, prompt, temperature, deadline.budget_seconds)
+        (answer, metadata), shared = await get_group("llm").do(
+            key, lambda: self._generate_with_failover(question, context, prompt, temperature, deadline)
+        )
+        return answer, {**metadata, "coalesced": shared}
+    
+    async def _generate_with_failover(
+        self,
+        question: str,
+        context: str,
+        prompt: str,
+        temperature: float,
+        deadline: Deadline
+    ) -> Tuple[str, Dict[str, Any]]:
+        path: List[Dict[str, Any]] = []
+        cache = get_completion_cache()
+        # temperature 为 0 时结果确定可直接复用；回放模式下无论 temperature 都复用
+        use_cache = cache is not None and (temperature == 0 or settings.LLM_CACHE_REPLAY)
+        
+        for provider in self._provider_chain():
+            model = self._provider_model(provider)
+            if use_cache:
+                cached = await asyncio.to_thread(cache.get, provider, model, prompt, temperature, settings.LLM_MAX_TOKENS)
+                if cached is not None:
+                    path.append({"provider": provider, "status": "cache_hit"})
+                    return cached, {"provider": provider, "fallback": False, "cached": True, "path": path}
+            if provider == 'deepseek' and not self.api_key:
+                logger.warning("DeepSeek API密钥未配置，跳过")
+                path.append({"provider": provider, "status": "not_configured"})
+                continue
+            if not deadline.allows(0.001):
+                # 预算耗尽后不再尝试后续服务，直接返回降级答案
+                deadline.degrade("llm", "fallback_answer", provider=provider)
+                break
+            try:
+                answer = await call_with_resilience(
+                    provider,
+                    lambda provider=provider: self._call_provider(provider, prompt, temperature, deadline),
+                    path,
+                    deadline
+                )
+                if cache is not None:
+                    # 所有结果都写入缓存，之后可用回放模式复现
+                    await asyncio.to_thread(cache.put, provider, model, prompt, temperature, settings.LLM_MAX_TOKENS, answer)
+                return answer, {"provider": provider, "fallback": False, "cached": False, "path": path}
+            except ProviderError as e:
+                logger.error(f"{provider} 调用失败: {str(e)}")
         
+        return self._generate_fallback_answer(question, context), {"provider": "fallback", "fallback": True, "path": path}
+    
+    def _provider_model(self, provider: str) -> str:
+        if provider == self.model_type:
+            return self.model_name
+        return settings.OLLAMA_MODEL_NAME if provider == 'ollama' else 'deepseek-chat'
+    
+    async def _call_provider(self, provider: str, prompt: str, temperature: float, deadline: Optional[Deadline] = None) -> str:
+        deadline = deadline or Deadline()
+        try:
+            if provider == 'deepseek':
+                return await self._call_deepseek(prompt, temperature, deadline.timeout(settings.LLM_TIMEOUT))
+            return await self._call_ollama(prompt, temperature, deadline.timeout(60))
+        except ProviderError:
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ProviderError(f"{provider} 调用异常: {str(e) or type(e).__name__}")
+        except Exception as e:
+            # 200 响应但内容格式异常（JSON 解析失败、缺少字段等），重试同一服务无益，交给故障转移或降级答案
+            raise ProviderError(f"{provider} 响应异常: {type(e).__name__}: {e}", retryable=False)
+    
+    async def _call_deepseek(self, prompt: str, temperature: float, timeout: Optional[float] = None) -> str:
         headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
         
         payload = {
-            'model': self.model_name,
+            'model': self._provider_model('deepseek'),
             'messages': [{'role': 'user', 'content': prompt}],
             'temperature': temperature,
-            'max_tokens': 1000,
+            'max_tokens': settings.LLM_MAX_TOKENS,
             'stream': False
         }
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/v1/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        answer = result['choices'][0]['message']['content']
-                        logger.info("DeepSeek API调用成功")
-                        return answer.strip()
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"DeepSeek API调用失败: {response.status}, {error_text}")
-                        return self._generate_fallback_answer(question, context)
-        except Exception as e:
-            logger.error(f"DeepSeek API调用异常: {str(e)}")
-            return self._generate_fallback_answer(question, context)
+        async with get_http_session().post(
+            f"{self.base_url}/v1/chat/completions",
+            headers=headers,
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=settings.LLM_TIMEOUT if timeout is None else timeout)
+        ) as response:
+            if response.status == 200:
+                result = await response.json()
+                answer = result['choices'][0]['message']['content']
+                logger.info("DeepSeek API调用成功")
+                return answer.strip()
+            error_text = await response.text()
+            raise ProviderError(
+                f"DeepSeek API调用失败: {response.status}, {error_text[:200]}",
+                status=response.status,
+                retryable=response.status in RETRYABLE_STATUSES
+            )
     
-    async def _call_ollama(self, question: str, context: str, temperature: float) -> str:
-        prompt = self._build_prompt(question, context)
-        
+    async def _call_ollama(self, prompt: str, temperature: float, timeout: Optional[float] = None) -> str:
         payload = {
-            'model': self.model_name,
+            'model': self._provider_model('ollama'),
             'prompt': prompt,
             'temperature': temperature,
             'stream': False
         }
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.ollama_url}/api/generate",
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        answer = result.get('response', '')
-                        logger.info("Ollama模型调用成功")
-                        return answer.strip()
-                    else:
-                        return self._generate_fallback_answer(question, context)
-        except Exception as e:
-            logger.error(f"Ollama调用异常: {str(e)}")
-            return self._generate_fallback_answer(question, context)
+        async with get_http_session().post(
+            f"{self.ollama_url}/api/generate",
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=60 if timeout is None else timeout)
+        ) as response:
+            if response.status == 200:
+                result = await response.json()
+                answer = result.get('response', '')
+                logger.info("Ollama模型调用成功")
+                return answer.strip()
+            error_text = await response.text()
+            raise ProviderError(
+                f"Ollama调用失败: {response.status}, {error_text[:200]}",
+                status=response.status,
+                retryable=response.status in RETRYABLE_STATUSES
+            )
     
     def _build_prompt(self, question: str, context: str) -> str:
         return f"""请基于以下上下文信息回答用户的问题。如果上下文中没有相关信息，请诚实地说明无法从提供的信息中找到答案。
@@ -106,6 +199,10 @@ class LLMService:
 
 请提供准确、有用的回答："""
     
+    def fallback_answer(self, question: str, context: str) -> Tuple[str, Dict[str, Any]]:
+        """不调用 LLM，直接返回基于上下文的降级答案和对应的 metadata（用于时间预算不足时）"""
+        return self._generate_fallback_answer(question, context), {"provider": "fallback", "fallback": True, "path": []}
+    
     def _generate_fallback_answer(self, question: str, context: str) -> str:
         if not context.strip():
             return "很抱歉，我在知识库中没有找到与您问题相关的信息。"
@@ -120,22 +217,29 @@ class LLMService:
         
         return f"根据知识库内容：{context[:200]}{'...' if len(context) > 200 else ''}"
     
-    async def health_check(self) -> Dict[str, Any]:
+    async def health_check(self, timeout: float = 5) -> Dict[str, Any]:
+        """检查 LLM 服务可达（复用连接池，只请求模型列表，不生成内容）"""
         try:
             if self.model_type == 'deepseek':
                 if not self.api_key:
                     return {"status": "error", "message": "DeepSeek API密钥未配置"}
-                return {"status": "ok", "model_type": "deepseek", "model_name": self.model_name}
+                async with get_http_session().get(
+                    f"{self.base_url}/models",
+                    headers={'Authorization': f'Bearer {self.api_key}'},
+                    timeout=aiohttp.ClientTimeout(total=timeout)
+                ) as response:
+                    if response.status == 200:
+                        return {"status": "ok", "model_type": "deepseek", "model_name": self.model_name}
+                    return {"status": "error", "message": f"DeepSeek API不可用: {response.status}"}
             elif self.model_type == 'ollama':
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                        f"{self.ollama_url}/api/tags",
-                        timeout=aiohttp.ClientTimeout(total=5)
-                    ) as response:
-                        if response.status == 200:
-                            return {"status": "ok", "model_type": "ollama", "url": self.ollama_url}
-                        else:
-                            return {"status": "error", "message": f"Ollama服务不可用: {response.status}"}
+                async with get_http_session().get(
+                    f"{self.ollama_url}/api/tags",
+                    timeout=aiohttp.ClientTimeout(total=timeout)
+                ) as response:
+                    if response.status == 200:
+                        return {"status": "ok", "model_type": "ollama", "url": self.ollama_url}
+                    else:
+                        return {"status": "error", "message": f"Ollama服务不可用: {response.status}"}
             return {"status": "ok", "model_type": self.model_type}
         except Exception as e:
-            return {"status": "error", "message": str(e)}
+            return {"status": "error", "message": str(e) or type(e).__name__}
@@ -0,0 +1,237 @@
+# backend/app/services/milvus_connection.py
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Optional, Any
+import asyncio
+import hashlib
+import json
+import threading
+import uuid
+
+import pymilvus
+from pymilvus import connections, utility, MilvusClient
+
+from ..core.config import (
+    DatabaseConfig,
+    get_database_config,
+    get_milvus_connection_args,
+    apply_database_update,
+)
+
+# alias -> 建立连接时使用的参数，数据库配置变更后据此重连
+_connected_args: Dict[str, dict] = {}
+_lock = threading.Lock()
+# 替换 pymilvus.MilvusClient 期间持有，同一时间只有一处构造在替换范围内
+_client_patch_lock = threading.Lock()
+# 当前任务是否已在 track() 范围内（嵌套的操作不重复登记，也不在切换配置时等待自己）
+_tracking: ContextVar[bool] = ContextVar("milvus_tracking", default=False)
+
+
+def _open(alias: str, args: dict):
+    """按连接参数建立指定 alias 的连接"""
+    if "uri" in args:
+        connections.connect(alias=alias, uri=args["uri"])
+    else:
+        connections.connect(
+            alias=alias,
+            host=args["host"],
+            port=args["port"],
+            timeout=args.get("timeout", 60),
+            user=args.get("user"),
+            password=args.get("password"),
+            secure=args.get("secure", False),
+            db_name=args.get("database_name", "default"),
+        )
+
+
+def ensure_connection(alias: str) -> str:
+    """确保指定 alias 已按当前数据库配置连接，返回 alias；后台服务各自使用独立 alias，互不影响"""
+    args = get_milvus_connection_args()
+    with _lock:
+        if _connected_args.get(alias) == args and connections.has_connection(alias):
+            return alias
+        if connections.has_connection(alias):
+            connections.disconnect(alias)
+        _open(alias, args)
+        _connected_args[alias] = args
+        return alias
+
+
+class PooledMilvusClient(MilvusClient):
+    """
+    传入 alias 且该 alias 已连接时直接复用，不再像 MilvusClient 默认那样每个实例新建一个 gRPC 通道
+
+    只通过 pooled_milvus_client() 在构造 LangChain 的 Milvus 期间使用；
+    未传 alias 时行为与原类完全一致（原类不接受 alias 参数）。
+    """
+
+    def _create_connection(self, uri: str, user: str = "", password: str = "", db_name: str = "", token: str = "", **kwargs) -> str:
+        alias = kwargs.pop("alias", None)
+        if alias and connections.has_connection(alias):
+            return alias
+        return super()._create_connection(uri, user, password, db_name, token, **kwargs)
+
+    def close(self):
+        # 池化连接由连接管理器统一关闭
+        if not self._using.startswith(ConnectionManager.PREFIX):
+            super().close()
+
+
+@contextmanager
+def pooled_milvus_client():
+    """
+    在 with 块内把 pymilvus.MilvusClient 替换为 PooledMilvusClient，退出时恢复
+
+    LangChain 的 Milvus 不接受外部传入的客户端，而是在构造函数内部 `from pymilvus import MilvusClient`，
+    只能在构造期间替换；构造之外的代码始终看到原类。
+    """
+    with _client_patch_lock:
+        original = pymilvus.MilvusClient
+        pymilvus.MilvusClient = PooledMilvusClient
+        try:
+            yield
+        finally:
+            pymilvus.MilvusClient = original
+
+
+class ConnectionManager:
+    """
+    Milvus 连接管理
+
+    - 每种不同的数据库配置对应一个命名 alias（由连接参数哈希得到），建立后一直复用，
+      VectorService 不再断开重连共享连接，并发请求不会在检索途中失去连接
+    - 连接测试使用一次性 alias，测完即断开，不修改全局配置
+    - 切换数据库配置时先连通新配置，再暂停新的操作（检索、写入、删除），等待进行中的操作结束后才生效；
+      旧配置的 alias 保持连接，已经构造的服务对象仍可继续使用
+    """
+
+    PREFIX = "pool_"
+
+    def __init__(self):
+        self._aliases: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        # 未在切换配置时保持打开，切换期间新的检索在此等待
+        self._gate = asyncio.Event()
+        self._gate.set()
+        self._swap_lock = asyncio.Lock()
+
+    @classmethod
+    def alias_for(cls, args: dict) -> str:
+        digest = hashlib.sha1(json.dumps(args, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+        return f"{cls.PREFIX}{digest}"
+
+    @staticmethod
+    def _normalize(args: dict) -> dict:
+        # alias 不属于连接配置
+        return {key: value for key, value in args.items() if key != "alias"}
+
+    def acquire(self, args: Optional[dict] = None) -> str:
+        """返回该配置（默认当前配置）对应的池化 alias，首次使用时建立连接"""
+        args = self._normalize(args if args is not None else get_milvus_connection_args())
+        alias = self.alias_for(args)
+        with self._lock:
+            if alias not in self._aliases or not connections.has_connection(alias):
+                _open(alias, args)
+                self._aliases[alias] = args
+                target = args["uri"] if "uri" in args else f"{args['host']}:{args['port']}"
+                print(f"Milvus 连接已建立: {alias} -> {target}")
+        return alias
+
+    @contextmanager
+    def throwaway(self, db_config: DatabaseConfig):
+        """按给定配置建立一次性连接，退出时断开"""
+        alias = f"probe_{uuid.uuid4().hex[:8]}"
+        _open(alias, self._normalize(get_milvus_connection_args(db_config)))
+        try:
+            yield alias
+        finally:
+            connections.disconnect(alias)
+
+    def test_connection(self, db_config: DatabaseConfig) -> Dict[str, Any]:
+        """用一次性连接测试给定配置，返回集合数量（标准版另返回服务端版本）"""
+        with self.throwaway(db_config) as alias:
+            info = {"collections": len(utility.list_collections(using=alias))}
+            if db_config.db_type == "milvus_standard":
+                # Milvus Lite 未实现该接口
+                info["server_version"] = utility.get_server_version(using=alias)
+            return info
+
+    @asynccontextmanager
+    async def track(self):
+        """标记一次进行中的 Milvus 操作；切换配置期间先等待切换完成。已在 track() 内的嵌套调用直接执行"""
+        if _tracking.get():
+            yield
+            return
+        await self._gate.wait()
+        self._inflight += 1
+        self._idle.clear()
+        token = _tracking.set(True)
+        try:
+            yield
+        finally:
+            _tracking.reset(token)
+            self._inflight -= 1
+            if self._inflight == 0:
+                self._idle.set()
+
+    async def swap_config(self, update: dict, drain_timeout: float) -> Dict[str, Any]:
+        """
+        切换当前数据库配置
+
+        新配置连接失败时抛出异常、当前配置不变；等待进行中的操作超过 drain_timeout 秒时不再等待，
+        这些操作继续使用旧配置的连接完成。
+        """
+        async with self._swap_lock:
+            candidate = get_database_config().model_copy(deep=True)
+            apply_database_update(candidate, update)
+            alias = await asyncio.to_thread(self.acquire, get_milvus_connection_args(candidate))
+            self._gate.clear()
+            try:
+                try:
+                    await asyncio.wait_for(self._idle.wait(), timeout=drain_timeout)
+                    drained = True
+                except asyncio.TimeoutError:
+                    drained = False
+                    print(f"等待进行中的操作超时，仍有 {self._inflight} 个操作使用旧连接")
+                apply_database_update(get_database_config(), update)
+            finally:
+                self._gate.set()
+            return {"alias": alias, "drained": drained, "inflight": self._inflight}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            aliases = list(self._aliases)
+        return {"aliases": aliases, "inflight_operations": self._inflight}
+
+    def close_all(self):
+        with self._lock:
+            for alias in self._aliases:
+                try:
+                    connections.disconnect(alias)
+                except Exception as e:
+                    print(f"断开 Milvus 连接失败 {alias}: {e}")
+            self._aliases.clear()
+
+
+_connection_manager: Optional[ConnectionManager] = None
+
+
+def get_connection_manager() -> ConnectionManager:
+    """获取全局连接管理器实例"""
+    global _connection_manager
+    if _connection_manager is None:
+        _connection_manager = ConnectionManager()
+    return _connection_manager
+
+
+def tracked(func):
+    """装饰异步方法：执行期间登记为进行中的 Milvus 操作（见 ConnectionManager.track）"""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        async with get_connection_manager().track():
+            return await func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,173 @@
+# backend/app/services/parse_cache.py
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+
+from langchain_core.documents import Document
+
+from ..core.config import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# 解析逻辑（加载器、PDF 提取方式）变化时递增，使旧的解析缓存失效
+PARSER_VERSION = 1
+_HASH_BLOCK = 1024 * 1024
+
+
+def _loader_version() -> str:
+    from importlib.metadata import version, PackageNotFoundError
+    parts = [f"v{PARSER_VERSION}"]
+    for package in ("pypdf", "langchain-community"):
+        try:
+            parts.append(f"{package}{version(package)}")
+        except PackageNotFoundError:
+            parts.append(f"{package}-none")
+    return "-".join(parts)
+
+
+LOADER_VERSION = _loader_version()
+
+
+class ParseCache:
+    """
+    文档解析与分块结果的本地缓存
+
+    - 解析结果（每页文本和页元数据）按 (文件内容哈希, 加载器版本) 缓存
+    - 分块结果（块文本、所在页、块元数据）再按分块参数缓存
+    更换嵌入模型或索引类型重新嵌入同一批文件时直接复用分块结果，不再解析 PDF 和分块。
+
+    安装了 pyarrow 时以不压缩的 Arrow IPC 文件按列存储，读取时内存映射、不拷贝整块数据；
+    未安装时退回按列组织的 JSON 文件。缓存目录可以随时删除。
+    """
+
+    def __init__(self, root_dir: str, max_hashes: int = 1024):
+        self.root_dir = Path(root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.suffix = ".arrow" if HAS_PYARROW else ".json"
+        self.max_hashes = max_hashes
+        # (路径, 大小, 修改时间) -> 内容哈希，文件未变化时不重复计算哈希
+        self._hashes: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def file_hash(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._hashes.get(key)
+        if cached:
+            return cached
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+                digest.update(block)
+        file_hash = digest.hexdigest()[:32]
+        with self._lock:
+            self._hashes[key] = file_hash
+            while len(self._hashes) > self.max_hashes:
+                self._hashes.popitem(last=False)
+        return file_hash
+
+    # ---------- 按列读写 ----------
+
+    def _write(self, path: Path, columns: Dict[str, list]):
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        if HAS_PYARROW:
+            table = pa.table({
+                "page": pa.array(columns["page"], type=pa.int32()),
+                "text": pa.array(columns["text"], type=pa.large_string()),
+                "metadata": pa.array(columns["metadata"], type=pa.large_string()),
+            })
+            with pa.OSFile(str(tmp_path), "wb") as sink:
+                with pa_ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        else:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(columns, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _read(self, path: Path) -> Optional[Dict[str, list]]:
+        if not path.exists():
+            return None
+        try:
+            if HAS_PYARROW:
+                with pa.memory_map(str(path), "r") as source:
+                    table = pa_ipc.open_file(source).read_all()
+                    return {name: table.column(name).to_pylist() for name in ("page", "text", "metadata")}
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            # 损坏或被截断的缓存文件当作未命中，随后重新生成
+            print(f"解析缓存读取失败 {path.name}: {e}")
+            return None
+
+    @staticmethod
+    def _restore_source(metadata: Dict[str, Any], file_path: str) -> Dict[str, Any]:
+        # 相同内容的文件可能位于不同路径，source 以本次解析的路径为准
+        if "source" in metadata:
+            metadata["source"] = file_path
+        return metadata
+
+    # ---------- 解析结果 ----------
+
+    def _pages_path(self, file_hash: str) -> Path:
+        return self.root_dir / f"pages_{file_hash}_{LOADER_VERSION}{self.suffix}"
+
+    def load_pages(self, file_hash: str, file_path: str) -> Optional[List[Document]]:
+        columns = self._read(self._pages_path(file_hash))
+        if columns is None:
+            return None
+        return [
+            Document(page_content=text, metadata=self._restore_source(json.loads(metadata), file_path))
+            for text, metadata in zip(columns["text"], columns["metadata"])
+        ]
+
+    def save_pages(self, file_hash: str, documents: List[Document]):
+        self._write(self._pages_path(file_hash), {
+            "page": list(range(len(documents))),
+            "text": [document.page_content for document in documents],
+            "metadata": [json.dumps(document.metadata, ensure_ascii=False) for document in documents],
+        })
+
+    # ---------- 分块结果 ----------
+
+    def _chunks_path(self, file_hash: str, chunk_key: str) -> Path:
+        params = hashlib.sha1(f"{LOADER_VERSION}|{chunk_key}".encode("utf-8")).hexdigest()[:16]
+        return self.root_dir / f"chunks_{file_hash}_{params}{self.suffix}"
+
+    def load_chunks(self, file_hash: str, chunk_key: str, file_path: str) -> Optional[List[Tuple[int, Document]]]:
+        columns = self._read(self._chunks_path(file_hash, chunk_key))
+        if columns is None:
+            return None
+        return [
+            (page_index, Document(page_content=text, metadata=self._restore_source(json.loads(metadata), file_path)))
+            for page_index, text, metadata in zip(columns["page"], columns["text"], columns["metadata"])
+        ]
+
+    def save_chunks(self, file_hash: str, chunk_key: str, chunks: List[Tuple[int, Document]]):
+        self._write(self._chunks_path(file_hash, chunk_key), {
+            "page": [page_index for page_index, _ in chunks],
+            "text": [chunk.page_content for _, chunk in chunks],
+            "metadata": [json.dumps(chunk.metadata, ensure_ascii=False) for _, chunk in chunks],
+        })
+
+
+_parse_cache: Optional[ParseCache] = None
+
+
+def get_parse_cache() -> Optional[ParseCache]:
+    """获取全局解析缓存实例，未启用时返回 None"""
+    global _parse_cache
+    if not settings.parse_cache_enabled:
+        return None
+    if _parse_cache is None:
+        _parse_cache = ParseCache(settings.parse_cache_dir)
+    return _parse_cache
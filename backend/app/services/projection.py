@@ -0,0 +1,128 @@
+# backend/app/services/projection.py
+from typing import List, Optional, Dict, Any
+from pathlib import Path
+from langchain_core.embeddings import Embeddings
+import numpy as np
+import hashlib
+
+from ..core.config import settings
+
+
+class EmbeddingProjector:
+    """
+    嵌入降维投影：PCA 或 Matryoshka 截断
+
+    投影矩阵随集合持久化在 projection_dir/{collection_name}.npz，入库和查询使用同一份矩阵，
+    一次矩阵乘法完成整批向量的投影，投影后重新做 L2 归一化以保持 COSINE 度量的含义。
+    """
+
+    def __init__(
+        self,
+        method: str,
+        source_dim: int,
+        target_dim: int,
+        mean: Optional[np.ndarray] = None,
+        components: Optional[np.ndarray] = None,
+        explained_variance: Optional[float] = None,
+    ):
+        if target_dim > source_dim:
+            raise ValueError(f"目标维度 {target_dim} 不能大于原始维度 {source_dim}")
+        self.method = method
+        self.source_dim = source_dim
+        self.target_dim = target_dim
+        self.mean = mean
+        # PCA: (target_dim, source_dim)；截断时为 None
+        self.components = components
+        self.explained_variance = explained_variance
+        # 投影的指纹：方法、维度和矩阵内容都相同的投影才视为同一个（用于共享查询嵌入）
+        digest = hashlib.sha1(f"{method}:{source_dim}:{target_dim}".encode("utf-8"))
+        for array in (mean, components):
+            if array is not None:
+                digest.update(np.ascontiguousarray(array, dtype=np.float32).tobytes())
+        self.fingerprint = digest.hexdigest()[:16]
+
+    @classmethod
+    def fit_pca(cls, sample: np.ndarray, target_dim: int) -> "EmbeddingProjector":
+        """在嵌入样本上拟合 PCA（SVD），样本数需大于目标维度"""
+        sample = np.asarray(sample, dtype=np.float32)
+        if sample.shape[0] <= target_dim:
+            raise ValueError(f"PCA 拟合需要多于 {target_dim} 个样本，当前只有 {sample.shape[0]} 个")
+        mean = sample.mean(axis=0)
+        _, singular_values, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        variance = singular_values ** 2
+        explained = float(variance[:target_dim].sum() / variance.sum())
+        return cls("pca", sample.shape[1], target_dim, mean, vt[:target_dim].astype(np.float32), explained)
+
+    @classmethod
+    def truncation(cls, source_dim: int, target_dim: int) -> "EmbeddingProjector":
+        """Matryoshka 表征学习的模型只需保留前 target_dim 维"""
+        return cls("matryoshka", source_dim, target_dim)
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            return self.transform(vectors[None, :])[0]
+        if self.method == "pca":
+            projected = (vectors - self.mean) @ self.components.T
+        else:
+            projected = vectors[:, :self.target_dim]
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return projected / np.maximum(norms, 1e-12)
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {
+            "method": np.array(self.method),
+            "source_dim": np.array(self.source_dim),
+            "target_dim": np.array(self.target_dim),
+        }
+        if self.method == "pca":
+            arrays.update(mean=self.mean, components=self.components, explained_variance=np.array(self.explained_variance))
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: Path) -> "EmbeddingProjector":
+        with np.load(path) as data:
+            method = str(data["method"])
+            return cls(
+                method,
+                int(data["source_dim"]),
+                int(data["target_dim"]),
+                data["mean"] if method == "pca" else None,
+                data["components"] if method == "pca" else None,
+                float(data["explained_variance"]) if method == "pca" else None,
+            )
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "method": self.method,
+            "source_dim": self.source_dim,
+            "target_dim": self.target_dim,
+            "compression_ratio": round(self.source_dim / self.target_dim, 2),
+            "explained_variance": self.explained_variance,
+        }
+
+
+def projection_path(collection_name: str) -> Path:
+    return Path(settings.projection_dir) / f"{collection_name}.npz"
+
+
+class ProjectedEmbeddings(Embeddings):
+    """对底层嵌入模型的输出整批投影；PCA 尚未拟合时 projector 为 None，此时拒绝编码"""
+
+    def __init__(self, base: Embeddings, projector: Optional[EmbeddingProjector] = None):
+        self.base = base
+        self.projector = projector
+
+    def _require_projector(self) -> EmbeddingProjector:
+        if self.projector is None:
+            raise RuntimeError("投影矩阵尚未拟合，请先导入文档")
+        return self.projector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        projector = self._require_projector()
+        return projector.transform(np.asarray(self.base.embed_documents(texts), dtype=np.float32)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        projector = self._require_projector()
+        return projector.transform(np.asarray(self.base.embed_query(text), dtype=np.float32)).tolist()
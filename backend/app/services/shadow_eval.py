@@ -0,0 +1,304 @@
+# backend/app/services/shadow_eval.py
+from typing import Dict, Any, List, Optional, Tuple
+from pathlib import Path
+import asyncio
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+
+from ..core.config import settings, ShadowConfig
+from .knowledge_base import get_knowledge_base
+from .vector_service import VectorService
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shadow_samples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    knowledge_base TEXT NOT NULL,
+    candidate_key TEXT NOT NULL,
+    question_hash TEXT NOT NULL,
+    top_k INTEGER NOT NULL,
+    prod_count INTEGER NOT NULL,
+    cand_count INTEGER,
+    overlap REAL,
+    jaccard REAL,
+    top1_match INTEGER,
+    prod_scores TEXT NOT NULL,
+    cand_scores TEXT,
+    prod_ms REAL NOT NULL,
+    cand_ms REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_shadow_candidate ON shadow_samples(candidate_key, created_at);
+CREATE TABLE IF NOT EXISTS shadow_candidates (
+    candidate_key TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    first_seen REAL NOT NULL
+);
+"""
+
+# 每写入这么多条样本检查一次保留上限
+_PRUNE_EVERY = 1000
+
+
+def candidate_key(config: ShadowConfig) -> str:
+    """候选检索配置的标识（不含开关和抽样比例），报告按它区分不同候选"""
+    raw = json.dumps(config.model_dump(exclude={"enabled", "sample_rate"}), sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def _result_ids(results: List[Dict[str, Any]]) -> List[str]:
+    # 候选可能检索另一个嵌入模型的集合，主键不同；相同文本视为同一个块
+    return [hashlib.sha1(result.get("content", "").encode("utf-8")).hexdigest()[:16] for result in results]
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+def _round(value: Optional[float], digits: int = 4) -> Optional[float]:
+    return None if value is None else round(value, digits)
+
+
+class ShadowEvaluator:
+    """
+    影子评估：按比例抽样线上查询，用候选检索配置在后台再检索一次
+
+    候选检索在独立任务中执行，不阻塞也不影响线上响应；同时执行的影子检索超过上限时直接放弃抽样。
+    每个样本记录两边结果的 top-k 重合度、相似度分布和检索耗时，写入本地 SQLite（WAL 模式），
+    报告按候选配置汇总：候选更快还是更慢、快慢多少，以及与生产结果的偏离程度。
+    """
+
+    def __init__(self, path: str, max_inflight: int, timeout: float, max_samples: int):
+        self.path = Path(path)
+        self.max_inflight = max_inflight
+        self.timeout = timeout
+        self.max_samples = max_samples
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._tasks: set = set()
+        self._services: Dict[Tuple[str, str], VectorService] = {}
+        self._inserted = 0
+        self.skipped_busy = 0
+
+    def should_sample(self) -> bool:
+        config = settings.shadow
+        if not config.enabled or random.random() >= config.sample_rate:
+            return False
+        if len(self._tasks) >= self.max_inflight:
+            self.skipped_busy += 1
+            return False
+        return True
+
+    def _candidate_service(self, knowledge_base: Optional[str], config: ShadowConfig, key: str) -> VectorService:
+        """候选配置未给出的字段沿用生产知识库配置；候选检索的是同一知识库下对应嵌入模型的集合"""
+        kb_name = knowledge_base or settings.default_knowledge_base
+        service = self._services.get((kb_name, key))
+        if service is None:
+            kb = get_knowledge_base(kb_name)
+            service = VectorService(
+                model_name=config.embed_model or kb.embed_model,
+                index_type=config.index_type or kb.index_type,
+                threshold=kb.search_threshold if config.search_threshold is None else config.search_threshold,
+                index_params=config.index_params if config.index_params is not None else (None if config.index_type else kb.index_params),
+                knowledge_base=kb_name,
+            )
+            self._services[(kb_name, key)] = service
+        return service
+
+    def submit(
+        self,
+        question: str,
+        top_k: int,
+        knowledge_base: Optional[str],
+        tenant: Optional[str],
+        prod_results: List[Dict[str, Any]],
+        prod_ms: float,
+    ):
+        """登记一次影子检索（在事件循环中调用，立即返回）"""
+        config = settings.shadow.model_copy()
+        task = asyncio.get_running_loop().create_task(
+            self._run(question, top_k, knowledge_base, tenant, prod_results, prod_ms, config)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(
+        self,
+        question: str,
+        top_k: int,
+        knowledge_base: Optional[str],
+        tenant: Optional[str],
+        prod_results: List[Dict[str, Any]],
+        prod_ms: float,
+        config: ShadowConfig,
+    ):
+        key = candidate_key(config)
+        sample = {
+            "created_at": time.time(),
+            "knowledge_base": knowledge_base or settings.default_knowledge_base,
+            "candidate_key": key,
+            "question_hash": hashlib.sha256(question.encode("utf-8")).hexdigest()[:16],
+            "top_k": top_k,
+            "prod_count": len(prod_results),
+            "prod_scores": json.dumps([round(r["similarity"], 4) for r in prod_results]),
+            "prod_ms": prod_ms,
+        }
+        try:
+            service = await asyncio.to_thread(self._candidate_service, knowledge_base, config, key)
+            start = time.perf_counter()
+            cand_results = await asyncio.wait_for(
+                service.search_documents(query=question, top_k=top_k, tenant=tenant), self.timeout
+            )
+            sample["cand_ms"] = (time.perf_counter() - start) * 1000
+            prod_ids, cand_ids = _result_ids(prod_results), _result_ids(cand_results)
+            common = len(set(prod_ids) & set(cand_ids))
+            union = len(set(prod_ids) | set(cand_ids))
+            sample.update({
+                "cand_count": len(cand_results),
+                # overlap@k：生产结果中有多少也出现在候选结果中
+                "overlap": common / len(prod_ids) if prod_ids else None,
+                "jaccard": common / union if union else None,
+                "top1_match": int(prod_ids[0] == cand_ids[0]) if prod_ids and cand_ids else None,
+                "cand_scores": json.dumps([round(r["similarity"], 4) for r in cand_results]),
+            })
+        except asyncio.TimeoutError:
+            sample["error"] = f"timeout after {self.timeout}s"
+        except Exception as e:
+            sample["error"] = str(e)[:500]
+        try:
+            await asyncio.to_thread(self._record, sample, config)
+        except Exception as e:
+            print(f"影子评估记录失败: {e}")
+
+    def _record(self, sample: Dict[str, Any], config: ShadowConfig):
+        columns = ", ".join(sample)
+        placeholders = ", ".join("?" for _ in sample)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO shadow_candidates (candidate_key, config, first_seen) VALUES (?, ?, ?)",
+                (sample["candidate_key"], json.dumps(config.model_dump(exclude={"enabled", "sample_rate"})), time.time()),
+            )
+            self._conn.execute(f"INSERT INTO shadow_samples ({columns}) VALUES ({placeholders})", tuple(sample.values()))
+            self._inserted += 1
+            if self._inserted % _PRUNE_EVERY == 0:
+                self._conn.execute(
+                    "DELETE FROM shadow_samples WHERE id <= (SELECT MAX(id) FROM shadow_samples) - ?",
+                    (self.max_samples,),
+                )
+
+    def _summarize(self, rows: List[tuple]) -> Dict[str, Any]:
+        ok = [row for row in rows if row[8] is None]
+        prod_ms = [row[6] for row in ok]
+        cand_ms = [row[7] for row in ok]
+        deltas = [cand - prod for prod, cand in zip(prod_ms, cand_ms)]
+        prod_scores = [json.loads(row[4]) for row in ok]
+        cand_scores = [json.loads(row[5]) for row in ok]
+        prod_p50, cand_p50 = _percentile(prod_ms, 0.5), _percentile(cand_ms, 0.5)
+        change = (cand_p50 - prod_p50) / prod_p50 if prod_p50 else None
+
+        def score_summary(lists: List[List[float]], counts: List[int]) -> Dict[str, Any]:
+            flat = [score for scores in lists for score in scores]
+            return {
+                "mean_results": _round(_mean(counts), 2),
+                "empty_rate": _round(_mean([1.0 if count == 0 else 0.0 for count in counts])),
+                "top1_similarity_mean": _round(_mean([scores[0] for scores in lists if scores])),
+                "similarity_mean": _round(_mean(flat)),
+                "similarity_p10": _round(_percentile(flat, 0.1)),
+                "similarity_p50": _round(_percentile(flat, 0.5)),
+                "similarity_p90": _round(_percentile(flat, 0.9)),
+            }
+
+        return {
+            "samples": len(rows),
+            "errors": len(rows) - len(ok),
+            "latency_ms": {
+                "production_p50": _round(prod_p50, 1),
+                "production_p95": _round(_percentile(prod_ms, 0.95), 1),
+                "candidate_p50": _round(cand_p50, 1),
+                "candidate_p95": _round(_percentile(cand_ms, 0.95), 1),
+                "delta_p50": _round(_percentile(deltas, 0.5), 1),
+                "candidate_faster_rate": _round(_mean([1.0 if delta < 0 else 0.0 for delta in deltas])),
+                "verdict": None if change is None else
+                    f"候选{'更快' if change < 0 else '更慢'} {abs(change) * 100:.1f}%（p50）",
+            },
+            "divergence": {
+                "overlap_at_k_mean": _round(_mean([row[1] for row in ok if row[1] is not None])),
+                "jaccard_mean": _round(_mean([row[2] for row in ok if row[2] is not None])),
+                "top1_match_rate": _round(_mean([row[3] for row in ok if row[3] is not None])),
+            },
+            "scores": {
+                "production": score_summary(prod_scores, [row[9] for row in ok]),
+                "candidate": score_summary(cand_scores, [row[10] for row in ok]),
+            },
+        }
+
+    def report(
+        self,
+        knowledge_base: Optional[str] = None,
+        key: Optional[str] = None,
+        since: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """按候选配置汇总样本；不指定候选时报告所有出现过的候选"""
+        conditions, params = ["created_at >= ?"], [since or 0]
+        if knowledge_base:
+            conditions.append("knowledge_base = ?")
+            params.append(knowledge_base)
+        where = " AND ".join(conditions)
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT candidate_key, config FROM shadow_candidates"
+                + (" WHERE candidate_key = ?" if key else "") + " ORDER BY first_seen",
+                (key,) if key else (),
+            ).fetchall()
+            report = {}
+            for candidate, config in candidates:
+                rows = self._conn.execute(
+                    "SELECT created_at, overlap, jaccard, top1_match, prod_scores, cand_scores, prod_ms, cand_ms, "
+                    f"error, prod_count, cand_count FROM shadow_samples WHERE candidate_key = ? AND {where}",
+                    (candidate, *params),
+                ).fetchall()
+                if rows:
+                    report[candidate] = {"config": json.loads(config), **self._summarize(rows)}
+        return {
+            "enabled": settings.shadow.enabled,
+            "sample_rate": settings.shadow.sample_rate,
+            "current_candidate": candidate_key(settings.shadow),
+            "in_flight": len(self._tasks),
+            "skipped_busy": self.skipped_busy,
+            "candidates": report,
+        }
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        self._tasks.clear()
+
+
+_shadow_evaluator: Optional[ShadowEvaluator] = None
+
+
+def get_shadow_evaluator() -> ShadowEvaluator:
+    global _shadow_evaluator
+    if _shadow_evaluator is None:
+        _shadow_evaluator = ShadowEvaluator(
+            settings.shadow_db_path,
+            settings.shadow_max_inflight,
+            settings.shadow_timeout,
+            settings.shadow_max_samples,
+        )
+    return _shadow_evaluator
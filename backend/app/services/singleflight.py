@@ -0,0 +1,54 @@
+# backend/app/services/singleflight.py
+from typing import Dict, Any, Awaitable, Callable, Hashable, Tuple, TypeVar
+import asyncio
+import unicodedata
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    合并相同键的并发调用：同一时刻只执行一次，其余调用等待并共享结果（包括异常）
+
+    执行在独立任务中进行，发起者断开（任务被取消）不会影响其他等待者。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """返回 (结果, 是否共享了其他请求的执行)"""
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> Dict[str, Any]:
+        return {"executions": self.executions, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+
+_groups: Dict[str, SingleFlight] = {}
+
+
+def get_group(name: str) -> SingleFlight:
+    if name not in _groups:
+        _groups[name] = SingleFlight(name)
+    return _groups[name]
+
+
+def singleflight_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: group.stats() for name, group in _groups.items()}
+
+
+def normalize_text(text: str) -> str:
+    """规范化用于合并判断的文本：全半角统一、合并空白"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
@@ -0,0 +1,317 @@
+# backend/app/services/snapshot.py
+from typing import Dict, Any, List, Optional, Iterator, Callable
+from pathlib import Path
+import json
+import shutil
+import time
+
+from pymilvus import DataType
+
+from ..core.config import settings, get_database_config
+from .bulk_load import BulkLoader
+from .chunk_store import ChunkTextStore, get_chunk_store
+from .collection_schema import match_all_expr, typed_fields_for
+from .knowledge_base import collection_name_for, get_knowledge_base
+from .projection import projection_path
+from .vector_service import VectorService
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+SNAPSHOT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+# 集合未声明的动态字段合并为一列 JSON
+DYNAMIC_COLUMN = "_dynamic"
+_VECTOR_FIELD = "vector"
+_CHUNK_TEXT_DIR = "chunk_texts"
+_PROJECTION_FILE = "projection.npz"
+
+# 导出进度回调: (已导出行数)
+SnapshotProgressCallback = Callable[[int], None]
+
+
+class SnapshotError(ValueError):
+    """快照不存在、格式不符，或与目标知识库的嵌入模型/存储方式不一致"""
+
+
+def _require_pyarrow():
+    if not HAS_PYARROW:
+        raise SnapshotError("快照导出/导入需要安装 pyarrow")
+
+
+def _arrow_type(field) -> "pa.DataType":
+    if field.dtype == DataType.FLOAT_VECTOR:
+        return pa.list_(pa.float32(), field.params["dim"])
+    types = {
+        DataType.VARCHAR: pa.string(),
+        DataType.INT64: pa.int64(),
+        DataType.INT32: pa.int32(),
+        DataType.DOUBLE: pa.float64(),
+        DataType.FLOAT: pa.float32(),
+        DataType.BOOL: pa.bool_(),
+        # JSON 字段按字符串导出
+        DataType.JSON: pa.string(),
+    }
+    if field.dtype not in types:
+        raise SnapshotError(f"不支持导出的字段类型: {field.name} ({field.dtype.name})")
+    return types[field.dtype]
+
+
+class _PartWriter:
+    """写一个分片文件：Parquet（zstd 压缩）或不压缩的 Arrow IPC 文件"""
+
+    def __init__(self, path: Path, schema: "pa.Schema", fmt: str):
+        self.path = path
+        self.rows = 0
+        if fmt == "parquet":
+            self._sink = None
+            self._writer = pq.ParquetWriter(str(path), schema, compression="zstd")
+        else:
+            self._sink = pa.OSFile(str(path), "wb")
+            self._writer = pa_ipc.new_file(self._sink, schema)
+
+    def write(self, table: "pa.Table"):
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self) -> Dict[str, Any]:
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+        return {"name": self.path.name, "rows": self.rows, "bytes": self.path.stat().st_size}
+
+
+def export_collection(
+    vector_service: VectorService,
+    output_dir: Path,
+    fmt: str = "parquet",
+    batch_rows: int = 2000,
+    rows_per_file: int = 100_000,
+    progress_callback: Optional[SnapshotProgressCallback] = None,
+) -> Dict[str, Any]:
+    """
+    把集合导出为快照目录：分片数据文件 + manifest.json
+
+    用 query_iterator 逐批读取（主键、向量、文本、标量字段和动态字段），每批直接追加到当前分片，
+    内存中只保留一批数据。manifest 记录嵌入模型、索引档案、存储方式和降维配置，导入时据此校验。
+    offset 存储模式下一并复制块文本文件，PCA 降维时一并复制投影矩阵。
+    """
+    _require_pyarrow()
+    if fmt not in ("parquet", "arrow"):
+        raise SnapshotError(f"不支持的快照格式: {fmt}")
+    collection = vector_service.vector_store.col if vector_service.vector_store else None
+    if collection is None:
+        raise SnapshotError(f"集合 {vector_service.collection_name} 不存在")
+    output_dir = Path(output_dir)
+    if (output_dir / MANIFEST_NAME).exists():
+        raise SnapshotError(f"目录 {output_dir} 已包含快照")
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    schema = collection.schema
+    declared = [field.name for field in schema.fields]
+    vector_field = next(field for field in schema.fields if field.dtype == DataType.FLOAT_VECTOR)
+    arrow_fields = [pa.field(field.name, _arrow_type(field)) for field in schema.fields]
+    if schema.enable_dynamic_field:
+        arrow_fields.append(pa.field(DYNAMIC_COLUMN, pa.string()))
+    arrow_schema = pa.schema(arrow_fields)
+    json_fields = {field.name for field in schema.fields if field.dtype == DataType.JSON}
+    suffix = ".parquet" if fmt == "parquet" else ".arrow"
+
+    files: List[Dict[str, Any]] = []
+    text_keys = set()
+    total = 0
+    writer: Optional[_PartWriter] = None
+    iterator = collection.query_iterator(batch_size=batch_rows, expr=match_all_expr(collection), output_fields=["*"])
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            columns: Dict[str, list] = {
+                name: [json.dumps(row.get(name)) if name in json_fields else row.get(name) for row in batch]
+                for name in declared
+            }
+            if schema.enable_dynamic_field:
+                columns[DYNAMIC_COLUMN] = [
+                    json.dumps({key: value for key, value in row.items() if key not in declared}, ensure_ascii=False)
+                    for row in batch
+                ]
+            if vector_service.storage_mode == "offset":
+                text_keys.update(
+                    ChunkTextStore.text_key(row["document_id"], row.get("text_version", ""))
+                    for row in batch if row.get("document_id")
+                )
+            if writer is None or writer.rows >= rows_per_file:
+                if writer is not None:
+                    files.append(writer.close())
+                writer = _PartWriter(output_dir / f"part-{len(files):05d}{suffix}", arrow_schema, fmt)
+            writer.write(pa.Table.from_pydict(columns, schema=arrow_schema))
+            total += len(batch)
+            if progress_callback:
+                progress_callback(total)
+    finally:
+        iterator.close()
+        if writer is not None:
+            files.append(writer.close())
+
+    if vector_service.storage_mode == "offset":
+        chunk_store = get_chunk_store()
+        text_dir = output_dir / _CHUNK_TEXT_DIR
+        text_dir.mkdir(exist_ok=True)
+        for key in text_keys:
+            for path in (chunk_store._text_path(key), chunk_store._info_path(key)):
+                if path.exists():
+                    shutil.copy2(path, text_dir / path.name)
+    projection_file = projection_path(vector_service.collection_name)
+    if settings.embedding_projection == "pca" and projection_file.exists():
+        shutil.copy2(projection_file, output_dir / _PROJECTION_FILE)
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "exported_at": time.time(),
+        "source": {
+            "db_type": get_database_config().db_type,
+            "collection_name": vector_service.collection_name,
+            "knowledge_base": vector_service.knowledge_base,
+        },
+        "embed_model": vector_service.model_name,
+        "model_path": settings.embedding_models.get(vector_service.model_name),
+        "dim": vector_field.params["dim"],
+        "vector_field": vector_field.name,
+        "index_type": vector_service.index_type,
+        "index_params": vector_service.index_overrides,
+        "search_threshold": vector_service.threshold,
+        "storage_mode": vector_service.storage_mode,
+        "projection": {"type": settings.embedding_projection, "dim": settings.projection_dim},
+        "format": fmt,
+        "fields": [{"name": field.name, "type": field.dtype.name} for field in schema.fields],
+        "dynamic_field": schema.enable_dynamic_field,
+        "rows": total,
+        "files": files,
+    }
+    with open(output_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def read_manifest(snapshot_dir: Path) -> Dict[str, Any]:
+    path = Path(snapshot_dir) / MANIFEST_NAME
+    if not path.exists():
+        raise SnapshotError(f"{snapshot_dir} 不是快照目录（缺少 {MANIFEST_NAME}）")
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"不支持的快照版本: {manifest.get('version')}")
+    return manifest
+
+
+def _rows_from_batch(record_batch: "pa.RecordBatch", manifest: Dict[str, Any], storage_mode: str) -> List[Dict[str, Any]]:
+    json_fields = {field["name"] for field in manifest["fields"] if field["type"] == "JSON"}
+    defaults = {name: default for name, (_, _, _, default) in typed_fields_for(storage_mode).items()}
+    rows = record_batch.to_pylist()
+    for row in rows:
+        dynamic = row.pop(DYNAMIC_COLUMN, None)
+        if dynamic:
+            for key, value in json.loads(dynamic).items():
+                row.setdefault(key, value)
+        for name in json_fields:
+            row[name] = json.loads(row[name]) if row[name] is not None else None
+        if manifest["vector_field"] != _VECTOR_FIELD:
+            row[_VECTOR_FIELD] = row.pop(manifest["vector_field"])
+        # 旧集合可能是整数主键、缺少后来增加的强类型字段
+        row["pk"] = str(row["pk"])
+        for name, default in defaults.items():
+            if row.get(name) is None:
+                row[name] = default
+    return rows
+
+
+def iter_snapshot_rows(snapshot_dir: Path, manifest: Dict[str, Any], batch_rows: int, storage_mode: str) -> Iterator[List[Dict[str, Any]]]:
+    """按分片顺序逐批产出行；Parquet 按行组流式读取，Arrow IPC 文件内存映射读取"""
+    for part in manifest["files"]:
+        path = Path(snapshot_dir) / part["name"]
+        if manifest["format"] == "parquet":
+            for record_batch in pq.ParquetFile(str(path)).iter_batches(batch_size=batch_rows):
+                yield _rows_from_batch(record_batch, manifest, storage_mode)
+        else:
+            with pa.memory_map(str(path), "r") as source:
+                reader = pa_ipc.open_file(source)
+                for i in range(reader.num_record_batches):
+                    record_batch = reader.get_batch(i)
+                    for start in range(0, record_batch.num_rows, batch_rows):
+                        yield _rows_from_batch(record_batch.slice(start, batch_rows), manifest, storage_mode)
+
+
+def check_compatible(manifest: Dict[str, Any], knowledge_base: Optional[str] = None):
+    """快照中的向量必须与目标知识库检索时使用的嵌入模型、降维方式一致"""
+    kb = get_knowledge_base(knowledge_base)
+    if manifest["embed_model"] != kb.embed_model:
+        raise SnapshotError(
+            f"快照向量由嵌入模型 {manifest['embed_model']} 生成，目标知识库使用 {kb.embed_model}，检索时查询向量不匹配"
+        )
+    if manifest["storage_mode"] != settings.chunk_storage_mode:
+        raise SnapshotError(
+            f"快照存储方式为 {manifest['storage_mode']}，当前配置为 {settings.chunk_storage_mode}"
+        )
+    projection = {"type": settings.embedding_projection, "dim": settings.projection_dim}
+    if manifest["projection"]["type"] != projection["type"] or (
+        projection["type"] != "none" and manifest["projection"]["dim"] != projection["dim"]
+    ):
+        raise SnapshotError(f"快照降维配置 {manifest['projection']} 与当前配置 {projection} 不一致")
+
+
+async def import_snapshot(
+    snapshot_dir: Path,
+    knowledge_base: Optional[str] = None,
+    streams: Optional[int] = None,
+    defer_index: Optional[bool] = None,
+    batch_rows: int = 2000,
+    allow_existing: bool = False,
+) -> Dict[str, Any]:
+    """
+    把快照批量导入当前配置的数据库（Lite 或标准版）中目标知识库的集合，不调用嵌入模型
+
+    通过 BulkLoader 多流写入，默认导入期间删除向量索引、完成后按目标知识库的索引档案重建。
+    主键保持不变；目标集合已有数据时默认拒绝，避免写入重复主键。
+    """
+    _require_pyarrow()
+    snapshot_dir = Path(snapshot_dir)
+    manifest = read_manifest(snapshot_dir)
+    check_compatible(manifest, knowledge_base)
+
+    kb = get_knowledge_base(knowledge_base)
+    collection_name = collection_name_for(kb.embed_model, knowledge_base, settings.chunk_storage_mode)
+    # 投影矩阵在向量服务初始化时加载，需先复制到位
+    projection_file = snapshot_dir / _PROJECTION_FILE
+    if projection_file.exists() and not projection_path(collection_name).exists():
+        projection_path(collection_name).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(projection_file, projection_path(collection_name))
+
+    vector_service = VectorService.for_knowledge_base(knowledge_base)
+    collection = vector_service.vector_store.col if vector_service.vector_store else None
+    if collection is not None and collection.num_entities > 0 and not allow_existing:
+        raise SnapshotError(f"目标集合 {collection_name} 已有 {collection.num_entities} 行数据")
+
+    text_dir = snapshot_dir / _CHUNK_TEXT_DIR
+    if text_dir.exists():
+        chunk_store = get_chunk_store()
+        for path in text_dir.iterdir():
+            shutil.copy2(path, chunk_store.root_dir / path.name)
+
+    loader = BulkLoader(vector_service, streams=streams, defer_index=defer_index)
+    rows = await loader.load_rows(iter_snapshot_rows(snapshot_dir, manifest, batch_rows, vector_service.storage_mode))
+    report = await loader.finish()
+    if rows != manifest["rows"]:
+        print(f"警告: 快照记录 {manifest['rows']} 行，实际导入 {rows} 行")
+    return {
+        "collection_name": collection_name,
+        "knowledge_base": vector_service.knowledge_base,
+        "source": manifest["source"],
+        "rows": rows,
+        "bulk_load": report,
+    }
@@ -0,0 +1,225 @@
+# backend/app/services/stats_service.py
+from typing import Dict, Any, List, Optional
+from collections import Counter
+import asyncio
+import threading
+import time
+
+from pymilvus import Collection, utility
+from pymilvus.client.types import LoadState
+
+from ..core.config import settings
+from .milvus_connection import ensure_connection
+
+_ALIAS = "stats_service"
+_RECOUNT_BATCH = 5000
+
+
+class CollectionStatsService:
+    """
+    集合统计缓存
+
+    在内存中保存每个集合的实体数、按文件的块数、索引构建状态和分段信息。
+    统计接口只读缓存；刷新由后台任务或导入完成时触发，全程不调用 Collection.load()：
+    实体数和索引进度只读元数据，按文件计数仅在集合已被加载时才用 query_iterator 重算，
+    否则依靠导入时的增量计数。
+    集合已加载时实体数用 count(*) 强一致查询（包含尚未 flush 的行）；未加载时 num_entities
+    不含未 flush 的行，刷新结果低于导入后的增量计数时保留增量计数，直到 num_entities 追上。
+    """
+
+    def __init__(self):
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        # 需要重算按文件计数的集合（首次刷新或删除数据后）
+        self._stale_files: set = set()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # 持有后台刷新任务的引用，避免被垃圾回收
+        self._pending: set = set()
+        # 集合名 -> 导入后增量得到的实体数，刷新读到的实体数追上之前不低于该值
+        self._ingested_floor: Dict[str, int] = {}
+
+    def _count_files(self, collection: Collection) -> Dict[str, int]:
+        """按文件重算块数；offset 模式集合没有 filename 字段，按 document_id 统计"""
+        field_names = {field.name for field in collection.schema.fields}
+        group_field = "filename" if "filename" in field_names else "document_id"
+        counts: Counter = Counter()
+        iterator = collection.query_iterator(batch_size=_RECOUNT_BATCH, expr="", output_fields=[group_field])
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                counts.update(row.get(group_field, "") for row in batch)
+        finally:
+            iterator.close()
+        return dict(counts)
+
+    def _count_entities(self, collection: Collection, loaded: bool) -> int:
+        """实体数：已加载时用强一致 count(*)（包含未 flush 的行、扣除已删除的行），否则读元数据"""
+        if loaded:
+            try:
+                return collection.query(expr="", output_fields=["count(*)"], consistency_level="Strong")[0]["count(*)"]
+            except Exception as e:
+                print(f"count(*) 统计失败 {collection.name}: {e}")
+        return collection.num_entities
+
+    def _segments(self, name: str) -> List[Dict[str, Any]]:
+        try:
+            return [
+                {"segment_id": segment.segmentID, "num_rows": segment.num_rows, "mem_size": segment.mem_size}
+                for segment in utility.get_query_segment_info(name, using=_ALIAS)
+            ]
+        except Exception:
+            # Milvus Lite 未实现分段查询
+            return []
+
+    def _index_state(self, name: str, index) -> Dict[str, Any]:
+        state = {"field": index.field_name, "index_name": index.index_name, "index_type": index.params.get("index_type")}
+        try:
+            state.update(utility.index_building_progress(name, index_name=index.index_name, using=_ALIAS))
+        except Exception as e:
+            state["error"] = str(e)
+        return state
+
+    def refresh(self, name: str) -> Dict[str, Any]:
+        """重新读取一个集合的统计信息（阻塞调用，需在线程中执行）"""
+        ensure_connection(_ALIAS)
+        if not utility.has_collection(name, using=_ALIAS):
+            snapshot = {"collection_name": name, "status": "empty", "total_entities": 0, "files": {}}
+        else:
+            collection = Collection(name, using=_ALIAS)
+            load_state = utility.load_state(name, using=_ALIAS)
+            index = [self._index_state(name, idx) for idx in collection.indexes]
+
+            with self._lock:
+                previous = self._snapshots.get(name, {})
+                files = dict(previous.get("files", {}))
+                recount = name in self._stale_files or "files" not in previous
+            if recount and load_state == LoadState.Loaded:
+                files = self._count_files(collection)
+                recount = False
+            total_entities = self._count_entities(collection, load_state == LoadState.Loaded)
+            with self._lock:
+                floor = self._ingested_floor.get(name)
+                if floor is not None:
+                    if total_entities >= floor:
+                        self._ingested_floor.pop(name, None)
+                    else:
+                        total_entities = floor
+
+            snapshot = {
+                "collection_name": name,
+                "status": "connected",
+                "total_entities": total_entities,
+                "load_state": load_state.name,
+                "files": files,
+                # 集合未加载时按文件计数只包含本进程导入的增量，标记为不完整
+                "files_complete": not recount,
+                "index": index,
+                "segments": self._segments(name) if load_state == LoadState.Loaded else [],
+                "schema": {
+                    "fields": [
+                        {"name": field.name, "type": field.dtype.name, "description": field.description}
+                        for field in collection.schema.fields
+                    ]
+                },
+            }
+        snapshot["refreshed_at"] = time.time()
+        with self._lock:
+            self._snapshots[name] = snapshot
+            if snapshot.get("files_complete", True):
+                self._stale_files.discard(name)
+            else:
+                self._stale_files.add(name)
+        return snapshot
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._snapshots.get(name)
+
+    def get_or_refresh(self, name: str) -> Dict[str, Any]:
+        """读取缓存；没有缓存或实体总数待刷新时同步刷新一次（阻塞调用）"""
+        snapshot = self.get(name)
+        if snapshot is None or snapshot["status"] == "pending":
+            snapshot = self.refresh(name)
+        return snapshot
+
+    async def get_stats(self, name: str) -> Dict[str, Any]:
+        """读取缓存；集合首次被查询时同步刷新一次（只读元数据，不加载集合）"""
+        snapshot = self.get(name)
+        if snapshot is None or snapshot["status"] == "pending":
+            snapshot = await asyncio.to_thread(self.refresh, name)
+        return snapshot
+
+    def record_ingest(self, name: str, chunks: List[Dict[str, Any]], group_field: str = "filename"):
+        """导入完成后增量更新计数，并在后台刷新实体数和索引状态"""
+        added = Counter(chunk.get("metadata", {}).get(group_field, "") for chunk in chunks)
+        with self._lock:
+            snapshot = self._snapshots.get(name)
+            if snapshot is None:
+                # 尚无该集合的统计：实体总数未知，标记为待刷新而不是报告 0（读取时同步刷新）；
+                # 按文件计数也不完整，刷新时（集合已加载的情况下）重算
+                self._stale_files.add(name)
+                snapshot = {"collection_name": name, "status": "pending", "total_entities": None, "files": {}}
+            else:
+                snapshot = dict(snapshot)
+                snapshot["total_entities"] = (snapshot.get("total_entities") or 0) + len(chunks)
+                if snapshot["status"] == "empty":
+                    snapshot["status"] = "connected"
+                self._ingested_floor[name] = snapshot["total_entities"]
+            files = dict(snapshot.get("files", {}))
+            for key, count in added.items():
+                files[key] = files.get(key, 0) + count
+            snapshot["files"] = files
+            self._snapshots[name] = snapshot
+        self._schedule_refresh(name)
+
+    def invalidate(self, name: str):
+        """数据被删除或覆盖后，下次刷新时重算按文件计数，实体数以刷新结果为准"""
+        with self._lock:
+            self._stale_files.add(name)
+            self._ingested_floor.pop(name, None)
+        self._schedule_refresh(name)
+
+    def _schedule_refresh(self, name: str):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self._refresh_safely(name))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _refresh_safely(self, name: str):
+        try:
+            await asyncio.to_thread(self.refresh, name)
+        except Exception as e:
+            print(f"刷新集合统计失败 {name}: {e}")
+
+    async def _refresh_loop(self, interval: float):
+        while True:
+            for name in list(self._snapshots):
+                await self._refresh_safely(name)
+            await asyncio.sleep(interval)
+
+    def start(self, interval: Optional[float] = None):
+        """启动后台刷新任务（在应用启动事件中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(
+                self._refresh_loop(interval or settings.stats_refresh_interval)
+            )
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+_stats_service: Optional[CollectionStatsService] = None
+
+
+def get_stats_service() -> CollectionStatsService:
+    global _stats_service
+    if _stats_service is None:
+        _stats_service = CollectionStatsService()
+    return _stats_service
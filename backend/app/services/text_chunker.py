@@ -0,0 +1,158 @@
+# backend/app/services/text_chunker.py
+from typing import List, Tuple, Callable, Optional, Literal
+from langchain_core.documents import Document
+import re
+
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+# 句末标点（中英文），其后可跟随的右引号/右括号也归入同一句
+SENTENCE_ENDINGS = "。！？；!?;"
+_CLOSING_MARKS = "”’」』）)】》\"'"
+
+# 一次扫描即可得到所有候选切分点：段落、换行、句末标点
+_BOUNDARY_RE = re.compile(
+    r"\n[ \t]*\n\s*|\n|[" + re.escape(SENTENCE_ENDINGS) + r"]+[" + re.escape(_CLOSING_MARKS) + r"]*"
+)
+_HEADING_RE = re.compile(r"#{1,6}[ \t]")
+
+ChunkUnit = Literal["chars", "tokens"]
+
+
+class CJKTextChunker:
+    """
+    单遍扫描的中英文混合文本分块器
+
+    以段落、换行、句末标点（。！？；）为候选边界，Markdown 标题强制开启新块；
+    超长句子按长度硬切。每个块记录其在原文中的 [start, end) 字符偏移。
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 500,
+        chunk_overlap: int = 50,
+        unit: ChunkUnit = "chars",
+        encoding_name: str = "cl100k_base",
+    ):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap 必须小于 chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.unit = unit
+        self._length = self._build_length_function(unit, encoding_name)
+
+    @staticmethod
+    def _build_length_function(unit: ChunkUnit, encoding_name: str) -> Optional[Callable[[str], int]]:
+        if unit == "chars":
+            return None
+        if unit != "tokens":
+            raise ValueError(f"不支持的长度单位: {unit}")
+        if not HAS_TIKTOKEN:
+            raise ImportError("按 token 分块需要安装 tiktoken")
+        encoding = tiktoken.get_encoding(encoding_name)
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+    def _measure(self, text: str, start: int, end: int) -> int:
+        if self._length is None:
+            return end - start
+        return self._length(text[start:end])
+
+    def _segments(self, text: str):
+        """单遍扫描，产出 (start, end, is_heading) 片段"""
+        pos = 0
+        for match in _BOUNDARY_RE.finditer(text):
+            end = match.end()
+            if end > pos:
+                yield pos, end, _HEADING_RE.match(text, pos) is not None
+                pos = end
+        if pos < len(text):
+            yield pos, len(text), _HEADING_RE.match(text, pos) is not None
+
+    def _hard_split(self, text: str, start: int, end: int, length: int) -> List[Tuple[int, int]]:
+        """单个片段超过块大小时按长度切开（token 模式按字符比例换算窗口）"""
+        chars_per_unit = (end - start) / max(length, 1)
+        window = max(1, int(self.chunk_size * chars_per_unit))
+        step = max(1, window - int(self.chunk_overlap * chars_per_unit))
+        spans = []
+        pos = start
+        while pos < end:
+            spans.append((pos, min(pos + window, end)))
+            if pos + window >= end:
+                break
+            pos += step
+        return spans
+
+    def split_text_with_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """返回每个块在原文中的 [start, end) 字符偏移（已去除首尾空白）"""
+        spans: List[Tuple[int, int]] = []
+        # 当前块内的片段: (start, end, length)
+        current: List[Tuple[int, int, int]] = []
+        current_length = 0
+        # 上次输出后新加入的片段数，为 0 时当前块只剩重叠部分，不再单独输出
+        fresh = 0
+        # 当前块是否已有正文，连续的多级标题合并到同一块
+        has_body = False
+
+        def flush(keep_overlap: bool):
+            nonlocal current, current_length, fresh, has_body
+            has_body = False
+            if not fresh:
+                current, current_length = [], 0
+                return
+            spans.append((current[0][0], current[-1][1]))
+            carried: List[Tuple[int, int, int]] = []
+            carried_length = 0
+            if keep_overlap and self.chunk_overlap > 0:
+                for segment in reversed(current[1:]):
+                    if carried_length + segment[2] > self.chunk_overlap:
+                        break
+                    carried.insert(0, segment)
+                    carried_length += segment[2]
+            current, current_length, fresh = carried, carried_length, 0
+
+        for start, end, is_heading in self._segments(text):
+            length = self._measure(text, start, end)
+            if (is_heading and has_body) or length > self.chunk_size:
+                flush(keep_overlap=False)
+            elif current and current_length + length > self.chunk_size:
+                flush(keep_overlap=True)
+                # 重叠部分加上新片段仍超长时放弃重叠
+                if current and current_length + length > self.chunk_size:
+                    current, current_length = [], 0
+
+            if length > self.chunk_size:
+                spans.extend(self._hard_split(text, start, end, length))
+                continue
+
+            current.append((start, end, length))
+            current_length += length
+            fresh += 1
+            has_body = has_body or not is_heading
+        flush(keep_overlap=False)
+
+        return [span for span in (self._strip(text, s, e) for s, e in spans) if span]
+
+    @staticmethod
+    def _strip(text: str, start: int, end: int) -> Optional[Tuple[int, int]]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if end > start else None
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_text_with_offsets(text)]
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """分块并在元数据中记录 start_index / end_index"""
+        chunks = []
+        for document in documents:
+            for start, end in self.split_text_with_offsets(document.page_content):
+                chunks.append(Document(
+                    page_content=document.page_content[start:end],
+                    metadata={**document.metadata, "start_index": start, "end_index": end}
+                ))
+        return chunks
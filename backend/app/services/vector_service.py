@@ -1,5 +1,5 @@
 # backend/app/services/vector_service.py
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
 import warnings
 
 # 抑制特定的LangChain弃用警告
@@ -18,10 +18,14 @@ except ImportError:
 from langchain_milvus import Milvus
 from langchain_core.documents import Document
 from langchain_core.vectorstores import VectorStoreRetriever
-from pymilvus import connections, utility, Collection
+from pymilvus import utility, Collection
+import numpy as np
 import uuid
+import json
 import os
+import time
 import asyncio
+import threading
 
 # 导入配置模块
 from ..core.config import (
@@ -31,101 +35,205 @@ from ..core.config import (
     is_milvus_lite, 
     get_db_type_display_name
 )
+from .chunk_store import get_chunk_store
+from .collection_schema import (
+    DEFAULT_TENANT,
+    build_collection_schema,
+    create_scalar_indexes,
+    get_field_types,
+    match_all_expr,
+    prepare_row_metadata
+)
+from .filter_expr import compile_filter, FilterCompileError
+from .projection import EmbeddingProjector, ProjectedEmbeddings, projection_path
+from .index_profiles import INDEX_PROFILES, build_index_config, estimate_index_memory, parse_index_params
+from .stats_service import get_stats_service
+from .compaction import get_compaction_scheduler
+from .diversity import select_diverse
+from .batch_embedder import BucketedEmbeddings
+from .embedding_server import RemoteEmbeddings
+from .milvus_connection import get_connection_manager, pooled_milvus_client, tracked
+from .singleflight import get_group
+from .deadline import Deadline, DeadlineExceeded
+from .knowledge_base import KnowledgeBaseError, collection_name_for, get_knowledge_base, validate_tenant
+
+# 模型名称 -> 原始输出维度
+_MODEL_DIMS: Dict[str, int] = {}
+
+# 进程级嵌入模型缓存：模型路径 -> 已加载的嵌入模型，避免每个请求重新加载
+_EMBEDDING_MODELS: Dict[str, Any] = {}
+_EMBEDDING_LOCK = threading.Lock()
+
+# 按主键删除时每次表达式包含的主键数
+_DELETE_BATCH = 1000
+
+def load_embedding_model(model_path: str):
+    """加载嵌入模型（失败时回退到默认模型），按配置包装为分桶组批的入库嵌入"""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            
+            if USE_NEW_EMBEDDINGS:
+                embeddings = NewHuggingFaceEmbeddings(
+                    model_name=model_path,
+                    model_kwargs={'device': 'cpu', 'trust_remote_code': True},
+                    encode_kwargs={'normalize_embeddings': True, 'batch_size': 32}
+                )
+                print(f"嵌入模型加载成功 (HuggingFace): {model_path}")
+            else:
+                embeddings = SentenceTransformerEmbeddings(
+                    model_name=model_path,
+                    model_kwargs={'device': 'cpu', 'trust_remote_code': True},
+                    encode_kwargs={'normalize_embeddings': True, 'batch_size': 32}
+                )
+                print(f"嵌入模型加载成功 (SentenceTransformer): {model_path}")
+                
+    except Exception as e:
+        print(f"嵌入模型加载失败: {e}")
+        # 使用默认模型
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            if USE_NEW_EMBEDDINGS:
+                embeddings = NewHuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+            else:
+                embeddings = SentenceTransformerEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+            print("使用默认嵌入模型")
+    
+    if settings.embed_token_budget:
+        # 入库时按 token 长度分桶、按 token 预算组批
+        embeddings = BucketedEmbeddings(
+            embeddings,
+            token_budget=settings.embed_token_budget,
+            max_batch=settings.embed_max_batch,
+            max_wait_ms=settings.embed_batch_wait_ms
+        )
+    return embeddings
+
+def is_embedding_model_loaded(model_name: str) -> bool:
+    """嵌入模型是否已加载（不触发加载，供健康检查使用）"""
+    model_mapping = settings.embedding_models
+    return model_mapping.get(model_name, model_mapping["nomic"]) in _EMBEDDING_MODELS
 
 class VectorService:
     """基于 LangChain v0.3 的向量处理和存储服务 - 支持Milvus标准版和Lite版"""
     
-    def __init__(self, model_name: str = "nomic", index_type: str = "hnsw", threshold: float = 0.5):
+    def __init__(
+        self,
+        model_name: str = "nomic",
+        index_type: str = "hnsw",
+        threshold: float = 0.5,
+        index_params: Optional[Dict[str, Any]] = None,
+        knowledge_base: Optional[str] = None
+    ):
         self.model_name = model_name
         self.index_type = index_type
         self.threshold = threshold
-        self.collection_name = "rag_tuning_docs"
+        self.storage_mode = settings.chunk_storage_mode
+        self.knowledge_base = knowledge_base or settings.default_knowledge_base
+        # 每个知识库、每个嵌入模型使用独立集合；offset 模式的行结构不同，也使用独立集合
+        self.collection_name = collection_name_for(model_name, self.knowledge_base, self.storage_mode)
         
         # 获取数据库配置
         self.db_config = get_database_config()
         self.is_lite = is_milvus_lite()
         
+        # 校验并生成索引/检索参数，参数错误时直接抛出 IndexConfigError
+        self.index_overrides = index_params or {}
+        self.index_params, self.search_params = build_index_config(
+            self.index_type, self.index_overrides, is_lite=self.is_lite
+        )
+        
         print(f"初始化向量服务 - 数据库类型: {get_db_type_display_name()}")
         
         # 初始化嵌入模型
         self._init_embedding_model()
         
+        # 按配置包装降维投影（投影后的向量写入独立集合）
+        self._init_projection()
+        
         # 连接 Milvus
         self._connect_milvus()
         
         # 初始化向量存储
         self._init_vector_store()
     
+    @classmethod
+    def for_knowledge_base(cls, name: Optional[str] = None) -> "VectorService":
+        """按知识库配置创建向量服务，知识库不存在时抛出 KnowledgeBaseError"""
+        kb = get_knowledge_base(name)
+        return cls(
+            model_name=kb.embed_model,
+            index_type=kb.index_type,
+            threshold=kb.search_threshold,
+            index_params=kb.index_params,
+            knowledge_base=name
+        )
+    
     def _init_embedding_model(self):
-        """初始化嵌入模型"""
+        """初始化嵌入模型（同一模型在进程内只加载一次）"""
         model_mapping = settings.embedding_models
         model_path = model_mapping.get(self.model_name, model_mapping["nomic"])
         
-        try:
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", DeprecationWarning)
-                
-                if USE_NEW_EMBEDDINGS:
-                    self.embeddings = NewHuggingFaceEmbeddings(
-                        model_name=model_path,
-                        model_kwargs={'device': 'cpu', 'trust_remote_code': True},
-                        encode_kwargs={'normalize_embeddings': True, 'batch_size': 32}
-                    )
-                    print(f"嵌入模型加载成功 (HuggingFace): {model_path}")
+        with _EMBEDDING_LOCK:
+            if model_path not in _EMBEDDING_MODELS:
+                if settings.embedding_server_socket:
+                    # 由独立的嵌入服务进程编码，本进程不加载模型
+                    _EMBEDDING_MODELS[model_path] = RemoteEmbeddings(settings.embedding_server_socket, model_path)
                 else:
-                    self.embeddings = SentenceTransformerEmbeddings(
-                        model_name=model_path,
-                        model_kwargs={'device': 'cpu', 'trust_remote_code': True},
-                        encode_kwargs={'normalize_embeddings': True, 'batch_size': 32}
-                    )
-                    print(f"嵌入模型加载成功 (SentenceTransformer): {model_path}")
-                    
-        except Exception as e:
-            print(f"嵌入模型加载失败: {e}")
-            # 使用默认模型
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", DeprecationWarning)
-                if USE_NEW_EMBEDDINGS:
-                    self.embeddings = NewHuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-                else:
-                    self.embeddings = SentenceTransformerEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-                print("使用默认嵌入模型")
+                    _EMBEDDING_MODELS[model_path] = load_embedding_model(model_path)
+            self.embeddings = _EMBEDDING_MODELS[model_path]
+    
+    def _native_dim(self) -> int:
+        """嵌入模型的原始输出维度（按模型缓存，避免每次实例化都编码一次）"""
+        if self.model_name not in _MODEL_DIMS:
+            _MODEL_DIMS[self.model_name] = len(self.base_embeddings.embed_query("dim"))
+        return _MODEL_DIMS[self.model_name]
+    
+    def _init_projection(self):
+        """初始化降维投影：加载随集合保存的投影矩阵，Matryoshka 截断可直接生成，PCA 在首次入库时拟合"""
+        self.projection = settings.embedding_projection
+        self.base_embeddings = self.embeddings
+        if self.projection == "none":
+            return
+        
+        path = projection_path(self.collection_name)
+        projector = None
+        if path.exists():
+            projector = EmbeddingProjector.load(path)
+            print(f"加载降维投影: {projector.info()}")
+        elif self.projection == "matryoshka":
+            projector = EmbeddingProjector.truncation(self._native_dim(), settings.projection_dim)
+            projector.save(path)
+        self.embeddings = ProjectedEmbeddings(self.base_embeddings, projector)
+    
+    def _fit_projection(self, texts: List[str]):
+        """
+        在本次入库的文本中均匀抽样，拟合 PCA 并随集合持久化
+
+        首次入库的块数不多于目标维度时无法拟合 PCA，改用截断投影，小文件的导入不因此失败；
+        该集合之后一直沿用截断投影（向量已按其写入），需要 PCA 时删除集合后用更多文档重新导入
+        """
+        sample_size = settings.projection_sample_size
+        sample = texts[::max(1, len(texts) // sample_size)][:sample_size]
+        vectors = np.asarray(self.base_embeddings.embed_documents(sample), dtype=np.float32)
+        if len(vectors) <= settings.projection_dim:
+            projector = EmbeddingProjector.truncation(vectors.shape[1], settings.projection_dim)
+            print(
+                f"首次入库只有 {len(vectors)} 个块，不足以拟合 {settings.projection_dim} 维 PCA，"
+                f"集合 {self.collection_name} 改用截断投影: {projector.info()}"
+            )
+        else:
+            projector = EmbeddingProjector.fit_pca(vectors, settings.projection_dim)
+            print(f"PCA 投影拟合完成: {projector.info()}")
+        projector.save(projection_path(self.collection_name))
+        self.embeddings.projector = projector
     
     def _connect_milvus(self):
-        """连接 Milvus 数据库 - 修复 alias 重复传递问题"""
+        """获取当前数据库配置对应的池化连接；同一配置的所有服务实例共享一个 gRPC 通道，不再断开重连"""
         try:
-            # 首先清理现有连接
-            try:
-                connections.disconnect("default")
-                print("已断开现有连接")
-            except:
-                pass
-            
-            connection_args = get_milvus_connection_args()
-            
-            if self.is_lite:
-                # Milvus Lite 连接
-                connections.connect(alias="default", uri=connection_args['uri'])
-                print("Milvus Lite 连接成功")
-            else:
-                # Milvus 标准版连接 - 添加数据库名称
-                db_name = connection_args.get('database_name', 'rag_tuning')
-                print(f"连接 Milvus 标准版服务器: {connection_args['host']}:{connection_args['port']}")
-                print(f"使用数据库: {db_name}")
-                
-                connections.connect(
-                    alias="default",
-                    host=connection_args['host'],
-                    port=connection_args['port'],
-                    timeout=connection_args.get('timeout', 60),
-                    user=connection_args.get('user'),
-                    password=connection_args.get('password'),
-                    secure=connection_args.get('secure', False),
-                    db_name=db_name  # 指定数据库名称
-                )
-                print(f"Milvus 标准版连接成功，数据库: {db_name}")
-                
+            self.alias = get_connection_manager().acquire()
         except Exception as e:
+            self.alias = None
             print(f"Milvus 连接失败: {e}")
             print("将在内存中模拟向量存储")
     
@@ -134,14 +242,6 @@ class VectorService:
         try:
             connection_args = get_milvus_connection_args()
             
-            index_params = {
-                "metric_type": "COSINE",
-                "index_type": self.index_type.upper(),
-                "params": {"nlist": 128} if self.index_type.upper() == "IVF_FLAT" else {"M": 8, "efConstruction": 64}
-            }
-            
-            search_params = {"metric_type": "COSINE", "params": {"ef": 64}}
-            
             if self.is_lite:
                 milvus_connection_args = {"uri": connection_args['uri']}
             else:
@@ -159,15 +259,25 @@ class VectorService:
                 # 添加数据库名称
                 if connection_args.get('database_name'):
                     milvus_connection_args["db_name"] = connection_args['database_name']
+            if self.alias:
+                # 复用池化连接，LangChain 不再为每个实例新建连接
+                milvus_connection_args["alias"] = self.alias
                 
-            self.vector_store = Milvus(
-                embedding_function=self.embeddings,
-                collection_name=self.collection_name,
-                connection_args=milvus_connection_args,
-                index_params=index_params,
-                search_params=search_params,
-                drop_old=False
-            )
+            with pooled_milvus_client():
+                self.vector_store = Milvus(
+                    embedding_function=self.embeddings,
+                    collection_name=self.collection_name,
+                    connection_args=milvus_connection_args,
+                    index_params=self.index_params,
+                    search_params=self.search_params,
+                    enable_dynamic_field=True,
+                    drop_old=False
+                )
+            if self.alias and self.vector_store.alias != self.alias:
+                print(f"LangChain Milvus 未复用池化连接 {self.alias}，单独建立了连接 {self.vector_store.alias}")
+            # 沿用旧版（由 LangChain 按首条元数据推断 schema）集合时，按其实际 schema 决定是否写动态字段
+            if self.vector_store.col is not None:
+                self.vector_store.enable_dynamic_field = self.vector_store.col.schema.enable_dynamic_field
             print(f"向量存储初始化成功，集合: {self.collection_name}")
             
         except Exception as e:
@@ -191,15 +301,25 @@ class VectorService:
                     "db_path": self.db_config.milvus_lite.db_path,
                     "dim": self.db_config.milvus_lite.dim,
                 } if self.is_lite else None
-            }
+            },
+            "projection": self.embeddings.projector.info()
+            if isinstance(self.embeddings, ProjectedEmbeddings) and self.embeddings.projector else None,
         }
 
-    async def store_vectors(self, chunks: List[Dict[str, Any]]) -> List[str]:
+    @tracked
+    async def store_vectors(
+        self,
+        chunks: List[Dict[str, Any]],
+        tenant: Optional[str] = None,
+        ids: Optional[List[str]] = None
+    ) -> List[str]:
         """
         存储文档块到向量数据库
         
         Args:
             chunks: 文档块列表，每个块包含 'text' 和 'metadata' 字段
+            tenant: 租户标识（分区键），未指定时写入默认租户
+            ids: 预先生成的主键（与 chunks 一一对应），默认随机生成
             
         Returns:
             List[str]: 存储的向量ID列表
@@ -210,18 +330,32 @@ class VectorService:
         if not chunks:
             return []
         
+        if validate_tenant(tenant) is not None:
+            chunks = [{**chunk, "metadata": {**chunk.get("metadata", {}), "tenant": tenant}} for chunk in chunks]
+        
+        if isinstance(self.embeddings, ProjectedEmbeddings) and self.embeddings.projector is None:
+            await asyncio.to_thread(self._fit_projection, [chunk.get('text', '') for chunk in chunks])
+        
+        if self.storage_mode == "offset":
+            return await self._store_offset_vectors(chunks, ids)
+        
         try:
-            # 将chunks转换为LangChain Document对象
+            # 每次入库都校验向量维度与集合一致（集合不存在时按声明的 schema 创建）
+            dim = len(await asyncio.to_thread(self.embeddings.embed_query, "dim"))
+            await asyncio.to_thread(self._ensure_collection, dim)
+            
+            # 将chunks转换为LangChain Document对象，强类型字段补齐缺省值
+            ingest_time = int(time.time())
             documents = []
             for chunk in chunks:
                 doc = Document(
                     page_content=chunk.get('text', ''),
-                    metadata=chunk.get('metadata', {})
+                    metadata=prepare_row_metadata(chunk.get('metadata', {}), ingest_time)
                 )
                 documents.append(doc)
             
             # 为每个文档生成唯一ID
-            vector_ids = [str(uuid.uuid4()) for _ in documents]
+            vector_ids = ids or [str(uuid.uuid4()) for _ in documents]
             
             # 批量添加文档到向量存储
             await asyncio.to_thread(
@@ -230,6 +364,7 @@ class VectorService:
                 ids=vector_ids
             )
             
+            get_stats_service().record_ingest(self.collection_name, chunks)
             print(f"成功存储 {len(documents)} 个文档块到向量数据库")
             return vector_ids
             
@@ -237,9 +372,87 @@ class VectorService:
             print(f"存储向量失败: {e}")
             raise Exception(f"向量存储失败: {str(e)}")
 
+    def _ensure_collection(self, dim: int):
+        """按声明的 schema 创建集合并建立标量索引，避免由 LangChain 根据首条元数据推断字段"""
+        alias = self.vector_store.alias
+        if utility.has_collection(self.collection_name, using=alias):
+            collection = Collection(self.collection_name, using=alias)
+            vector_field = next(field for field in collection.schema.fields if field.name == "vector")
+            existing_dim = vector_field.params.get("dim")
+            if existing_dim != dim:
+                raise ValueError(
+                    f"集合 {self.collection_name} 的向量维度为 {existing_dim}，当前嵌入输出为 {dim} 维，"
+                    f"请更换嵌入模型/投影配置或删除该集合后重建"
+                )
+            return
+        
+        if self.is_lite and self.db_config.milvus_lite.dim != dim:
+            print(f"配置的向量维度 {self.db_config.milvus_lite.dim} 与嵌入输出 {dim} 不一致，以嵌入输出为准")
+        
+        # 维度确定后再校验一次与维度相关的索引约束（如 IVF_PQ 的 m、SCANN 的偶数维度）
+        build_index_config(self.index_type, self.index_overrides, is_lite=self.is_lite, dim=dim)
+        # Milvus Lite 不支持按分区键字段过滤，租户字段在 Lite 下只作为普通标量字段
+        partition_kwargs = {} if self.is_lite else {"num_partitions": settings.tenant_partitions}
+        collection = Collection(
+            name=self.collection_name,
+            schema=build_collection_schema(dim, self.storage_mode, partition_key=not self.is_lite),
+            using=alias,
+            **partition_kwargs,
+        )
+        indexed = create_scalar_indexes(collection, self.storage_mode)
+        print(f"创建集合: {self.collection_name}, 维度: {dim}, 标量索引: {indexed}")
+        # 重新初始化向量存储，使其加载新集合并建立向量索引
+        self._init_vector_store()
+    
+    async def _store_offset_vectors(self, chunks: List[Dict[str, Any]], ids: Optional[List[str]] = None) -> List[str]:
+        """
+        offset 模式存储：向量由完整块文本计算，但 Milvus 中只写入文档ID和字节偏移，
+        块文本在检索返回时由 ChunkTextStore 从本地文件读取
+        """
+        try:
+            texts = [chunk.get('text', '') for chunk in chunks]
+            vectors = await asyncio.to_thread(self.embeddings.embed_documents, texts)
+            await asyncio.to_thread(self._ensure_collection, len(vectors[0]))
+            
+            await asyncio.to_thread(self._use_legacy_texts, chunks)
+            
+            collection = self.vector_store.col
+            # 旧集合可能缺少后来增加的字段（如 text_version），且没有动态字段，只写入已声明的字段
+            fields = {field.name for field in collection.schema.fields}
+            vector_ids = ids or [str(uuid.uuid4()) for _ in chunks]
+            rows = []
+            for vector_id, vector, chunk in zip(vector_ids, vectors, chunks):
+                row = {"pk": vector_id, "text": "", "vector": vector}
+                row.update(prepare_row_metadata(chunk.get('metadata', {}), 0, "offset"))
+                rows.append({key: value for key, value in row.items() if key in fields})
+            
+            batch_size = 1000
+            for i in range(0, len(rows), batch_size):
+                await asyncio.to_thread(collection.insert, rows[i:i + batch_size])
+            
+            get_stats_service().record_ingest(self.collection_name, chunks, group_field="document_id")
+            print(f"成功存储 {len(rows)} 个文档块到向量数据库 (offset 模式)")
+            return vector_ids
+            
+        except Exception as e:
+            print(f"存储向量失败: {e}")
+            raise Exception(f"向量存储失败: {str(e)}")
+
+    def _use_legacy_texts(self, chunks: List[Dict[str, Any]]):
+        """offset 模式下旧集合没有 text_version 字段，其行只能读取不带版本的文本文件，把本批文档的版本复制过去"""
+        if "text_version" in {field.name for field in self.vector_store.col.schema.fields}:
+            return
+        chunk_store = get_chunk_store()
+        versions = {
+            (chunk["metadata"]["document_id"], chunk["metadata"]["text_version"])
+            for chunk in chunks if chunk.get("metadata", {}).get("text_version")
+        }
+        for document_id, version in versions:
+            chunk_store.use_legacy_key(document_id, version)
+
     def get_collection_stats(self) -> Dict[str, Any]:
         """
-        获取向量集合的统计信息
+        获取向量集合的统计信息（读取统计缓存，不加载集合）
         
         Returns:
             Dict: 包含集合统计信息的字典
@@ -253,47 +466,18 @@ class VectorService:
                     "error": "向量存储未初始化"
                 }
             
-            # 获取集合信息
-            try:
-                collection = Collection(self.collection_name)
-                collection.load()
-                
-                # 获取实体数量
-                total_entities = collection.num_entities
-                
-                # 获取集合schema信息
-                schema_info = {
-                    "fields": [
-                        {
-                            "name": field.name,
-                            "type": field.dtype.name,
-                            "description": field.description
-                        }
-                        for field in collection.schema.fields
-                    ]
-                }
-                
-                return {
-                    "collection_name": self.collection_name,
-                    "total_entities": total_entities,
-                    "status": "connected",
-                    "schema": schema_info,
-                    "index_type": self.index_type,
-                    "embedding_model": self.model_name,
-                    "database_type": get_db_type_display_name()
-                }
-                
-            except Exception as e:
-                # 如果集合不存在或其他错误，返回基本信息
-                return {
-                    "collection_name": self.collection_name,
-                    "total_entities": 0,
-                    "status": "empty",
-                    "index_type": self.index_type,
-                    "embedding_model": self.model_name,
-                    "database_type": get_db_type_display_name(),
-                    "message": "集合为空或尚未创建"
-                }
+            stats_service = get_stats_service()
+            snapshot = stats_service.get_or_refresh(self.collection_name)
+            stats = {
+                **snapshot,
+                "knowledge_base": self.knowledge_base,
+                "index_type": self.index_type,
+                "embedding_model": self.model_name,
+                "database_type": get_db_type_display_name()
+            }
+            if snapshot["status"] == "empty":
+                stats["message"] = "集合为空或尚未创建"
+            return stats
                 
         except Exception as e:
             print(f"获取集合统计信息失败: {e}")
@@ -304,84 +488,277 @@ class VectorService:
                 "error": str(e)
             }
 
-    async def search_similar(self, query: str, k: int = 5, filter_dict: Optional[Dict] = None) -> List[Dict[str, Any]]:
+    def get_index_memory(self) -> Dict[str, Any]:
+        """
+        报告当前集合的索引内存：按实际索引参数估算的大小、已加载分段的实际内存，
+        以及同等数据量下其他索引类型的估算值，便于用召回率换内存
+        """
+        if not self.vector_store or self.vector_store.col is None:
+            return {"collection_name": self.collection_name, "status": "empty", "message": "集合为空或尚未创建"}
+        
+        collection = self.vector_store.col
+        alias = self.vector_store.alias
+        vector_field = next(field for field in collection.schema.fields if field.name == "vector")
+        dim = vector_field.params.get("dim")
+        num_vectors = collection.num_entities
+        
+        index = next((index for index in collection.indexes if index.field_name == "vector"), None)
+        if index is not None:
+            index_type, build_params = parse_index_params(index.params)
+        else:
+            index_type, build_params = self.index_params["index_type"], self.index_params["params"]
+        profile = next((name for name, spec in INDEX_PROFILES.items() if spec["index_type"] == index_type), None)
+        
+        actual_bytes, segments = None, []
+        try:
+            segments = utility.get_query_segment_info(self.collection_name, using=alias)
+            actual_bytes = sum(segment.mem_size for segment in segments)
+        except Exception as e:
+            print(f"获取分段内存信息失败: {e}")
+        
+        return {
+            "collection_name": self.collection_name,
+            "index_type": index_type,
+            "index_params": build_params,
+            "num_vectors": num_vectors,
+            "dim": dim,
+            "estimated_bytes": estimate_index_memory(profile, build_params, num_vectors, dim) if profile else None,
+            "actual_bytes": actual_bytes,
+            "loaded_segments": len(segments),
+            "projection": self.embeddings.projector.info()
+            if isinstance(self.embeddings, ProjectedEmbeddings) and self.embeddings.projector else None,
+            "alternatives": {
+                name: {
+                    "index_type": spec["index_type"],
+                    "estimated_bytes": estimate_index_memory(name, spec["build"], num_vectors, dim),
+                    "description": spec["description"],
+                }
+                for name, spec in INDEX_PROFILES.items()
+            },
+        }
+
+    def _scoped_filter(self, filter_dict: Optional[Dict], tenant: Optional[str]) -> Optional[Dict]:
+        """把租户条件并入过滤条件；租户字段是分区键，Milvus 据此只扫描该租户所在分区"""
+        if validate_tenant(tenant) is None:
+            return filter_dict
+        tenant_filter = {"tenant": tenant}
+        return {"$and": [filter_dict, tenant_filter]} if filter_dict else tenant_filter
+    
+    async def search_similar(
+        self,
+        query: str,
+        k: int = 5,
+        filter_dict: Optional[Dict] = None,
+        tenant: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
         """
         搜索相似文档
         
+        检索期间登记为进行中，切换数据库配置时等待其结束后才生效
+        
         Args:
             query: 搜索查询字符串
             k: 返回结果数量
             filter_dict: 元数据过滤条件
+            tenant: 只在该租户的数据中检索
+            deadline: 请求时间预算，嵌入和检索各自按剩余时间等待
+            with_vectors: 结果中同时返回向量（vector 字段，float32 数组）
             
         Returns:
             List[Dict]: 搜索结果列表
         """
+        async with get_connection_manager().track():
+            return await self._search_similar(query, k, filter_dict, tenant, deadline, with_vectors)
+    
+    def _search_with_vectors(
+        self,
+        embedding: List[float],
+        k: int,
+        expr: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> List[tuple]:
+        """
+        与 similarity_search_with_score_by_vector 相同的检索，但保留每条结果的向量
+        
+        动态字段集合按 "*" 取回时 Milvus 本就返回向量，只是 LangChain 解析时将其丢弃；
+        各条结果的向量一次转成 (k, dim) 的 float32 矩阵，每条结果带其中一行
+        """
+        collection = self.vector_store.col
+        if collection is None:
+            return []
+        if self.vector_store.enable_dynamic_field:
+            output_fields = ["*"]
+        else:
+            output_fields = [field.name for field in collection.schema.fields]
+        hits = collection.search(
+            data=[embedding],
+            anns_field="vector",
+            param=self.search_params,
+            limit=k,
+            expr=expr,
+            output_fields=output_fields,
+            timeout=timeout
+        )[0]
+        rows = [{name: hit.entity.get(name) for name in hit.entity.fields} for hit in hits]
+        vectors = np.asarray([row.pop("vector") for row in rows], dtype=np.float32)
+        return [
+            (Document(page_content=row.pop("text"), metadata=row), hit.score, vector)
+            for row, hit, vector in zip(rows, hits, vectors)
+        ]
+    
+    async def _search_similar(
+        self,
+        query: str,
+        k: int,
+        filter_dict: Optional[Dict],
+        tenant: Optional[str],
+        deadline: Optional[Deadline],
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+        """search_similar 的实现"""
         if not self.vector_store:
             raise Exception("向量存储未初始化")
         
+        # PCA 投影在首次入库时拟合，此前集合中没有任何数据
+        if isinstance(self.embeddings, ProjectedEmbeddings) and self.embeddings.projector is None:
+            return []
+        
+        deadline = deadline or Deadline()
         try:
             # 构建搜索参数
             search_kwargs = {"k": k}
+            field_types = get_field_types(self.vector_store.col)
+            if tenant is not None and "tenant" not in field_types:
+                # 旧集合没有租户字段，其中的数据全部视为默认租户
+                if tenant != DEFAULT_TENANT:
+                    return []
+                tenant = None
+            filter_dict = self._scoped_filter(filter_dict, tenant)
             if filter_dict:
-                search_kwargs["filter"] = filter_dict
+                # 只允许集合中声明的强类型字段，编译为可走标量索引的布尔表达式
+                search_kwargs["expr"] = compile_filter(filter_dict, field_types)
             
-            # 执行相似性搜索
-            results = await asyncio.to_thread(
-                self.vector_store.similarity_search_with_score,
+            # 相同集合、相同检索参数的并发请求共享一次向量检索
+            search_key = (
+                self.collection_name,
+                json.dumps(self.search_params, sort_keys=True),
+                json.dumps(search_kwargs, sort_keys=True),
                 query,
-                **search_kwargs
+                with_vectors
             )
             
-            # 格式化结果
+            # 共享的嵌入和检索不受单个请求的时间预算约束，避免发起者预算较短时合并进来的请求随之超时；
+            # 每个请求（包括发起者）只按自己的剩余时间等待结果
+            # 相同查询文本的并发请求共享一次嵌入计算（不同集合/过滤条件也可共享）；
+            # 降维投影按集合拟合，只有投影指纹相同的集合之间才共享
+            projector = self.embeddings.projector if isinstance(self.embeddings, ProjectedEmbeddings) else None
+            embedding, _ = await deadline.run("embedding", get_group("embed").do(
+                (self.model_name, projector.fingerprint if projector else None, query),
+                lambda: asyncio.to_thread(self.embeddings.embed_query, query)
+            ))
+            search = self._search_with_vectors if with_vectors else self.vector_store.similarity_search_with_score_by_vector
+            results, _ = await deadline.run("search", get_group("search").do(
+                search_key, lambda: asyncio.to_thread(search, embedding, **search_kwargs)
+            ))
+            
+            # 格式化结果（结果可能被多个请求共享，元数据先复制再修改）
             formatted_results = []
-            for doc, score in results:
+            chunk_store = get_chunk_store() if self.storage_mode == "offset" else None
+            for doc, score, *vector in results:
+                content, metadata = doc.page_content, dict(doc.metadata)
+                if chunk_store and not content and "text_start" in metadata:
+                    content, metadata = await asyncio.to_thread(chunk_store.hydrate, metadata)
+                if metadata.get("page") == -1:
+                    # 非分页文档的缺省页码不返回给调用方
+                    metadata.pop("page")
                 result = {
-                    "content": doc.page_content,
-                    "metadata": doc.metadata,
+                    "content": content,
+                    "metadata": metadata,
                     "score": float(score),
                     "similarity": 1.0 - float(score)  # 转换为相似度
                 }
+                if vector:
+                    result["vector"] = vector[0]
                 formatted_results.append(result)
             
             print(f"搜索完成，返回 {len(formatted_results)} 个结果")
             return formatted_results
             
+        except (FilterCompileError, KnowledgeBaseError, DeadlineExceeded):
+            raise
         except Exception as e:
             print(f"搜索失败: {e}")
             raise Exception(f"向量搜索失败: {str(e)}")
 
-    async def search_documents(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    async def search_documents(
+        self,
+        query: str,
+        top_k: int = 5,
+        tenant: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        mmr_lambda: Optional[float] = None,
+        max_per_file: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
         """
         RAG查询专用的文档搜索方法
         
+        指定 mmr_lambda 或 max_per_file 时先取回 diversity_fetch_k 个候选，
+        再按 MMR 和单文件限额从中选出 top_k 个，减少同一文件中相互重叠的块
+        
         Args:
             query: 用户查询
             top_k: 返回的文档数量
+            tenant: 只在该租户的数据中检索
+            deadline: 请求时间预算
+            mmr_lambda: MMR 相关度权重(0~1)，为空时不做 MMR
+            max_per_file: 同一文件最多返回的块数，为空时不限制
             
         Returns:
             List[Dict]: 搜索结果，包含content、source、score等字段
         """
         try:
+            diversify = mmr_lambda is not None or bool(max_per_file)
+            fetch_k = max(top_k, settings.diversity_fetch_k) if diversify else top_k
             # 调用相似性搜索
-            results = await self.search_similar(query, k=top_k)
+            results = await self.search_similar(
+                query, k=fetch_k, tenant=tenant, deadline=deadline, with_vectors=mmr_lambda is not None
+            )
+            # 过滤掉相似度过低的结果
+            results = [result for result in results if result["similarity"] >= self.threshold]
+            
+            if diversify:
+                # 相关度取 COSINE 度量下的原始得分
+                selected = select_diverse(
+                    [result["score"] for result in results],
+                    top_k,
+                    # 各结果的向量是同一个 float32 矩阵的行，按过滤后的结果拼回矩阵只是内存拷贝
+                    vectors=np.stack([result["vector"] for result in results])
+                    if mmr_lambda is not None and results else None,
+                    lambda_mult=mmr_lambda,
+                    groups=[result["metadata"].get("source", "unknown") for result in results],
+                    max_per_group=max_per_file
+                )
+                results = [results[index] for index in selected]
             
             # 转换为RAG查询需要的格式
             formatted_results = []
             for result in results:
-                # 过滤掉相似度过低的结果
-                if result["similarity"] >= self.threshold:
-                    formatted_result = {
-                        "content": result["content"],
-                        "source": result["metadata"].get("source", "unknown"),
-                        "score": result["score"],
-                        "similarity": result["similarity"],
-                        "metadata": result["metadata"]
-                    }
-                    formatted_results.append(formatted_result)
+                formatted_result = {
+                    "content": result["content"],
+                    "source": result["metadata"].get("source", "unknown"),
+                    "score": result["score"],
+                    "similarity": result["similarity"],
+                    "metadata": result["metadata"]
+                }
+                formatted_results.append(formatted_result)
             
             print(f"RAG搜索完成，过滤后返回 {len(formatted_results)} 个结果")
             return formatted_results
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"RAG文档搜索失败: {e}")
             return []
@@ -394,15 +771,15 @@ class VectorService:
             if not self.vector_store:
                 return {"status": "error", "message": "向量存储未初始化"}
             
-            # 尝试执行一个简单的搜索来测试连接
-            test_results = await self.search_similar("test", k=1)
+            # 只做一次 gRPC 往返确认连接可用，不执行嵌入和检索
+            await asyncio.to_thread(utility.list_collections, using=self.vector_store.alias)
             
             return {
                 "status": "healthy",
                 "database_type": get_db_type_display_name(),
                 "collection_name": self.collection_name,
-                "embedding_model": self.model_name,
-                "test_search": "success"
+                "collection_exists": self.vector_store.col is not None,
+                "embedding_model": self.model_name
             }
         except Exception as e:
             return {
@@ -411,6 +788,7 @@ class VectorService:
                 "database_type": get_db_type_display_name()
             }
 
+    @tracked
     async def delete_collection(self) -> bool:
         """
         删除整个集合
@@ -419,8 +797,10 @@ class VectorService:
             bool: 删除是否成功
         """
         try:
-            if utility.has_collection(self.collection_name):
-                utility.drop_collection(self.collection_name)
+            alias = self.alias or get_connection_manager().acquire()
+            if utility.has_collection(self.collection_name, using=alias):
+                utility.drop_collection(self.collection_name, using=alias)
+                get_stats_service().invalidate(self.collection_name)
                 print(f"集合 {self.collection_name} 已删除")
                 return True
             else:
@@ -430,6 +810,7 @@ class VectorService:
             print(f"删除集合失败: {e}")
             return False
 
+    @tracked
     async def clear_collection(self) -> bool:
         """
         清空集合中的所有数据
@@ -438,11 +819,14 @@ class VectorService:
             bool: 清空是否成功
         """
         try:
-            if utility.has_collection(self.collection_name):
-                collection = Collection(self.collection_name)
+            alias = self.vector_store.alias if self.vector_store else (self.alias or get_connection_manager().acquire())
+            if utility.has_collection(self.collection_name, using=alias):
+                collection = Collection(self.collection_name, using=alias)
                 # 删除所有实体
-                collection.delete(expr="pk >= 0")
-                print(f"集合 {self.collection_name} 已清空")
+                result = collection.delete(expr=match_all_expr(collection))
+                get_stats_service().invalidate(self.collection_name)
+                get_compaction_scheduler().record_delete(self.collection_name, result.delete_count)
+                print(f"集合 {self.collection_name} 已清空，删除 {result.delete_count} 行")
                 return True
             else:
                 print(f"集合 {self.collection_name} 不存在")
@@ -451,6 +835,190 @@ class VectorService:
             print(f"清空集合失败: {e}")
             return False
 
+    def _document_expr(
+        self,
+        document_id: Optional[str] = None,
+        filename: Optional[str] = None,
+        tenant: Optional[str] = None
+    ) -> Optional[str]:
+        """按文档ID或文件名（可限定租户）构建表达式；旧集合没有租户字段时非默认租户返回 None"""
+        conditions = []
+        if document_id:
+            conditions.append({"document_id": document_id})
+        if filename:
+            conditions.append({"filename": filename})
+        if not conditions:
+            raise ValueError("必须指定 document_id 或 filename")
+        field_types = get_field_types(self.vector_store.col)
+        if tenant is not None and "tenant" not in field_types:
+            if tenant != DEFAULT_TENANT:
+                return None
+            tenant = None
+        filter_dict = conditions[0] if len(conditions) == 1 else {"$and": conditions}
+        return compile_filter(self._scoped_filter(filter_dict, tenant), field_types)
+
+    def _query_pks(self, expr: str, output_fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """用迭代器分批取出匹配表达式的行（默认只取主键），不受单次查询条数上限限制"""
+        # 强一致读取，刚写入或刚删除的行也能反映在结果中
+        iterator = self.vector_store.col.query_iterator(
+            batch_size=_DELETE_BATCH, expr=expr, output_fields=output_fields or ["pk"], consistency_level="Strong"
+        )
+        rows = []
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                rows.extend(batch)
+        finally:
+            iterator.close()
+        return rows
+
+    def _document_pks(self, document_ids: List[str], tenant: Optional[str] = None) -> Dict[str, List[str]]:
+        """按文档ID批量查询主键（可限定租户），返回 文档ID -> 主键列表"""
+        if not self.vector_store or self.vector_store.col is None:
+            return {}
+        field_types = get_field_types(self.vector_store.col)
+        if tenant is not None and "tenant" not in field_types:
+            if tenant != DEFAULT_TENANT:
+                return {}
+            tenant = None
+        pks: Dict[str, List[str]] = {}
+        document_ids = sorted(document_ids)
+        for start in range(0, len(document_ids), _DELETE_BATCH):
+            filter_dict = {"document_id": {"$in": document_ids[start:start + _DELETE_BATCH]}}
+            expr = compile_filter(self._scoped_filter(filter_dict, tenant), field_types)
+            for row in self._query_pks(expr, ["pk", "document_id"]):
+                pks.setdefault(row["document_id"], []).append(row["pk"])
+        return pks
+
+    def _delete_pks(self, pks: List[str]) -> int:
+        """按主键分批删除，返回删除行数"""
+        collection = self.vector_store.col
+        deleted = 0
+        for start in range(0, len(pks), _DELETE_BATCH):
+            batch = pks[start:start + _DELETE_BATCH]
+            deleted += collection.delete(expr=f"pk in {json.dumps(batch)}").delete_count
+        if deleted:
+            get_stats_service().invalidate(self.collection_name)
+            get_compaction_scheduler().record_delete(self.collection_name, deleted)
+        return deleted
+
+    @tracked
+    async def delete_documents(
+        self,
+        document_id: Optional[str] = None,
+        filename: Optional[str] = None,
+        tenant: Optional[str] = None
+    ) -> int:
+        """
+        删除指定文档的全部块
+        
+        Args:
+            document_id: 文档ID
+            filename: 文件名（与 document_id 同时指定时取交集）
+            tenant: 只删除该租户的数据
+            
+        Returns:
+            int: 删除的行数
+        """
+        if not self.vector_store or self.vector_store.col is None:
+            return 0
+        expr = self._document_expr(document_id, filename, tenant)
+        if expr is None:
+            return 0
+        output_fields = ["pk", "document_id"] if self.storage_mode == "offset" else ["pk"]
+        rows = await asyncio.to_thread(self._query_pks, expr, output_fields)
+        deleted = await asyncio.to_thread(self._delete_pks, [row["pk"] for row in rows])
+        if self.storage_mode == "offset":
+            # 块文本文件由各租户的行共用，只清理已没有任何行引用的版本
+            await asyncio.to_thread(self._prune_chunk_texts, {row["document_id"] for row in rows})
+        print(f"集合 {self.collection_name} 删除文档 {expr}: {deleted} 行")
+        return deleted
+
+    def _prune_chunk_texts(self, document_ids: Set[str], keep: Optional[Set[Tuple[str, str]]] = None):
+        """
+        offset 模式：删除文档中不再被任何行（不限租户）引用的文本版本
+
+        keep 中的 (document_id, text_version) 即使查询不到引用也保留（如刚写入的新版本）
+        """
+        chunk_store = get_chunk_store()
+        has_version = "text_version" in {field.name for field in self.vector_store.col.schema.fields}
+        for document_id in document_ids:
+            expr = compile_filter({"document_id": document_id}, get_field_types(self.vector_store.col))
+            rows = self._query_pks(expr, ["pk", "text_version"] if has_version else ["pk"])
+            referenced = {row.get("text_version", "") for row in rows}
+            if has_version:
+                referenced.update(version for doc_id, version in keep or () if doc_id == document_id)
+            removed = chunk_store.prune(document_id, referenced)
+            if removed:
+                print(f"清理文档 {document_id} 不再被引用的文本版本: {removed}")
+
+    @tracked
+    async def replace_documents(self, chunks: List[Dict[str, Any]], tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        用新解析的块替换对应文档在该租户下的旧版本：先写入新版本，再按主键删除旧版本
+
+        旧版本的主键在写入前查询，其他租户的行不受影响；offset 模式下新旧版本的块文本是不同的文件，
+        旧行在删除前仍能读到自己的文本，删除后清理不再被引用的文本版本。
+        两步之间检索可能同时返回新旧版本；写入失败时旧版本保持不变。
+
+        Args:
+            chunks: 一个或多个文档的全部文档块（按 metadata.document_id 分组）
+            tenant: 租户标识
+
+        Returns:
+            Dict: 写入和删除的行数
+        """
+        if not self.vector_store:
+            raise Exception("向量存储未初始化")
+        document_ids = {chunk.get("metadata", {}).get("document_id") for chunk in chunks}
+        if not chunks or not all(document_ids):
+            raise ValueError("替换的文档块必须带有非空的 document_id")
+
+        old_pks: List[str] = []
+        if self.vector_store.col is not None:
+            for document_id in document_ids:
+                expr = self._document_expr(document_id=document_id, tenant=tenant)
+                if expr is not None:
+                    old_pks.extend(row["pk"] for row in await asyncio.to_thread(self._query_pks, expr))
+
+        new_pks = [str(uuid.uuid4()) for _ in chunks]
+        try:
+            await self.store_vectors(chunks, tenant=tenant, ids=new_pks)
+        except Exception:
+            # 写入失败时清理可能已部分写入的新版本
+            if self.vector_store.col is not None:
+                await asyncio.to_thread(self._delete_pks, new_pks)
+            raise
+        deleted = await asyncio.to_thread(self._delete_pks, old_pks)
+        if self.storage_mode == "offset":
+            keep = {(chunk["metadata"]["document_id"], chunk["metadata"].get("text_version", "")) for chunk in chunks}
+            await asyncio.to_thread(self._prune_chunk_texts, document_ids, keep)
+        print(f"集合 {self.collection_name} 替换文档 {sorted(document_ids)}: 写入 {len(new_pks)} 行，删除旧版本 {deleted} 行")
+        return {"stored": len(new_pks), "deleted": deleted}
+
+    async def upsert_document(self, chunks: List[Dict[str, Any]], tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        替换一个文档：先写入新版本，再删除旧版本（见 replace_documents）
+        
+        替换不是原子操作：新版本写入完成到旧版本删除之间，所有进程的检索都可能同时返回新旧两个版本，
+        但不会出现文档缺失；offset 模式下新旧版本读取各自的文本文件，内容不会错位。
+        新版本写入失败时清理已部分写入的行，旧版本保持不变。
+        
+        Args:
+            chunks: 同一文档（相同 document_id）的全部文档块
+            tenant: 租户标识
+            
+        Returns:
+            Dict: 写入和删除的行数
+        """
+        document_ids = {chunk.get("metadata", {}).get("document_id") for chunk in chunks}
+        if len(document_ids) != 1 or not next(iter(document_ids)):
+            raise ValueError("替换的文档块必须属于同一个文档（相同且非空的 document_id）")
+        result = await self.replace_documents(chunks, tenant=tenant)
+        return {"document_id": document_ids.pop(), **result}
+
     def get_retriever(self, search_type: str = "similarity", search_kwargs: Optional[Dict] = None) -> VectorStoreRetriever:
         """
         获取向量存储检索器
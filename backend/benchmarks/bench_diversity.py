@@ -0,0 +1,68 @@
+# backend/benchmarks/bench_diversity.py
+"""
+检索结果多样化的耗时：select_diverse（增量矩阵运算的 MMR）vs LangChain maximal_marginal_relevance
+
+对每组 (fetch_k, 维度) 在合成候选上分别测量两者选出 k 个结果的 p50 耗时，并检查在无单文件限额时两者选择一致。
+另列出把 Milvus 返回的向量（Python 列表）转成 float32 矩阵的耗时，它与 MMR 本身的计算是分开的成本。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_diversity --fetch-k 50,100,200 --dims 384,768,1024 --k 10
+"""
+import argparse
+import time
+
+import numpy as np
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+from app.services.diversity import select_diverse
+
+
+def p50(func, repeat: int) -> float:
+    func()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.median(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MMR 多样化耗时对比")
+    parser.add_argument("--fetch-k", default="50,100,200")
+    parser.add_argument("--dims", default="384,768,1024")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--files", type=int, default=8, help="候选分布的文件数，用于单文件限额")
+    parser.add_argument("--max-per-file", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    print(f"k={args.k} lambda={args.lambda_mult} 单文件限额={args.max_per_file}")
+    for dim in (int(d) for d in args.dims.split(",")):
+        for fetch_k in (int(n) for n in args.fetch_k.split(",")):
+            query = rng.standard_normal(dim).astype(np.float32)
+            query /= np.linalg.norm(query)
+            # 候选围绕查询分布，并混入近似重复的块
+            candidates = query + rng.standard_normal((fetch_k, dim)).astype(np.float32) * 0.8
+            candidates[fetch_k // 2:] = candidates[:fetch_k - fetch_k // 2] + rng.standard_normal((fetch_k - fetch_k // 2, dim)).astype(np.float32) * 0.05
+            candidates /= np.linalg.norm(candidates, axis=1, keepdims=True)
+            relevance = candidates @ query
+            groups = [f"file{i % args.files}" for i in range(fetch_k)]
+
+            ours = select_diverse(relevance, args.k, candidates, args.lambda_mult)
+            theirs = maximal_marginal_relevance(query, candidates, args.lambda_mult, args.k)
+            as_lists = candidates.tolist()
+            print(
+                f"dim={dim:<5} fetch_k={fetch_k:<4} "
+                f"select_diverse={p50(lambda: select_diverse(relevance, args.k, candidates, args.lambda_mult), args.repeat):6.3f}ms "
+                f"+单文件限额={p50(lambda: select_diverse(relevance, args.k, candidates, args.lambda_mult, groups, args.max_per_file), args.repeat):6.3f}ms "
+                f"langchain={p50(lambda: maximal_marginal_relevance(query, candidates, args.lambda_mult, args.k), args.repeat):7.3f}ms "
+                f"向量转换={p50(lambda: np.asarray(as_lists, dtype=np.float32), max(1, args.repeat // 10)):6.3f}ms "
+                f"选择一致={ours == list(theirs)}"
+            )
+
+
+if __name__ == "__main__":
+    main()
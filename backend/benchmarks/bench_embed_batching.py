@@ -0,0 +1,129 @@
+# backend/benchmarks/bench_embed_batching.py
+"""
+入库嵌入吞吐：固定 batch_size=32 逐文件编码（原路径）vs BucketedEmbeddings（按 token 长度分桶、token 预算组批、合并并发请求）
+
+语料为目录下每个文件的分块结果，按文件依次到达；新路径下多个文件并发提交，模拟批量入库。
+输出每条路径的 嵌入/秒、补齐效率（真实 token / 补齐后 token）和两条路径向量的最大差异。
+--plan-only 时不加载模型，只按分词器（或字符数）比较两种组批方式的补齐效率和批次数。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_embed_batching --dir uploaded_files --model all-MiniLM-L6-v2
+    python -m benchmarks.bench_embed_batching --synthetic-files 200 --plan-only
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.core.config import settings
+from app.services.batch_embedder import BucketedEmbeddings, plan_batches
+
+FIXED_BATCH = 32
+
+
+def load_corpus(directory: str, chunk_size: int, chunk_overlap: int):
+    """每个文件分块后的文本列表"""
+    from benchmarks.bench_chunker import UPLOAD_DIR, load_samples
+    import benchmarks.bench_chunker as bench_chunker
+
+    bench_chunker.UPLOAD_DIR = Path(directory) if directory else UPLOAD_DIR
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return [chunks for chunks in (splitter.split_text(text) for _, text in load_samples()) if chunks]
+
+
+def synthetic_corpus(files: int, chunk_size: int, seed: int = 42):
+    """标题、短句与整块正文混合的合成语料，文件大小不一"""
+    rng = random.Random(seed)
+    words = "retrieval vector index embedding chunk query latency model milvus document token batch".split()
+    corpus = []
+    for _ in range(files):
+        chunks = []
+        for _ in range(rng.choice([1, 2, 3, 5, 8, 20, 60])):
+            kind = rng.random()
+            length = rng.randint(10, 40) if kind < 0.3 else rng.randint(60, 200) if kind < 0.5 else chunk_size
+            text = ""
+            while len(text) < length:
+                text += rng.choice(words) + " "
+            chunks.append(text[:length])
+        corpus.append(chunks)
+    return corpus
+
+
+def fixed_batches(lengths: np.ndarray):
+    """原路径：每个文件一次调用，sentence-transformers 在调用内按长度排序后每 32 条一批"""
+    order = np.argsort(-lengths, kind="stable")
+    return [order[i:i + FIXED_BATCH] for i in range(0, len(order), FIXED_BATCH)]
+
+
+def padded_tokens(batches, lengths: np.ndarray):
+    """每批补齐后的 token 数"""
+    return [len(batch) * int(lengths[batch].max()) for batch in batches]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入库嵌入组批方式吞吐对比")
+    parser.add_argument("--dir", default="", help="语料目录，默认 uploaded_files")
+    parser.add_argument("--synthetic-files", type=int, default=0, help="使用合成语料的文件数")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--token-budget", type=int, default=settings.embed_token_budget or 8192)
+    parser.add_argument("--max-batch", type=int, default=settings.embed_max_batch)
+    parser.add_argument("--wait-ms", type=float, default=settings.embed_batch_wait_ms)
+    parser.add_argument("--concurrency", type=int, default=8, help="新路径下并发提交的文件数")
+    parser.add_argument("--plan-only", action="store_true", help="不加载模型，只比较组批的补齐效率")
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.synthetic_files, args.chunk_size) if args.synthetic_files else load_corpus(args.dir, args.chunk_size, args.chunk_overlap)
+    texts = [text for chunks in corpus for text in chunks]
+    print(f"{len(corpus)} 个文件，{len(texts)} 个块，token 预算={args.token_budget} 最大批={args.max_batch}")
+
+    base = None
+    if not args.plan_only:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        model_path = settings.embedding_models.get(args.model, args.model)
+        base = HuggingFaceEmbeddings(
+            model_name=model_path,
+            model_kwargs={"device": "cpu", "trust_remote_code": True},
+            encode_kwargs={"normalize_embeddings": True, "batch_size": FIXED_BATCH},
+        )
+    if base:
+        bucketed = BucketedEmbeddings(base, args.token_budget, args.max_batch, args.wait_ms)
+        token_lengths = bucketed.token_lengths
+    else:
+        # 无模型时按字符数估计 token 长度
+        token_lengths = lambda chunks: np.array([min(len(text), 512) + 2 for text in chunks], dtype=np.int64)
+    per_file_lengths = [token_lengths(chunks) for chunks in corpus]
+    all_lengths = np.concatenate(per_file_lengths)
+    useful = int(all_lengths.sum())
+
+    fixed = [tokens for lengths in per_file_lengths for tokens in padded_tokens(fixed_batches(lengths), lengths)]
+    print(f"原路径   补齐效率={useful / sum(fixed):6.3f} 批次数={len(fixed):5d} 单批最大补齐 token={max(fixed)}")
+    planned = padded_tokens(plan_batches(all_lengths, args.token_budget, args.max_batch), all_lengths)
+    print(f"分桶组批 补齐效率={useful / sum(planned):6.3f} 批次数={len(planned):5d} 单批最大补齐 token={max(planned)}（并发请求全部合并时）")
+    if args.plan_only:
+        return
+
+    base.embed_documents(texts[:FIXED_BATCH])  # 预热
+    start = time.perf_counter()
+    baseline = [np.asarray(base.embed_documents(chunks), dtype=np.float32) for chunks in corpus]
+    baseline_seconds = time.perf_counter() - start
+    print(f"原路径   {len(texts) / baseline_seconds:8.1f} 嵌入/秒 ({baseline_seconds:.2f}s)")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(bucketed.embed_documents, corpus))
+    bucketed_seconds = time.perf_counter() - start
+    difference = max(float(np.abs(np.asarray(result) - expected).max()) for result, expected in zip(results, baseline))
+    print(
+        f"分桶组批 {len(texts) / bucketed_seconds:8.1f} 嵌入/秒 ({bucketed_seconds:.2f}s) "
+        f"加速 x{baseline_seconds / bucketed_seconds:.2f}，向量最大差异={difference:.2e}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# backend/benchmarks/bench_index_memory.py
+"""
+索引类型对比：召回率 / 检索延迟 / 估算内存 / 实际内存
+
+对同一批带聚类结构的随机向量分别建立各类索引，以 numpy 暴力检索结果为基准计算 recall@k。
+Milvus Lite 只支持 FLAT 和 IVF_FLAT，其余类型需连接 Milvus 标准版。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_index_memory --rows 200000 --dim 384 --types hnsw,hnsw_sq,ivf_sq8,ivf_pq,scann
+"""
+import argparse
+import time
+
+import numpy as np
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
+from app.core.config import is_milvus_lite
+from app.services.index_profiles import build_index_config, estimate_index_memory, resolve_profile
+from benchmarks.bench_filtered_search import ALIAS, connect
+
+
+def clustered_vectors(rows: int, centers: np.ndarray, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal((rows, centers.shape[1]), dtype=np.float32)
+    vectors = centers[rng.integers(0, len(centers), rows)] + 0.5 * noise
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def ground_truth(data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ data.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def run_index(name: str, data: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int, batch: int):
+    index_params, search_params = build_index_config(name, is_lite=is_milvus_lite(), dim=data.shape[1])
+    collection_name = f"bench_index_{name}"
+    if utility.has_collection(collection_name, using=ALIAS):
+        utility.drop_collection(collection_name, using=ALIAS)
+    schema = CollectionSchema([
+        FieldSchema("id", DataType.INT64, is_primary=True),
+        FieldSchema("vector", DataType.FLOAT_VECTOR, dim=data.shape[1]),
+    ])
+    collection = Collection(collection_name, schema=schema, using=ALIAS)
+    for offset in range(0, len(data), batch):
+        part = data[offset:offset + batch]
+        collection.insert([list(range(offset, offset + len(part))), part])
+    collection.flush()
+
+    start = time.perf_counter()
+    collection.create_index("vector", index_params)
+    utility.wait_for_index_building_complete(collection_name, using=ALIAS)
+    build_seconds = time.perf_counter() - start
+    collection.load()
+
+    hits, latencies = 0, []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        result = collection.search([query.tolist()], "vector", search_params, limit=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(hit.id for hit in result[0]) & set(truth[i].tolist()))
+
+    try:
+        actual = sum(segment.mem_size for segment in utility.get_query_segment_info(collection_name, using=ALIAS))
+    except Exception:
+        actual = None
+    estimated = estimate_index_memory(resolve_profile(name, is_milvus_lite()), index_params["params"], len(data), data.shape[1])
+    latencies.sort()
+    print(
+        f"{name:<9} recall@{k}={hits / truth.size:6.3f} p50={latencies[len(latencies) // 2]:7.2f}ms "
+        f"build={build_seconds:6.1f}s estimated={estimated / 2**20:9.1f}MiB "
+        f"actual={'n/a' if actual is None else f'{actual / 2**20:9.1f}MiB'}"
+    )
+    collection.drop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="索引类型召回率/内存对比")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--types", default="flat,ivf_flat,ivf_sq8,ivf_pq,scann,hnsw,hnsw_sq")
+    args = parser.parse_args()
+
+    connect()
+    centers = np.random.default_rng(0).standard_normal((256, args.dim), dtype=np.float32)
+    data = clustered_vectors(args.rows, centers, seed=1)
+    queries = clustered_vectors(args.queries, centers, seed=2)
+    truth = ground_truth(data, queries, args.k)
+    for name in args.types.split(","):
+        try:
+            run_index(name.strip(), data, queries, truth, args.k, args.batch)
+        except Exception as e:
+            print(f"{name:<9} 失败: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# backend/benchmarks/bench_projection.py
+"""
+嵌入降维对比：召回率损失 / 内存节省 / 检索延迟
+
+以原始维度的暴力检索结果为基准，计算 PCA 与 Matryoshka 截断在不同目标维度下的 recall@k。
+默认使用谱衰减的合成向量（与真实句向量的方差分布相近）；指定 --texts 时用当前嵌入模型编码文本文件的每一行。
+指定 --milvus 时在当前数据库配置下建立 FLAT 集合测量实际检索延迟，否则测量 numpy 暴力检索延迟。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_projection --rows 50000 --dim 384 --targets 64,128,192
+    python -m benchmarks.bench_projection --texts corpus.txt --targets 128 --milvus
+"""
+import argparse
+import time
+
+import numpy as np
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
+from app.services.projection import EmbeddingProjector
+from benchmarks.bench_filtered_search import ALIAS, connect
+from benchmarks.bench_index_memory import ground_truth
+
+
+def synthetic_embeddings(rows: int, dim: int, seed: int) -> np.ndarray:
+    """各向异性的合成向量：方差按维度幂律衰减，再随机旋转"""
+    rng = np.random.default_rng(seed)
+    scales = (np.arange(1, dim + 1, dtype=np.float32)) ** -0.8
+    rotation, _ = np.linalg.qr(rng.standard_normal((dim, dim)).astype(np.float32))
+    vectors = (rng.standard_normal((rows, dim), dtype=np.float32) * scales) @ rotation
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def model_embeddings(path: str) -> np.ndarray:
+    from app.services.vector_service import VectorService
+
+    with open(path, encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+    embeddings = VectorService().base_embeddings
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def numpy_latency(data: np.ndarray, queries: np.ndarray, k: int) -> float:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        scores = data @ query
+        np.argpartition(-scores, k)[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.median(latencies))
+
+
+def milvus_latency(data: np.ndarray, queries: np.ndarray, k: int, batch: int = 10_000) -> float:
+    name = f"bench_projection_{data.shape[1]}"
+    if utility.has_collection(name, using=ALIAS):
+        utility.drop_collection(name, using=ALIAS)
+    schema = CollectionSchema([
+        FieldSchema("id", DataType.INT64, is_primary=True),
+        FieldSchema("vector", DataType.FLOAT_VECTOR, dim=data.shape[1]),
+    ])
+    collection = Collection(name, schema=schema, using=ALIAS)
+    for offset in range(0, len(data), batch):
+        part = data[offset:offset + batch]
+        collection.insert([list(range(offset, offset + len(part))), part])
+    collection.flush()
+    collection.create_index("vector", {"metric_type": "COSINE", "index_type": "FLAT", "params": {}})
+    collection.load()
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        collection.search([query.tolist()], "vector", {"metric_type": "COSINE", "params": {}}, limit=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    collection.drop()
+    return float(np.median(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入降维召回率/内存/延迟对比")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--sample", type=int, default=2_000, help="PCA 拟合样本数")
+    parser.add_argument("--targets", default="64,128,192")
+    parser.add_argument("--texts", help="按行读取文本并用当前嵌入模型编码，替代合成向量")
+    parser.add_argument("--milvus", action="store_true", help="在 Milvus FLAT 集合上测量检索延迟")
+    args = parser.parse_args()
+
+    vectors = model_embeddings(args.texts) if args.texts else synthetic_embeddings(args.rows + args.queries, args.dim, seed=3)
+    queries, data = vectors[:args.queries], vectors[args.queries:]
+    truth = ground_truth(data, queries, args.k)
+    sample = data[np.linspace(0, len(data) - 1, min(args.sample, len(data))).astype(int)]
+
+    if args.milvus:
+        connect()
+    latency = milvus_latency if args.milvus else numpy_latency
+    print(f"{len(data)} 行 x {data.shape[1]} 维，{len(queries)} 个查询，基准 p50={latency(data, queries, args.k):.2f}ms")
+
+    for target in (int(t) for t in args.targets.split(",")):
+        projectors = [EmbeddingProjector.truncation(data.shape[1], target)]
+        if len(sample) > target:
+            projectors.append(EmbeddingProjector.fit_pca(sample, target))
+        for projector in projectors:
+            projected_data, projected_queries = projector.transform(data), projector.transform(queries)
+            found = ground_truth(projected_data, projected_queries, args.k)
+            hits = sum(len(set(found[i]) & set(truth[i])) for i in range(len(queries)))
+            variance = "" if projector.explained_variance is None else f" 方差保留={projector.explained_variance:5.3f}"
+            print(
+                f"{projector.method:<10} dim={target:<4} recall@{args.k}={hits / truth.size:6.3f} "
+                f"向量内存={projected_data.nbytes / 2**20:8.1f}MiB (x{projector.info()['compression_ratio']}) "
+                f"p50={latency(projected_data, projected_queries, args.k):7.2f}ms{variance}"
+            )
+
+
+if __name__ == "__main__":
+    main()
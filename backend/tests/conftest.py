@@ -0,0 +1,43 @@
+# backend/tests/conftest.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.core.config import settings
+import app.services.chunk_store as chunk_store_module
+import app.services.vector_service as vector_service_module
+
+EMBED_DIM = 32
+
+
+@pytest.fixture
+def milvus_env(tmp_path, monkeypatch):
+    """
+    每个测试使用独立的 Milvus Lite 数据库和块文本目录，嵌入模型替换为确定性的假模型
+
+    返回一个函数，按存储模式设置配置（inline / offset）
+    """
+    def _fake_embedding_model(self):
+        self.embeddings = DeterministicFakeEmbedding(size=EMBED_DIM)
+
+    monkeypatch.setattr(vector_service_module.VectorService, "_init_embedding_model", _fake_embedding_model)
+    monkeypatch.setattr(chunk_store_module, "_chunk_store", None)
+    monkeypatch.setattr(settings.database, "db_type", "milvus_lite")
+    monkeypatch.setattr(settings.database.milvus_lite, "db_path", str(tmp_path / "milvus.db"))
+    monkeypatch.setattr(settings, "chunk_text_dir", str(tmp_path / "chunks"))
+    monkeypatch.setattr(settings, "projection_dir", str(tmp_path / "projections"))
+    monkeypatch.setattr(settings, "embedding_projection", "none")
+    monkeypatch.setattr(settings, "embedding_server_socket", None)
+    monkeypatch.setattr(settings, "parse_cache_enabled", False)
+    monkeypatch.setattr(settings.knowledge_bases[settings.default_knowledge_base], "search_threshold", -1e9)
+
+    def configure(storage_mode: str = "inline"):
+        monkeypatch.setattr(settings, "chunk_storage_mode", storage_mode)
+        return tmp_path
+
+    return configure
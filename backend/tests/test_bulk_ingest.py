@@ -0,0 +1,94 @@
+# backend/tests/test_bulk_ingest.py
+import asyncio
+
+import pytest
+
+from app.services.bulk_ingest import DirectoryIngestor, IngestCheckpoint, discover_files
+from app.services.document_processor import DocumentProcessor, make_document_id
+from app.services.vector_service import VectorService
+
+FINGERPRINT = {"collection": "test", "chunk_size": 200}
+
+
+@pytest.fixture
+def docs_dir(tmp_path):
+    root = tmp_path / "docs"
+    (root / "sub").mkdir(parents=True)
+    (root / "a.txt").write_text("甲文件的内容。" * 120, encoding="utf-8")
+    (root / "b.txt").write_text("乙文件的内容。" * 90, encoding="utf-8")
+    (root / "sub" / "c.txt").write_text("丙文件的内容。" * 60, encoding="utf-8")
+    (root / "skip.bin").write_bytes(b"\x00")
+    return root
+
+
+def _ingest(root, checkpoint_path, tenant):
+    async def main():
+        service = VectorService(index_type="flat")
+        ingestor = DirectoryIngestor(
+            service,
+            DocumentProcessor(chunk_size=200, chunk_overlap=0),
+            IngestCheckpoint.load(checkpoint_path, FINGERPRINT),
+            batch_size=20,
+            tenant=tenant,
+        )
+        return service, await ingestor.run(root, discover_files(root, [".txt"]))
+
+    return asyncio.run(main())
+
+
+def _row_counts(service, files, tenant):
+    pks = service._document_pks([make_document_id(str(path)) for path in files], tenant)
+    return {document_id: len(document_pks) for document_id, document_pks in pks.items()}
+
+
+def test_discover_files_filters_and_sorts(docs_dir):
+    assert [path.relative_to(docs_dir).as_posix() for path in discover_files(docs_dir, [".TXT"])] == [
+        "a.txt", "b.txt", "sub/c.txt"
+    ]
+
+
+def test_checkpoint_rejects_changed_parameters(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    IngestCheckpoint(path, FINGERPRINT).save()
+    assert IngestCheckpoint.load(path, FINGERPRINT).done == {}
+    with pytest.raises(ValueError):
+        IngestCheckpoint.load(path, {**FINGERPRINT, "chunk_size": 400})
+
+
+@pytest.mark.parametrize("storage_mode", ["inline", "offset"])
+def test_resume_replaces_interrupted_file_without_duplicates(milvus_env, docs_dir, tmp_path, storage_mode):
+    milvus_env(storage_mode)
+    files = discover_files(docs_dir, [".txt"])
+    checkpoint_a = tmp_path / "a.json"
+    service, stats = _ingest(docs_dir, checkpoint_a, "a")
+    assert stats["files_done"] == 3 and stats["files_failed"] == 0
+    _, stats_b = _ingest(docs_dir, tmp_path / "b.json", "b")
+    expected_a = _row_counts(service, files, "a")
+    expected_b = _row_counts(service, files, "b")
+    assert sum(expected_a.values()) == stats["chunks_stored"]
+    assert expected_b == expected_a
+
+    # 未变化的文件全部跳过
+    _, stats = _ingest(docs_dir, checkpoint_a, "a")
+    assert stats["files_skipped"] == 3 and stats["files_done"] == 0
+
+    # 模拟写入 b.txt 时中断：部分块已写入，断点中该文件仍在 in_flight
+    interrupted = docs_dir / "b.txt"
+    partial = asyncio.run(DocumentProcessor(chunk_size=200, chunk_overlap=0).parse_document(str(interrupted)))
+    asyncio.run(service.store_vectors(partial[: len(partial) // 2], tenant="a"))
+    checkpoint = IngestCheckpoint.load(checkpoint_a, FINGERPRINT)
+    checkpoint.done.pop("b.txt")
+    checkpoint.in_flight = ["b.txt"]
+    checkpoint.save()
+
+    _, stats = _ingest(docs_dir, checkpoint_a, "a")
+    assert stats["files_done"] == 1 and stats["files_skipped"] == 2
+    assert _row_counts(service, files, "a") == expected_a
+    # 其他租户的行不受影响
+    assert _row_counts(service, files, "b") == expected_b
+    checkpoint = IngestCheckpoint.load(checkpoint_a, FINGERPRINT)
+    assert checkpoint.in_flight == [] and "b.txt" in checkpoint.done
+
+    if storage_mode == "offset":
+        results = asyncio.run(service.search_similar("乙文件", k=100, tenant="b"))
+        assert results and all(result["content"] for result in results)
@@ -0,0 +1,50 @@
+# backend/tests/test_deadline.py
+import asyncio
+
+import pytest
+
+from app.services.deadline import Deadline, DeadlineExceeded
+
+
+def test_unbounded_deadline_is_a_no_op():
+    deadline = Deadline()
+    assert not deadline.bounded
+    assert deadline.remaining() is None
+    assert deadline.allows(1e9)
+    assert deadline.timeout(3) == 3
+    deadline.check("search")
+
+
+def test_timeout_is_capped_by_remaining_budget():
+    deadline = Deadline.from_ms(200)
+    assert deadline.bounded
+    assert deadline.timeout(10) <= 0.2
+    assert deadline.timeout(0.05) == 0.05
+    assert not deadline.allows(1)
+
+
+def test_run_raises_with_stage_when_budget_runs_out():
+    async def main():
+        deadline = Deadline(0.05)
+        with pytest.raises(DeadlineExceeded) as exc_info:
+            await deadline.run("llm", asyncio.sleep(1))
+        assert exc_info.value.stage == "llm"
+        # 预算已耗尽时不再启动新阶段
+        with pytest.raises(DeadlineExceeded):
+            await deadline.run("search", asyncio.sleep(0))
+
+    asyncio.run(main())
+
+
+def test_grace_extends_the_outer_wait():
+    async def main():
+        deadline = Deadline(0.02)
+        assert await deadline.run("query", asyncio.sleep(0.05, result="ok"), grace=0.5) == "ok"
+
+    asyncio.run(main())
+
+
+def test_degradations_are_recorded():
+    deadline = Deadline(1)
+    deadline.degrade("retrieval", "reduce_topk", requested=10, used=3)
+    assert deadline.degradations == [{"stage": "retrieval", "action": "reduce_topk", "requested": 10, "used": 3}]
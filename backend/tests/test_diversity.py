@@ -0,0 +1,50 @@
+# backend/tests/test_diversity.py
+import numpy as np
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+from app.services.diversity import select_diverse
+
+
+def _cosine(query: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    return matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+
+
+def test_mmr_matches_langchain_selection():
+    rng = np.random.default_rng(0)
+    for lambda_mult in (0.1, 0.3, 0.5, 0.9):
+        query = rng.normal(size=16).astype(np.float32)
+        candidates = rng.normal(size=(40, 16)).astype(np.float32)
+        expected = maximal_marginal_relevance(query, list(candidates), lambda_mult=lambda_mult, k=8)
+        selected = select_diverse(_cosine(query, candidates), 8, vectors=candidates, lambda_mult=lambda_mult)
+        assert selected == expected
+
+
+def test_mmr_skips_near_duplicates():
+    query = np.array([1.0, 0.0], dtype=np.float32)
+    candidates = np.array([[1.0, 0.05], [1.0, 0.06], [0.6, 0.8]], dtype=np.float32)
+    relevance = _cosine(query, candidates)
+    assert select_diverse(relevance, 2) == [0, 1]
+    assert select_diverse(relevance, 2, vectors=candidates, lambda_mult=0.3) == [0, 2]
+
+
+def test_max_per_group_limits_each_group():
+    relevance = [0.9, 0.8, 0.7, 0.6, 0.5]
+    groups = ["a.pdf", "a.pdf", "a.pdf", "b.pdf", "c.pdf"]
+    assert select_diverse(relevance, 4, groups=groups, max_per_group=2) == [0, 1, 3, 4]
+    # 可选候选不足 k 个时返回全部可选的
+    assert select_diverse(relevance, 5, groups=groups, max_per_group=1) == [0, 3, 4]
+
+
+def test_mmr_and_group_limit_combined():
+    rng = np.random.default_rng(1)
+    candidates = rng.normal(size=(20, 8)).astype(np.float32)
+    relevance = rng.uniform(size=20)
+    groups = [i % 3 for i in range(20)]
+    selected = select_diverse(relevance, 6, vectors=candidates, lambda_mult=0.5, groups=groups, max_per_group=2)
+    assert len(selected) == len(set(selected)) == 6
+    assert all(sum(1 for i in selected if groups[i] == g) <= 2 for g in range(3))
+
+
+def test_empty_and_oversized_k():
+    assert select_diverse([], 5) == []
+    assert select_diverse([0.1, 0.3], 5) == [1, 0]
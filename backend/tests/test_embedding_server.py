@@ -0,0 +1,112 @@
+# backend/tests/test_embedding_server.py
+import socket
+import threading
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services.embedding_server import (
+    OP_DOCUMENTS,
+    OP_QUERY,
+    EmbeddingServerError,
+    RemoteEmbeddings,
+    _handle_connection,
+    encode_request,
+    read_request,
+)
+
+MODEL_PATH = "models/fake"
+
+
+class _FakeModel(DeterministicFakeEmbedding):
+    def embed_documents(self, texts):
+        if "fail" in texts:
+            raise ValueError("bad input")
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def embedding_socket(tmp_path):
+    """在临时 Unix socket 上运行与模型进程相同的连接处理逻辑（线程代替进程）"""
+    socket_path = str(tmp_path / "embed.sock")
+    model = _FakeModel(size=8)
+    requested_models = []
+    connections = []
+
+    def get_model(model_path):
+        requested_models.append(model_path)
+        return model
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(8)
+
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            connections.append(conn)
+            threading.Thread(target=_handle_connection, args=(conn, get_model), daemon=True).start()
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield socket_path, model, requested_models, connections
+    listener.close()
+
+
+def test_request_round_trip():
+    client, server = socket.socketpair()
+    with client, server:
+        texts = ["你好，世界", "", "emoji 🚀" * 100]
+        client.sendall(encode_request(OP_DOCUMENTS, MODEL_PATH, texts))
+        assert read_request(server) == (OP_DOCUMENTS, MODEL_PATH, texts)
+        client.sendall(encode_request(OP_QUERY, "模型", []))
+        assert read_request(server) == (OP_QUERY, "模型", [])
+
+
+def test_read_request_raises_on_truncated_request():
+    client, server = socket.socketpair()
+    with server:
+        client.sendall(encode_request(OP_DOCUMENTS, MODEL_PATH, ["abc"])[:-1])
+        client.close()
+        with pytest.raises(ConnectionError):
+            read_request(server)
+
+
+def test_remote_embeddings_match_local_model(embedding_socket):
+    socket_path, model, requested_models, _ = embedding_socket
+    remote = RemoteEmbeddings(socket_path, MODEL_PATH, timeout=5)
+    texts = ["第一段", "second chunk", "第三段"]
+
+    vectors = remote.embed_documents_array(texts)
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(vectors, np.asarray(model.embed_documents(texts), dtype=np.float32))
+    np.testing.assert_allclose(remote.embed_query("问题"), model.embed_query("问题"), rtol=1e-6)
+    assert remote.embed_documents([]) == []
+    assert set(requested_models) == {MODEL_PATH}
+
+
+def test_model_errors_are_reported_and_connection_stays_usable(embedding_socket):
+    socket_path, _, _, connections = embedding_socket
+    remote = RemoteEmbeddings(socket_path, MODEL_PATH, timeout=5)
+    with pytest.raises(EmbeddingServerError, match="bad input"):
+        remote.embed_documents(["ok", "fail"])
+    assert len(remote.embed_documents(["ok"])) == 1
+    assert len(connections) == 1
+
+
+def test_reconnects_once_after_server_closes_connection(embedding_socket):
+    socket_path, _, _, connections = embedding_socket
+    remote = RemoteEmbeddings(socket_path, MODEL_PATH, timeout=5)
+    remote.embed_query("a")
+    connections[0].shutdown(socket.SHUT_RDWR)
+    assert len(remote.embed_query("b")) == 8
+    assert len(connections) == 2
+
+
+def test_unavailable_server_raises(tmp_path):
+    remote = RemoteEmbeddings(str(tmp_path / "missing.sock"), MODEL_PATH, timeout=1)
+    with pytest.raises(EmbeddingServerError):
+        remote.embed_query("a")
@@ -0,0 +1,64 @@
+# backend/tests/test_filter_expr.py
+import pytest
+from pymilvus import DataType
+
+from app.services.filter_expr import FilterCompileError, MAX_DEPTH, MAX_IN_VALUES, compile_filter
+
+FIELD_TYPES = {
+    "filename": DataType.VARCHAR,
+    "page": DataType.INT64,
+    "score": DataType.DOUBLE,
+    "tenant": DataType.VARCHAR,
+}
+
+
+def test_equality_shorthand_and_operators():
+    assert compile_filter({"filename": "a.pdf"}, FIELD_TYPES) == 'filename == "a.pdf"'
+    assert compile_filter({"page": {"$gte": 2, "$lt": 5}}, FIELD_TYPES) == "(page >= 2 and page < 5)"
+    assert compile_filter({"page": {"$in": [1, 2]}}, FIELD_TYPES) == "page in [1, 2]"
+    assert compile_filter({"page": {"$nin": [3]}}, FIELD_TYPES) == "page not in [3]"
+
+
+def test_multiple_fields_are_combined_with_and():
+    expr = compile_filter({"filename": "a.pdf", "page": {"$ne": 1}}, FIELD_TYPES)
+    assert expr == '(filename == "a.pdf" and page != 1)'
+
+
+def test_logical_operators():
+    expr = compile_filter({"$or": [{"page": 1}, {"$not": {"filename": "b.pdf"}}]}, FIELD_TYPES)
+    assert expr == '(page == 1 or not (filename == "b.pdf"))'
+
+
+def test_strings_are_escaped():
+    expr = compile_filter({"filename": 'a" or pk != "'}, FIELD_TYPES)
+    assert expr == 'filename == "a\\" or pk != \\""'
+
+
+def test_prefix_escapes_like_wildcards():
+    expr = compile_filter({"filename": {"$prefix": "reports/2024_%"}}, FIELD_TYPES)
+    assert expr.startswith("filename like ")
+    assert expr.endswith('%"')
+    assert "\\_" in expr and "\\%" in expr
+
+
+@pytest.mark.parametrize("filter_dict", [
+    {"unknown": 1},
+    {"page": "1"},
+    {"filename": 1},
+    {"page": {"$regex": "x"}},
+    {"page": {"$in": []}},
+    {"page": {"$in": list(range(MAX_IN_VALUES + 1))}},
+    {"page": True},
+    {"$or": []},
+])
+def test_invalid_filters_are_rejected(filter_dict):
+    with pytest.raises(FilterCompileError):
+        compile_filter(filter_dict, FIELD_TYPES)
+
+
+def test_nesting_depth_is_limited():
+    filter_dict = {"page": 1}
+    for _ in range(MAX_DEPTH + 1):
+        filter_dict = {"$not": filter_dict}
+    with pytest.raises(FilterCompileError):
+        compile_filter(filter_dict, FIELD_TYPES)
@@ -0,0 +1,100 @@
+# backend/tests/test_offset_storage.py
+import asyncio
+import os
+
+import pytest
+
+import app.api.documents as documents_module
+from app.api.documents import UpsertRequest, delete_documents, upsert_document
+from app.services.document_processor import make_document_id
+from app.services.vector_service import VectorService
+
+FIRST_VERSION = "第一版内容。" * 200
+SECOND_VERSION = "第二版。" * 50
+
+
+@pytest.fixture
+def offset_env(milvus_env, monkeypatch):
+    tmp_path = milvus_env("offset")
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    monkeypatch.setattr(documents_module, "UPLOAD_DIR", str(upload_dir))
+    path = upload_dir / "doc.txt"
+    return path, make_document_id(str(path)), tmp_path / "chunks"
+
+
+def _text_files(chunk_dir):
+    return sorted(name for name in os.listdir(chunk_dir) if name.endswith(".txt"))
+
+
+async def _contents(service: VectorService, tenant: str):
+    results = await service.search_similar("内容", k=100, tenant=tenant)
+    return {result["content"][:3] for result in results}, len(results)
+
+
+def test_upsert_replaces_only_the_callers_tenant(offset_env):
+    path, document_id, chunk_dir = offset_env
+
+    async def main():
+        path.write_text(FIRST_VERSION, encoding="utf-8")
+        for tenant in ("a", "b"):
+            result = await upsert_document(UpsertRequest(filename="doc.txt", tenant=tenant))
+            assert result["document_id"] == document_id
+            assert result["deleted"] == 0
+        first_rows = result["stored"]
+        # 两个租户的相同内容共用一份块文本
+        assert len(_text_files(chunk_dir)) == 1
+
+        path.write_text(SECOND_VERSION, encoding="utf-8")
+        result = await upsert_document(UpsertRequest(filename="doc.txt", tenant="a"))
+        assert result["deleted"] == first_rows
+        assert len(_text_files(chunk_dir)) == 2
+
+        service = VectorService.for_knowledge_base(None)
+        assert await _contents(service, "a") == ({"第二版"}, result["stored"])
+        # 其他租户的旧版本文本仍然可读
+        assert await _contents(service, "b") == ({"第一版"}, first_rows)
+
+    asyncio.run(main())
+
+
+def test_delete_prunes_only_unreferenced_versions(offset_env):
+    path, document_id, chunk_dir = offset_env
+
+    async def main():
+        path.write_text(FIRST_VERSION, encoding="utf-8")
+        for tenant in ("a", "b"):
+            await upsert_document(UpsertRequest(filename="doc.txt", tenant=tenant))
+        path.write_text(SECOND_VERSION, encoding="utf-8")
+        await upsert_document(UpsertRequest(filename="doc.txt", tenant="a"))
+        files = _text_files(chunk_dir)
+        assert len(files) == 2
+
+        # 删除租户 b 后旧版本不再被引用，只保留租户 a 使用的新版本
+        result = await delete_documents(document_id=document_id, tenant="b")
+        assert result["deleted"] > 0
+        remaining = _text_files(chunk_dir)
+        assert len(remaining) == 1 and remaining[0] in files
+        service = VectorService.for_knowledge_base(None)
+        assert (await _contents(service, "a"))[0] == {"第二版"}
+        assert await _contents(service, "b") == (set(), 0)
+
+        await delete_documents(document_id=document_id, tenant="a")
+        assert _text_files(chunk_dir) == []
+
+    asyncio.run(main())
+
+
+def test_reupload_of_unchanged_content_keeps_rows_readable(offset_env):
+    path, _, chunk_dir = offset_env
+
+    async def main():
+        path.write_text(FIRST_VERSION, encoding="utf-8")
+        first = await upsert_document(UpsertRequest(filename="doc.txt"))
+        second = await upsert_document(UpsertRequest(filename="doc.txt"))
+        assert second["deleted"] == first["stored"]
+        assert len(_text_files(chunk_dir)) == 1
+        service = VectorService.for_knowledge_base(None)
+        assert await _contents(service, None) == ({"第一版"}, second["stored"])
+
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+# backend/tests/test_singleflight.py
+import asyncio
+
+import numpy as np
+
+import app.api.query as query_module
+from app.api.query import QueryRequest, QueryResponse, query_documents
+from app.services.deadline import Deadline
+from app.services.llm_service import LLMService
+from app.services.projection import EmbeddingProjector
+from app.services.singleflight import SingleFlight, normalize_text
+
+
+def test_concurrent_calls_with_same_key_share_one_execution():
+    async def main():
+        group = SingleFlight("test")
+        calls = []
+
+        async def work(value):
+            calls.append(value)
+            await asyncio.sleep(0.02)
+            return value
+
+        results = await asyncio.gather(
+            group.do("a", lambda: work(1)),
+            group.do("a", lambda: work(2)),
+            group.do("b", lambda: work(3)),
+        )
+        assert results == [(1, False), (1, True), (3, False)]
+        assert calls == [1, 3]
+        assert group.stats() == {"executions": 2, "coalesced": 1, "in_flight": 0}
+
+        # 执行结束后相同的键重新执行
+        assert await group.do("a", lambda: work(4)) == (4, False)
+
+    asyncio.run(main())
+
+
+def test_errors_are_shared_and_cancelled_waiter_does_not_cancel_execution():
+    async def main():
+        group = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0.02)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(group.do("k", fail), group.do("k", fail), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        first = asyncio.ensure_future(group.do("k", lambda: asyncio.sleep(0.05, result="done")))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(group.do("k", lambda: asyncio.sleep(0, result="other")))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == ("done", True)
+
+    asyncio.run(main())
+
+
+def test_normalize_text():
+    assert normalize_text("  ＲＡＧ\t是什么？ ") == normalize_text("RAG 是什么?")
+
+
+def test_llm_calls_are_coalesced_only_within_the_same_budget(monkeypatch):
+    executions = []
+
+    async def fake_generate(self, question, context, prompt, temperature, deadline):
+        executions.append(deadline.budget_seconds)
+        await asyncio.sleep(0.02)
+        return "answer", {"provider": "fake", "fallback": False, "path": []}
+
+    monkeypatch.setattr(LLMService, "_generate_with_failover", fake_generate)
+
+    async def main():
+        service = LLMService()
+        results = await asyncio.gather(
+            service.generate_answer_with_metadata("q", "ctx", 0, Deadline(5)),
+            service.generate_answer_with_metadata("q", "ctx", 0, Deadline(5)),
+            service.generate_answer_with_metadata("q", "ctx", 0, Deadline(1)),
+        )
+        assert [metadata["coalesced"] for _, metadata in results] == [False, True, False]
+
+    asyncio.run(main())
+    assert executions == [5, 1]
+
+
+def test_query_key_includes_diversity_parameters(monkeypatch):
+    executions = []
+
+    async def fake_run_query(request, deadline):
+        executions.append((request.mmr_lambda, request.max_per_file))
+        await asyncio.sleep(0.02)
+        return QueryResponse(answer="ok", docs=[])
+
+    monkeypatch.setattr(query_module, "_run_query", fake_run_query)
+    monkeypatch.setattr(query_module.settings, "search_mmr_lambda", None)
+    monkeypatch.setattr(query_module.settings, "search_max_per_file", None)
+
+    async def main():
+        return await asyncio.gather(
+            query_documents(QueryRequest(question="什么是 RAG"), None),
+            query_documents(QueryRequest(question="什么是  RAG "), None),
+            query_documents(QueryRequest(question="什么是 RAG", mmr_lambda=0.5), None),
+            query_documents(QueryRequest(question="什么是 RAG", max_per_file=2), None),
+        )
+
+    responses = asyncio.run(main())
+    assert [response.metadata.get("coalesced", False) for response in responses] == [False, True, False, False]
+    assert sorted(executions, key=str) == sorted([(None, None), (0.5, None), (None, 2)], key=str)
+
+
+def test_query_key_follows_global_diversity_settings(monkeypatch):
+    executions = []
+
+    async def fake_run_query(request, deadline):
+        executions.append(request.question)
+        await asyncio.sleep(0.02)
+        return QueryResponse(answer="ok", docs=[])
+
+    monkeypatch.setattr(query_module, "_run_query", fake_run_query)
+
+    async def main():
+        monkeypatch.setattr(query_module.settings, "search_mmr_lambda", None)
+        first = asyncio.ensure_future(query_documents(QueryRequest(question="q"), None))
+        await asyncio.sleep(0)
+        # 配置变化后的请求不合并到旧参数的执行上
+        monkeypatch.setattr(query_module.settings, "search_mmr_lambda", 0.5)
+        second = await query_documents(QueryRequest(question="q"), None)
+        assert not second.metadata.get("coalesced", False)
+        await first
+
+    asyncio.run(main())
+    assert len(executions) == 2
+
+
+def test_projector_fingerprint_identifies_the_projection(tmp_path):
+    rng = np.random.default_rng(0)
+    first = EmbeddingProjector.fit_pca(rng.normal(size=(50, 16)), 4)
+    second = EmbeddingProjector.fit_pca(rng.normal(size=(50, 16)), 4)
+    assert first.fingerprint != second.fingerprint
+    assert EmbeddingProjector.truncation(16, 4).fingerprint == EmbeddingProjector.truncation(16, 4).fingerprint
+    assert EmbeddingProjector.truncation(16, 4).fingerprint != EmbeddingProjector.truncation(16, 8).fingerprint
+
+    # 重新加载的投影与保存时是同一个，查询嵌入仍可共享
+    path = tmp_path / "projection.npz"
+    first.save(path)
+    assert EmbeddingProjector.load(path).fingerprint == first.fingerprint
+